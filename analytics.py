@@ -0,0 +1,290 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from archive import connect_cold
+from shards import connect_shard, shard_paths
+from store import connect
+
+ANALYTICS_WORKERS = os.cpu_count() or 1
+# Tweets per partition, as estimated from the rowids, so that the partial aggregates one worker holds
+# at a time stay small whatever the size of the tables
+PARTITION_ROWS = 250000
+# Partitions per worker at least, so that a slow partition does not leave the other workers idle
+PARTITIONS_PER_WORKER = 4
+# Tweet IDs sampled per partition to place the boundaries
+SAMPLES_PER_PARTITION = 32
+# Users and hashtags printed by the command
+REPORT_TOP_K = 10
+
+# Bounds of the whole range of 64-bit tweet IDs
+_MIN_TID = -2 ** 63
+_MAX_TID = 2 ** 63 - 1
+
+# The partial aggregates of one tid range in one file, each read from an index range: a tweet, reply,
+# retweet or mention belongs to the range of the tweet it is counted for, so the joins stay within the
+# range too. Retweets are in the file of the tweet retweeted, but a reply may be in another file than the
+# tweet it replies to, so replies are counted by the tweet replied to, and credited to its writer once the
+# writers of those tweets have been looked up in every file (see _WRITERS_QUERY).
+PARTITION_QUERIES = {
+    "tweets": """
+        SELECT writer, COUNT(*)
+        FROM tweets
+        WHERE tid BETWEEN :lo AND :hi
+        GROUP BY writer
+    """,
+    "replies_received": """
+        SELECT replyto, COUNT(*)
+        FROM tweets
+        WHERE replyto BETWEEN :lo AND :hi
+        GROUP BY replyto
+    """,
+    "retweets_received": """
+        SELECT t.writer, COUNT(*)
+        FROM retweets r
+        JOIN tweets t ON t.tid = r.tid
+        WHERE r.tid BETWEEN :lo AND :hi
+        GROUP BY t.writer
+    """,
+    "hashtag_mentions": """
+        SELECT term, COUNT(*)
+        FROM mentions
+        WHERE tid BETWEEN :lo AND :hi
+        GROUP BY term
+    """,
+}
+
+# The writers of the tweets replied to in a range, by tweet ID
+_WRITERS_QUERY = "SELECT tid, writer FROM tweets WHERE tid IN (SELECT value FROM json_each(?))"
+
+# The per-user aggregates, in the columns of the users report
+USER_METRICS = ("tweets", "replies_received", "retweets_received")
+
+# Connections of the worker process to every file holding tweets, opened by _open_worker
+_worker_conns = []
+
+
+def _max_rowid(conn):
+    return conn.execute("SELECT MAX(rowid) FROM tweets").fetchone()[0] or 0
+
+
+def partition_bounds(conns, partitions, samples_per_partition=SAMPLES_PER_PARTITION):
+    """
+    Split the tweet IDs into ranges holding about the same number of tweets.
+
+    Tweet IDs grow with time, and so does the number of tweets per day, so ranges of equal width would
+    not be balanced. The boundaries are quantiles of tweet IDs read at evenly spaced rowids instead, a
+    few thousand primary key lookups, spread over the files in proportion to their rowids. The ranges
+    cover every possible ID whatever the sample, so the sample only affects the balance of the work,
+    never the results.
+
+    Args:
+        conns (list): Connections to the files holding tweets: the database, or its shards.
+        partitions (int): Number of ranges.
+        samples_per_partition (int, optional): Tweet IDs sampled per range. Default is SAMPLES_PER_PARTITION.
+
+    Returns:
+        list: Up to partitions tuples of (lo, hi), inclusive, in ascending order, without overlaps or gaps.
+    """
+    max_rowids = [_max_rowid(conn) for conn in conns]
+    total = sum(max_rowids)
+    sample = []
+    for conn, max_rowid in zip(conns, max_rowids):
+        samples = min(partitions * samples_per_partition * max_rowid // total, max_rowid) if total else 0
+        sample.extend(
+            row[0] for step in range(samples)
+            for row in conn.execute("SELECT tid FROM tweets WHERE rowid >= ? LIMIT 1",
+                                    (1 + step * max_rowid // samples,)))
+    sample.sort()
+    cuts = sorted({sample[len(sample) * part // partitions] for part in range(1, partitions)} if sample else set())
+    lows = [_MIN_TID] + cuts
+    highs = [cut - 1 for cut in cuts] + [_MAX_TID]
+    return list(zip(lows, highs))
+
+
+def open_tweet_files(db_name, immutable=False):
+    """
+    Open read-only connections to the files that hold the tweets of a database.
+
+    Once a database has been split with shards.py its own tweets are no longer read or written, so these
+    are the shards if it has any. Otherwise they are the database itself and its cold database, if it has
+    one: archive.py moves whole threads with their mentions and retweets, so the cold tier is counted like
+    one more file.
+
+    Args:
+        db_name (str): Path of the SQLite database file.
+        immutable (bool, optional): Open the files immutable, for snapshots. Default is False.
+
+    Returns:
+        list: The connections.
+    """
+    paths = shard_paths(db_name)
+    if paths:
+        return [connect_shard(path, read_only=True, immutable=immutable) for path in paths]
+    conns = [connect(db_name, read_only=True, immutable=immutable)]
+    cold = connect_cold(db_name, immutable=immutable)
+    return conns if cold is None else conns + [cold]
+
+
+def _open_worker(db_name, immutable):
+    """
+    Open the read-only connections of a worker process.
+    """
+    global _worker_conns
+    _worker_conns = open_tweet_files(db_name, immutable)
+
+
+def _close_worker():
+    for conn in _worker_conns:
+        conn.close()
+
+
+def _aggregate_range(bounds):
+    """
+    Compute the partial aggregates of one tid range over the connections of the worker process.
+
+    Returns:
+        dict: A Counter per key of PARTITION_QUERIES.
+    """
+    lo, hi = bounds
+    partial = {name: Counter() for name in PARTITION_QUERIES}
+    for conn in _worker_conns:
+        for name, query in PARTITION_QUERIES.items():
+            partial[name].update(dict(conn.execute(query, {"lo": lo, "hi": hi})))
+    # replies were counted by the tweet replied to, which may be in any file
+    replies = partial["replies_received"]
+    partial["replies_received"] = Counter()
+    tids = json.dumps(list(replies))
+    for conn in _worker_conns:
+        for tid, writer in conn.execute(_WRITERS_QUERY, (tids,)):
+            partial["replies_received"][writer] += replies[tid]
+    return partial
+
+
+def run_analytics(db_name, workers=ANALYTICS_WORKERS, partitions=None, immutable=False):
+    """
+    Count tweets, replies received and retweets received per user, and mentions per hashtag.
+
+    The tweet IDs are split into ranges (see partition_bounds), and each range is aggregated in SQL by
+    one of a pool of processes, each with its own read-only connection; the parent adds up the partial
+    Counters as they come in. Workers share nothing but the OS page cache, so the scan scales with the
+    number of cores, and each one only holds the aggregates of the range it is working on.
+
+    Run it on a snapshot (see snapshot.py) with immutable for figures as of one point in time; on a live
+    database each range is read in its own transaction. The tweets of a sharded database are read from
+    every shard, and those of an archived database from both tiers (see open_tweet_files).
+
+    Args:
+        db_name (str): Path of the SQLite database file, already upgraded to the latest schema.
+        workers (int, optional): Worker processes; 1 aggregates every range in this process.
+            Default is ANALYTICS_WORKERS, the number of CPUs.
+        partitions (int, optional): Number of tid ranges. Defaults to PARTITION_ROWS tweets per range,
+            and at least PARTITIONS_PER_WORKER ranges per worker.
+        immutable (bool, optional): Open the file immutable, for snapshots. Default is False.
+
+    Returns:
+        dict: A Counter per key of PARTITION_QUERIES, by user ID or, for hashtag_mentions, by term,
+        and "partitions", the number of ranges.
+    """
+    conns = open_tweet_files(db_name, immutable)
+    try:
+        if partitions is None:
+            max_rowid = sum(_max_rowid(conn) for conn in conns)
+            partitions = max(workers * PARTITIONS_PER_WORKER, -(-max_rowid // PARTITION_ROWS))
+        bounds = partition_bounds(conns, partitions)
+    finally:
+        # the connections are closed before the worker processes are started, so none inherits them
+        for conn in conns:
+            conn.close()
+
+    totals = {name: Counter() for name in PARTITION_QUERIES}
+    if workers == 1:
+        _open_worker(db_name, immutable)
+        try:
+            for partial in map(_aggregate_range, bounds):
+                for name, counts in partial.items():
+                    totals[name].update(counts)
+        finally:
+            _close_worker()
+        return dict(totals, partitions=len(bounds))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker, initargs=(db_name, immutable)) as pool:
+        for future in as_completed([pool.submit(_aggregate_range, part) for part in bounds]):
+            for name, counts in future.result().items():
+                totals[name].update(counts)
+    return dict(totals, partitions=len(bounds))
+
+
+def write_reports(results, output_dir):
+    """
+    Write the per-user and per-hashtag reports as CSV files.
+
+    users.csv has a row of (usr, tweets, replies_received, retweets_received) for every user with at
+    least one non-zero count, by user ID; hashtags.csv a row of (term, mentions) for every hashtag,
+    most mentioned first.
+
+    Args:
+        results (dict): The results of run_analytics.
+        output_dir (str): Directory for the files, created if it does not exist.
+
+    Returns:
+        list: The paths of the files written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    users_path = os.path.join(output_dir, "users.csv")
+    with open(users_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("usr",) + USER_METRICS)
+        users = set().union(*(results[name] for name in USER_METRICS))
+        writer.writerows((usr,) + tuple(results[name][usr] for name in USER_METRICS) for usr in sorted(users))
+    hashtags_path = os.path.join(output_dir, "hashtags.csv")
+    with open(hashtags_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("term", "mentions"))
+        writer.writerows(sorted(results["hashtag_mentions"].items(), key=lambda item: (-item[1], item[0])))
+    return [users_path, hashtags_path]
+
+
+def main(argv):
+    """
+    Compute the per-user and per-hashtag reports, print the top of each and optionally write them as CSV.
+
+    Usage: python analytics.py DATABASE [--workers N] [--partitions N] [--output DIR] [--immutable]
+    """
+    args = argv[1:]
+    options = {"--workers": str(ANALYTICS_WORKERS), "--partitions": None, "--output": None}
+    positional = []
+    immutable = False
+    while args:
+        arg = args.pop(0)
+        if arg == "--immutable":
+            immutable = True
+        elif arg in options and args:
+            options[arg] = args.pop(0)
+        else:
+            positional.append(arg)
+    if len(positional) != 1:
+        print("Usage: python analytics.py DATABASE [--workers N] [--partitions N] [--output DIR] [--immutable]")
+        return 2
+    workers = int(options["--workers"])
+    partitions = int(options["--partitions"]) if options["--partitions"] else None
+    started = time.perf_counter()
+    results = run_analytics(positional[0], workers, partitions, immutable)
+    elapsed = time.perf_counter() - started
+    print(f"{results['partitions']} partitions on {workers} workers in {elapsed:.2f}s")
+    for name in PARTITION_QUERIES:
+        print(f"\nTop {name}:")
+        for key, count in results[name].most_common(REPORT_TOP_K):
+            print(f"  {key}: {count}")
+    if options["--output"]:
+        for path in write_reports(results, options["--output"]):
+            print(f"Wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
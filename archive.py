@@ -0,0 +1,480 @@
+import os
+import sys
+import time
+from datetime import date, timedelta
+from urllib.parse import quote
+
+from dbconfig import open_connection
+from feed import FANOUT_FOLLOWER_LIMIT
+from search import TWEETS_FTS_STATEMENTS
+from trending import TWEET_DAY, TWEET_HAS_HOUR, TWEET_HOUR, day_of
+
+# Tweets older than this many days are archived when no cutoff date is given
+ARCHIVE_AFTER_DAYS = 90
+# Threads moved per transaction, so that the archive job never holds the write lock for long
+ARCHIVE_BATCH_THREADS = 1000
+
+# The tables that hold tweets, as in the main database but without the foreign keys, whose parent rows
+# (users, hashtags) are in another file, with the indexes the feed, profile, thread and search queries use.
+TWEET_TABLE_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS tweets (
+           tid      int,
+           writer   int,
+           tdate    date,
+           text     char(80),
+           replyto  int,
+           primary key (tid)
+       )""",
+    """CREATE TABLE IF NOT EXISTS mentions (
+           tid   int,
+           term  char(10),
+           primary key (tid, term)
+       )""",
+    """CREATE TABLE IF NOT EXISTS retweets (
+           usr    int,
+           tid    int,
+           rdate  date,
+           primary key (usr, tid)
+       )""",
+    "CREATE INDEX IF NOT EXISTS tweets_writer_tdate_tid ON tweets (writer, tdate, tid)",
+    "CREATE INDEX IF NOT EXISTS tweets_replyto_tid ON tweets (replyto, tid)",
+    "CREATE INDEX IF NOT EXISTS tweets_tdate ON tweets (tdate)",
+    "CREATE INDEX IF NOT EXISTS mentions_term_tid ON mentions (term, tid)",
+    "CREATE INDEX IF NOT EXISTS retweets_tid ON retweets (tid)",
+    "CREATE INDEX IF NOT EXISTS retweets_usr_rdate_tid ON retweets (usr, rdate, tid)",
+]
+
+# The cold database: the archived tweets with their full-text index, and the cutoff date, below which every
+# archived tweet and retweet is dated. The counters and hashtag rollups stay in the main database and keep
+# counting the archived rows, so the cold file has no triggers but those of the full-text index.
+COLD_SCHEMA_STATEMENTS = TWEET_TABLE_STATEMENTS + TWEETS_FTS_STATEMENTS + [
+    """CREATE TABLE IF NOT EXISTS archive_state (
+           cutoff  date NOT NULL
+       )""",
+    "INSERT INTO archive_state (cutoff) SELECT '' WHERE NOT EXISTS (SELECT 1 FROM archive_state)",
+]
+
+# The columns of each tweet table, in the order both tiers list them
+_TIER_TABLES = {
+    "tweets": "tid, writer, tdate, text, replyto",
+    "mentions": "tid, term",
+    "retweets": "usr, tid, rdate",
+}
+
+# Every thread of the main database whose first tweet is older than :cutoff, as (tid, root) for each of its
+# tweets. A reply to a tweet that is not in the main database starts a thread of its own.
+_OLD_THREADS = """
+    WITH RECURSIVE thread (tid, root) AS (
+        SELECT tid, tid FROM main.tweets t
+        WHERE {tweet_day} < :cutoff
+          AND (t.replyto IS NULL OR NOT EXISTS (SELECT 1 FROM main.tweets p WHERE p.tid = t.replyto))
+        UNION
+        SELECT t.tid, thread.root
+        FROM thread
+        JOIN main.tweets t ON t.replyto = thread.tid
+        )
+    INSERT OR IGNORE INTO temp.archive_threads (tid, root)
+    SELECT tid, root FROM thread
+""".format(tweet_day=day_of("t.tdate"))
+
+# Threads with a tweet or a retweet from :cutoff on stay in the main database as a whole
+_ACTIVE_THREADS = """
+    DELETE FROM temp.archive_threads
+    WHERE root IN (
+        SELECT a.root FROM temp.archive_threads a JOIN main.tweets t ON t.tid = a.tid WHERE {tweet_day} >= :cutoff
+        UNION
+        SELECT a.root FROM main.retweets r JOIN temp.archive_threads a ON a.tid = r.tid WHERE {retweet_day} >= :cutoff
+    )
+""".format(tweet_day=day_of("t.tdate"), retweet_day=day_of("r.rdate"))
+
+# The whole thread of a tweet of the cold database: the tweets it replies to, and every reply below them
+_COLD_THREAD = """
+    WITH RECURSIVE up (tid, replyto) AS (
+        SELECT tid, replyto FROM cold.tweets WHERE tid = ?
+        UNION
+        SELECT t.tid, t.replyto FROM up JOIN cold.tweets t ON t.tid = up.replyto
+        ),
+    down (tid) AS (
+        SELECT tid FROM up
+        UNION
+        SELECT t.tid FROM down JOIN cold.tweets t ON t.replyto = down.tid
+        )
+    INSERT INTO temp.archive_batch (tid)
+    SELECT tid FROM down
+"""
+
+_BATCH = "(SELECT tid FROM temp.archive_batch)"
+
+# The delete triggers of the main database decrement the counters and the hashtag rollups of the tweets,
+# mentions and retweets moved out, and the insert triggers increment them for those moved back, so they are
+# adjusted by as much the other way: they keep counting archived rows. The adjustments read the rows of the
+# batch in the main database, so they run before an archive deletes them, with {sign} +, and after a
+# restore has copied them, with {sign} -.
+_ADJUSTMENTS = [
+    f"""INSERT INTO main.user_stats (usr, tweet_count)
+        SELECT writer, {{sign}} COUNT(*) FROM main.tweets WHERE tid IN {_BATCH} GROUP BY writer
+        ON CONFLICT (usr) DO UPDATE SET tweet_count = tweet_count + excluded.tweet_count""",
+    f"""INSERT INTO main.tweet_stats (tid, reply_count)
+        SELECT replyto, {{sign}} COUNT(*) FROM main.tweets WHERE tid IN {_BATCH} AND replyto IS NOT NULL GROUP BY replyto
+        ON CONFLICT (tid) DO UPDATE SET reply_count = reply_count + excluded.reply_count""",
+    f"""INSERT INTO main.tweet_stats (tid, retweet_count)
+        SELECT tid, {{sign}} COUNT(*) FROM main.retweets WHERE tid IN {_BATCH} GROUP BY tid
+        ON CONFLICT (tid) DO UPDATE SET retweet_count = retweet_count + excluded.retweet_count""",
+    f"""INSERT INTO main.hashtag_daily (day, term, count)
+        SELECT {TWEET_DAY} AS day, m.term, {{sign}} COUNT(*) FROM main.mentions m JOIN main.tweets t ON t.tid = m.tid
+        WHERE m.tid IN {_BATCH} AND day IS NOT NULL GROUP BY day, m.term
+        ON CONFLICT (day, term) DO UPDATE SET count = count + excluded.count""",
+    f"""INSERT INTO main.hashtag_hourly (hour, term, count)
+        SELECT {TWEET_HOUR} AS hour, m.term, {{sign}} COUNT(*) FROM main.mentions m JOIN main.tweets t ON t.tid = m.tid
+        WHERE m.tid IN {_BATCH} AND {TWEET_HAS_HOUR} GROUP BY hour, m.term
+        ON CONFLICT (hour, term) DO UPDATE SET count = count + excluded.count""",
+]
+
+
+def _copy_statements(source, target):
+    """
+    Build the statements that copy the tweets of temp.archive_batch, with their mentions and retweets, from
+    one tier to the other. Rows already in the target are left as they are. Tweets go first, so that the
+    rollup triggers of the main database find the tweet of every mention copied to it.
+    """
+    return [f"""INSERT OR IGNORE INTO {target}.{table} ({columns})
+                SELECT {columns} FROM {source}.{table} WHERE tid IN {_BATCH}"""
+            for table, columns in _TIER_TABLES.items()]
+
+
+def _delete_statements(source):
+    """
+    Build the statements that delete the tweets of temp.archive_batch, with their mentions and retweets,
+    from one tier. Tweets go last, so that the rollup triggers of the main database find the tweet of
+    every mention deleted from it.
+    """
+    return [f"DELETE FROM {source}.{table} WHERE tid IN {_BATCH}" for table in ("mentions", "retweets", "tweets")]
+
+
+_ARCHIVE_COPY_STATEMENTS = _copy_statements("main", "cold")
+_ARCHIVE_DELETE_STATEMENTS = [statement.format(sign="+") for statement in _ADJUSTMENTS] + _delete_statements("main")
+_RESTORE_COPY_STATEMENTS = _copy_statements("cold", "main") + [statement.format(sign="-") for statement in _ADJUSTMENTS]
+_RESTORE_DELETE_STATEMENTS = _delete_statements("cold")
+
+# The archived tweets and retweets of :flwee, for the timeline of a new follower :flwer, unless :flwee has
+# more than :fanout_limit followers; see feed.backfill_follow
+_BACKFILL_COLD_FOLLOW = """
+    INSERT OR IGNORE INTO main.timeline (owner, date, tid, usr, kind)
+    SELECT :flwer, tdate, tid, writer, 0 FROM cold.tweets
+    WHERE writer = :flwee
+      AND COALESCE((SELECT follower_count FROM main.user_stats WHERE usr = :flwee), 0) <= :fanout_limit
+    UNION ALL
+    SELECT :flwer, rdate, tid, usr, 1 FROM cold.retweets
+    WHERE usr = :flwee
+      AND COALESCE((SELECT follower_count FROM main.user_stats WHERE usr = :flwee), 0) <= :fanout_limit
+"""
+
+
+def cold_path(db_name):
+    """
+    Returns:
+        str: The path of the cold database of a database, e.g. SQLdata.cold.db for SQLdata.db.
+    """
+    root, ext = os.path.splitext(db_name)
+    return f"{root}.cold{ext}"
+
+
+def _uri(path, read_only, immutable):
+    """
+    Build the name to ATTACH a file under, read-only or immutable like the connection it is attached to.
+    """
+    if immutable:
+        return f"file:{quote(path)}?mode=ro&immutable=1"
+    if read_only:
+        return f"file:{quote(path)}?mode=ro"
+    return path
+
+
+def attach_cold(conn, db_name, read_only=False, immutable=False):
+    """
+    Attach the cold database of a database, if it has one, to a connection to it as the schema "cold".
+
+    Args:
+        conn (sqlite3.Connection): A connection to the main database, outside any transaction.
+        db_name (str): Path of the main SQLite database file.
+        read_only (bool, optional): Attach the file read-only; the connection must accept URI file names.
+            Default is False.
+        immutable (bool, optional): Attach the file immutable, for snapshots. Default is False.
+
+    Returns:
+        bool: Whether a cold database was attached.
+    """
+    path = cold_path(db_name)
+    if not os.path.exists(path):
+        return False
+    conn.execute("ATTACH DATABASE ? AS cold", (_uri(path, read_only, immutable),))
+    return True
+
+
+def is_cold_attached(conn):
+    """
+    Returns:
+        bool: Whether a cold database is attached to the connection as the schema "cold".
+    """
+    return any(row[1] == "cold" for row in conn.execute("PRAGMA database_list"))
+
+
+def create_cold(db_name):
+    """
+    Create the cold database of a database, or add the tables it is missing.
+    """
+    conn = open_connection(cold_path(db_name))
+    try:
+        with conn:
+            for statement in COLD_SCHEMA_STATEMENTS:
+                conn.execute(statement)
+    finally:
+        conn.close()
+
+
+def connect_cold(db_name, stats=None, immutable=False, **kwargs):
+    """
+    Open a read-only connection to the cold database of a database, with the main database attached.
+
+    The cold file is the main schema of the connection and the main database is attached as "hot", so the
+    unqualified names of the application's queries resolve to the archived tweets, mentions and retweets,
+    and to the users, follows, timelines, lists and counters of the main database: the feed, list, search,
+    profile and thread queries run unchanged on it and read the cold tier only.
+
+    Args:
+        db_name (str): Path of the main SQLite database file.
+        stats (QueryStats, optional): Record the statements of the connection in it; see store.connect.
+        immutable (bool, optional): Open both files immutable, for snapshots. Default is False.
+        **kwargs: Passed on to sqlite3.connect, e.g. cached_statements or factory.
+
+    Returns:
+        sqlite3.Connection: A connection object to the cold database, or None if there is none.
+    """
+    path = cold_path(db_name)
+    if not os.path.exists(path):
+        return None
+    conn = open_connection(path, read_only=True, immutable=immutable, **kwargs)
+    if stats is not None:
+        conn.stats = stats
+    conn.execute("ATTACH DATABASE ? AS hot", (_uri(db_name, True, immutable),))
+    return conn
+
+
+def cold_cutoff(conn):
+    """
+    Look up the archive cutoff: every tweet and retweet of the cold tier is dated before it.
+
+    Args:
+        conn (sqlite3.Connection): A connection from connect_cold.
+
+    Returns:
+        str: The cutoff date as YYYY-MM-DD, or '' if nothing was archived. Compare the days of tweet and
+        retweet dates with it (see trending.iso_day): older rows are dated DD-MON-YYYY.
+    """
+    return conn.execute("SELECT cutoff FROM archive_state").fetchone()[0]
+
+
+def merge_tiers(conn):
+    """
+    Make the unqualified tweets, mentions and retweets of a connection read both tiers, until it is closed.
+
+    Temporary views over the main and cold tables shadow the main tables, so whole-table maintenance
+    statements, such as the counter and timeline rebuilds, cover the archived rows. Writes to the shadowed
+    names then fail, so use this on connections opened for such a job only.
+
+    Args:
+        conn (sqlite3.Connection): A connection from store.connect.
+
+    Returns:
+        bool: Whether a cold database is attached, and the views were created.
+    """
+    if not is_cold_attached(conn):
+        return False
+    for table, columns in _TIER_TABLES.items():
+        conn.execute(f"""CREATE TEMP VIEW IF NOT EXISTS {table} AS
+                         SELECT {columns} FROM main.{table} UNION ALL SELECT {columns} FROM cold.{table}""")
+    return True
+
+
+def _create_batch_tables(conn):
+    """
+    Create the temporary tables that hold the tweets to move.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (tid INTEGER PRIMARY KEY)")
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_threads (tid INTEGER PRIMARY KEY, root int)")
+    conn.execute("CREATE INDEX IF NOT EXISTS temp.archive_threads_root ON archive_threads (root)")
+
+
+def restore_thread(conn, tid):
+    """
+    Move the thread of an archived tweet back to the main database.
+
+    Called before a reply to or a retweet of a tweet, so that new rows never refer to a tweet of the
+    cold tier, and a thread with recent activity is in the main database as a whole. Nothing is done
+    if the tweet is not archived.
+
+    The thread is copied to the main database, with its counters and rollups adjusted, in one transaction,
+    then deleted from the cold database in another, so that a crash leaves it in both files rather than
+    in neither. Tweets already in the main database are not copied again, so the next call for the thread
+    completes the move.
+
+    Args:
+        conn (sqlite3.Connection): A connection from store.connect, outside any transaction.
+        tid (int): The ID of the tweet.
+
+    Returns:
+        int: Number of tweets moved back.
+    """
+    if not is_cold_attached(conn) or conn.execute("SELECT 1 FROM cold.tweets WHERE tid = ?", (tid,)).fetchone() is None:
+        return 0
+    _create_batch_tables(conn)
+    with conn:
+        conn.execute("DELETE FROM temp.archive_batch")
+        # replies may be inserted before the tweets they reply to; the keys are checked at commit
+        conn.execute("PRAGMA defer_foreign_keys = ON")
+        conn.execute(_COLD_THREAD, (tid,))
+        conn.execute("DELETE FROM temp.archive_batch WHERE tid IN (SELECT tid FROM main.tweets)")
+        for statement in _RESTORE_COPY_STATEMENTS:
+            conn.execute(statement)
+    with conn:
+        conn.execute("DELETE FROM temp.archive_batch")
+        conn.execute(_COLD_THREAD, (tid,))
+        # only the tweets the main database now holds
+        conn.execute("DELETE FROM temp.archive_batch WHERE tid NOT IN (SELECT tid FROM main.tweets)")
+        for statement in _RESTORE_DELETE_STATEMENTS:
+            conn.execute(statement)
+        moved = conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+        conn.execute("DELETE FROM temp.archive_batch")
+    return moved
+
+
+def backfill_cold_follow(conn, flwer, flwee, fanout_limit=FANOUT_FOLLOWER_LIMIT):
+    """
+    Add the archived tweets and retweets of flwee to the timeline of flwer, as feed.backfill_follow does
+    for those of the main database.
+
+    Args:
+        conn (sqlite3.Connection): A connection from store.connect with the cold database attached.
+        flwer (int): The user ID of the new follower.
+        flwee (int): The user ID of the user followed.
+        fanout_limit (int, optional): Nothing is added if flwee has more followers than this.
+            Default is FANOUT_FOLLOWER_LIMIT.
+    """
+    conn.execute(_BACKFILL_COLD_FOLLOW, {"flwer": flwer, "flwee": flwee, "fanout_limit": fanout_limit})
+
+
+def archive_tweets(db_name, cutoff, batch_threads=ARCHIVE_BATCH_THREADS):
+    """
+    Move the threads that have been inactive since before a cutoff date to the cold database.
+
+    A thread is moved as a whole, with the mentions and retweets of its tweets, once every one of its
+    tweets and retweets is dated before the cutoff, so a reply and the tweet it replies to are always in
+    the same file. Dates are compared by day, whether stored as YYYY-MM-DD or, like older rows, as
+    DD-MON-YYYY (see trending.day_of). The cutoff is recorded in the cold database before any tweet is
+    moved: every archived row is dated before it, so reads only need the cold tier once they page past it.
+
+    The counters and hashtag rollups of the main database keep counting the archived rows, and the
+    timelines keep their entries, which the cold tier of the feed joins with the archived tweets.
+
+    Threads are moved batch_threads at a time. Each batch is copied to the cold database in one transaction,
+    then deleted from the main database in another, so that a crash leaves it in both files rather than in
+    neither: a transaction across two files is not atomic in WAL mode. Only the tweets found in the cold
+    database are deleted, so a thread restored in between stays. The next run finds the threads a crash
+    left in both files among the old ones of the main database, and deletes them from it.
+
+    Args:
+        db_name (str): Path of the main SQLite database file. The cold database is created next to it.
+        cutoff (str): Date as YYYY-MM-DD; threads active on or after it stay in the main database.
+        batch_threads (int, optional): Threads moved per transaction. Default is ARCHIVE_BATCH_THREADS.
+
+    Returns:
+        int: Number of tweets archived.
+    """
+    from store import connect
+
+    create_cold(db_name)
+    conn = connect(db_name)
+    try:
+        with conn:
+            conn.execute("UPDATE cold.archive_state SET cutoff = MAX(cutoff, ?)", (cutoff,))
+        _create_batch_tables(conn)
+        with conn:
+            conn.execute("DELETE FROM temp.archive_threads")
+            conn.execute(_OLD_THREADS, {"cutoff": cutoff})
+            conn.execute(_ACTIVE_THREADS, {"cutoff": cutoff})
+        archived = 0
+        while True:
+            with conn:
+                conn.execute("DELETE FROM temp.archive_batch")
+                conn.execute("""
+                    INSERT INTO temp.archive_batch (tid)
+                    SELECT tid FROM temp.archive_threads
+                    WHERE root IN (SELECT DISTINCT root FROM temp.archive_threads ORDER BY root LIMIT ?)
+                """, (batch_threads,))
+                if conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0] == 0:
+                    break
+                conn.execute(f"DELETE FROM temp.archive_threads WHERE tid IN {_BATCH}")
+                for statement in _ARCHIVE_COPY_STATEMENTS:
+                    conn.execute(statement)
+            with conn:
+                conn.execute("DELETE FROM temp.archive_batch WHERE tid NOT IN (SELECT tid FROM cold.tweets)")
+                # a thread's replies and retweets are deleted with it; the keys are checked at commit
+                conn.execute("PRAGMA defer_foreign_keys = ON")
+                for statement in _ARCHIVE_DELETE_STATEMENTS:
+                    conn.execute(statement)
+                archived += conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+        return archived
+    finally:
+        conn.close()
+
+
+def main(argv):
+    """
+    Archive the tweets of inactive threads to the cold database, and report the size of each tier.
+
+    Usage: python archive.py DATABASE [--before YYYY-MM-DD | --days N] [--vacuum]
+    """
+    args = argv[1:]
+    options = {"--before": None, "--days": str(ARCHIVE_AFTER_DAYS)}
+    positional = []
+    vacuum = False
+    while args:
+        arg = args.pop(0)
+        if arg == "--vacuum":
+            vacuum = True
+        elif arg in options and args:
+            options[arg] = args.pop(0)
+        else:
+            positional.append(arg)
+    if len(positional) != 1:
+        print("Usage: python archive.py DATABASE [--before YYYY-MM-DD | --days N] [--vacuum]")
+        return 2
+    db_name = positional[0]
+    cutoff = options["--before"] or (date.today() - timedelta(days=int(options["--days"]))).isoformat()
+    try:
+        date.fromisoformat(cutoff)
+    except ValueError:
+        print(f"--before takes a date as YYYY-MM-DD, not {cutoff!r}.")
+        return 2
+    started = time.perf_counter()
+    archived = archive_tweets(db_name, cutoff)
+    print(f"Archived {archived} tweets dated before {cutoff} in {time.perf_counter() - started:.1f}s")
+    if vacuum:
+        # the main file only shrinks once its free pages are given back
+        conn = open_connection(db_name)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+    for path in (db_name, cold_path(db_name)):
+        conn = open_connection(path, read_only=True)
+        try:
+            tweets = conn.execute("SELECT COUNT(*) FROM tweets").fetchone()[0]
+        finally:
+            conn.close()
+        print(f"{path}: {tweets} tweets, {os.path.getsize(path)} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,395 @@
+import json
+import math
+import platform
+import random
+import resource
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+from feed import feed_cursor
+from hydrate import query_hashtags
+from querystats import QueryStats
+from store import TwitterStore, connect
+
+# Timed calls per benchmark, after WARMUP_RUNS untimed ones
+BENCH_RUNS = 200
+WARMUP_RUNS = 10
+# Calls per benchmark made again under tracemalloc to measure peak Python memory
+MEMORY_RUNS = 10
+COMPOSE_RUNS = 500
+# Page sizes of the hydration benchmark, and pages hydrated per size
+HYDRATION_PAGE_SIZES = (5, 20, 50, 100)
+HYDRATION_RUNS = 50
+# Benchmarks that measure the cached path; every other one clears the caches before each call
+CACHED_BENCHMARKS = {"search_tweets_repeated"}
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of a sorted list.
+
+    Args:
+        sorted_values (list): Values in ascending order.
+        fraction (float): Between 0 and 1, e.g. 0.99 for p99.
+
+    Returns:
+        float: The smallest value with at least fraction of the values at or below it.
+    """
+    if not sorted_values:
+        return None
+    rank = min(max(1, math.ceil(fraction * len(sorted_values))), len(sorted_values))
+    return sorted_values[rank - 1]
+
+
+def measure(operation, inputs, warmup=WARMUP_RUNS, memory_runs=MEMORY_RUNS):
+    """
+    Time an operation over a list of inputs and measure its peak Python memory.
+
+    Args:
+        operation (callable): Called with each input.
+        inputs (list): The inputs, one call each.
+        warmup (int, optional): Untimed calls made first. Default is WARMUP_RUNS.
+        memory_runs (int, optional): Calls made again under tracemalloc. Default is MEMORY_RUNS.
+
+    Returns:
+        dict: runs, p50_ms, p99_ms, mean_ms, max_ms, rows (average rows returned) and python_peak_kb.
+    """
+    for value in inputs[:warmup]:
+        operation(value)
+    latencies = []
+    rows = 0
+    for value in inputs:
+        started = time.perf_counter()
+        result = operation(value)
+        latencies.append((time.perf_counter() - started) * 1000)
+        rows += len(result) if isinstance(result, list) else 1
+    latencies.sort()
+
+    # tracemalloc slows every allocation down, so memory is measured separately from the timings
+    tracemalloc.start()
+    for value in inputs[:memory_runs]:
+        operation(value)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "runs": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50), 4),
+        "p99_ms": round(percentile(latencies, 0.99), 4),
+        "mean_ms": round(sum(latencies) / len(latencies), 4),
+        "max_ms": round(latencies[-1], 4),
+        "rows": round(rows / len(latencies), 2),
+        "python_peak_kb": round(peak / 1024, 1),
+    }
+
+
+class Workload:
+    """
+    Draw the inputs of the benchmarks from the database itself, so they hit existing users, words and hashtags.
+
+    Rows are picked at a random rowid, which costs one index lookup per draw whatever the size of the table.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        seed (int): Seed of the random number generator; the same seed draws the same inputs.
+    """
+
+    def __init__(self, conn, seed):
+        self.conn = conn
+        self.rng = random.Random(seed)
+
+    def _sample(self, table, column, count):
+        """
+        Draw the column of count random rows of a table, or an empty list if the table is empty.
+        """
+        low, high = self.conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table}").fetchone()
+        if low is None:
+            return []
+        values = []
+        for _ in range(count):
+            row = self.conn.execute(f"SELECT {column} FROM {table} WHERE rowid >= ? ORDER BY rowid LIMIT 1",
+                                    (self.rng.randint(low, high),)).fetchone()
+            values.append(row[0])
+        return values
+
+    def followers(self, count):
+        """
+        Returns:
+            list: User IDs that follow at least one account, drawn in proportion to their followees.
+        """
+        return self._sample("follows", "flwer", count)
+
+    def users(self, count):
+        """
+        Returns:
+            list: Random user IDs.
+        """
+        return self._sample("users", "usr", count)
+
+    def tweet_texts(self, count):
+        """
+        Returns:
+            list: Texts of random tweets.
+        """
+        return [text or "" for text in self._sample("tweets", "text", count)]
+
+    def keywords(self, count):
+        """
+        Returns:
+            list: One-keyword searches, each a word of three or more letters from a random tweet.
+        """
+        searches = []
+        for text in self.tweet_texts(count * 2):
+            words = [word for word in text.split() if len(word) >= 3 and not word.startswith("#")]
+            if words:
+                searches.append([self.rng.choice(words)])
+        return searches[:count]
+
+    def hashtags(self, count):
+        """
+        Returns:
+            list: One-hashtag searches, drawn in proportion to how often each term is mentioned.
+        """
+        return [["#" + term] for term in self._sample("mentions", "term", count)]
+
+    def tweet_pages(self, count, size):
+        """
+        Returns:
+            list: Lists of size tweet IDs, each of consecutive tweets from a random rowid on.
+        """
+        low, high = self.conn.execute("SELECT MIN(rowid), MAX(rowid) FROM tweets").fetchone()
+        if low is None:
+            return []
+        return [[row[0] for row in self.conn.execute("SELECT tid FROM tweets WHERE rowid >= ? ORDER BY rowid LIMIT ?",
+                                                     (self.rng.randint(low, high), size))]
+                for _ in range(count)]
+
+    def lists(self, count):
+        """
+        Returns:
+            list: Names of random lists.
+        """
+        return self._sample("lists", "lname", count)
+
+    def name_fragments(self, count):
+        """
+        Returns:
+            list: The first three letters of random user names.
+        """
+        return [name[:3] for name in self._sample("users", "name", count) if name]
+
+
+def _uncached(store, operation):
+    """
+    Returns:
+        callable: The operation, with the store's profile, tweet and search caches cleared before each call
+        so that it is measured against the database.
+    """
+    def run(value):
+        store.cache.clear()
+        store.search_cache.clear()
+        return operation(value)
+    return run
+
+
+def table_counts(conn):
+    """
+    Returns:
+        dict: Row count of every table of the original schema.
+    """
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("users", "follows", "tweets", "hashtags", "mentions", "retweets", "lists", "includes")}
+
+
+def hydrate_per_row(store, tids):
+    """
+    Look up what a page of tweets shows one tweet at a time, as the menu used to: the tweet with its
+    writer's name, its counters, its hashtags and the tweet it replies to. The baseline of hydrate_tweets.
+
+    Returns:
+        dict: Rows as returned by TwitterStore.hydrate_tweets, by tweet ID.
+    """
+    details = {}
+    for tid in tids:
+        detail = store.tweet_detail(tid)
+        if detail is not None:
+            parent = store.tweet_header(detail[5]) if detail[5] is not None else None
+            details[tid] = detail + (tuple(query_hashtags(store.conn, [tid]).get(tid, ())), parent)
+    return details
+
+
+def run_hydration_benchmark(db_name, page_sizes=HYDRATION_PAGE_SIZES, runs=HYDRATION_RUNS, seed=0):
+    """
+    Compare hydrating pages of tweets in one query per concern with a lookup per tweet, as pages grow.
+
+    The cache is cleared before each page, so every page is read from the database. The number of
+    statements per page is counted on an instrumented connection: it stays the same whatever the page
+    size with TwitterStore.hydrate_tweets, and grows with it with hydrate_per_row.
+
+    Args:
+        db_name (str): Path of the SQLite database file.
+        page_sizes (tuple, optional): Tweets per page. Default is HYDRATION_PAGE_SIZES.
+        runs (int, optional): Pages hydrated per page size and method. Default is HYDRATION_RUNS.
+        seed (int, optional): Seed for drawing the pages. Default is 0.
+
+    Returns:
+        dict: By page size, a result of measure() per method, with queries_per_page added.
+    """
+    stats = QueryStats()
+    store = TwitterStore(connect(db_name, stats=stats))
+    try:
+        workload = Workload(store.conn, seed)
+        methods = {"batched": store.hydrate_tweets, "per_row": lambda tids: hydrate_per_row(store, tids)}
+        results = {}
+        for size in page_sizes:
+            pages = workload.tweet_pages(runs, size)
+            if not pages:
+                break
+            results[size] = {}
+            for name, hydrate in methods.items():
+                def operation(tids):
+                    store.cache.clear()
+                    return list(hydrate(tids).values())
+
+                result = measure(operation, pages, warmup=0, memory_runs=0)
+                stats.reset()
+                for tids in pages:
+                    operation(tids)
+                result["queries_per_page"] = round(
+                    sum(entry["calls"] for entry in stats.snapshot()["statements"]) / len(pages), 2)
+                results[size][name] = result
+        return results
+    finally:
+        store.close()
+
+
+def run_benchmarks(db_name, runs=BENCH_RUNS, seed=0, writes=True, compose_runs=COMPOSE_RUNS, query_stats=False):
+    """
+    Time the query behind each entry point of the application.
+
+    The feed benchmarks time the first page and the page after it, the search benchmarks a keyword and a
+    #hashtag search, then user search, profile counters, who-to-follow and list timelines. With writes, compose_tweet is timed last;
+    it adds tweets to the database, so run it against a generated copy. The hydration of pages of tweets
+    of several sizes is compared with a lookup per tweet; see run_hydration_benchmark.
+
+    Args:
+        db_name (str): Path of the SQLite database file.
+        runs (int, optional): Timed calls per benchmark. Default is BENCH_RUNS.
+        seed (int, optional): Seed for drawing the inputs. Default is 0.
+        writes (bool, optional): Also time compose_tweet. Default is True.
+        compose_runs (int, optional): Tweets composed by the write benchmark. Default is COMPOSE_RUNS.
+        query_stats (bool, optional): Also report the per-statement stats of querystats, which adds
+            its own overhead to the timings. Default is False.
+
+    Returns:
+        dict: The environment, table counts, a result per benchmark, the load time of the follow graph,
+        the peak RSS of the process, the cache and search cache counters, the hydration results by page size and,
+        with query_stats, the per-statement stats.
+    """
+    stats = QueryStats() if query_stats else None
+    store = TwitterStore(connect(db_name, stats=stats))
+    try:
+        workload = Workload(store.conn, seed)
+        readers = workload.followers(runs)
+        # the page after the first one, continued from its last row
+        second_pages = []
+        for usr in readers:
+            first = store.feed_page(usr)
+            if first:
+                second_pages.append((usr, feed_cursor(first[-1])))
+
+        # the follow graph is loaded once, on the first who-to-follow query; its load is timed on its own
+        started = time.perf_counter()
+        graph = store.follow_graph()
+        graph_load_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        # a few popular searches repeated, as users do, which the search cache answers after the first time
+        popular = workload.keywords(10) + workload.hashtags(10)
+        repeated = [popular[i % len(popular)] for i in range(runs)] if popular else []
+
+        benchmarks = {
+            "feed_first_page": (lambda usr: store.feed_page(usr), readers),
+            "feed_next_page": (lambda args: store.feed_page(args[0], cursor=args[1]), second_pages),
+            "search_tweets_keyword": (store.search_tweets, workload.keywords(runs)),
+            "search_tweets_hashtag": (store.search_tweets, workload.hashtags(runs)),
+            "search_tweets_repeated": (store.search_tweets, repeated),
+            "search_users": (store.search_users, workload.name_fragments(runs)),
+            "profile_counts": (store.profile, workload.users(runs)),
+            "who_to_follow": (store.who_to_follow, readers),
+            "list_first_page": (store.list_page, workload.lists(runs)),
+        }
+        results = {}
+        for name, (operation, inputs) in benchmarks.items():
+            if inputs:
+                results[name] = measure(operation if name in CACHED_BENCHMARKS else _uncached(store, operation),
+                                        inputs)
+
+        if writes:
+            writers = workload.users(compose_runs)
+            texts = workload.tweet_texts(compose_runs)
+            started = time.perf_counter()
+            result = measure(lambda args: store.compose_tweet(*args), list(zip(writers, texts)), warmup=0,
+                             memory_runs=0)
+            result["ops_per_sec"] = round(result["runs"] / (time.perf_counter() - started), 1)
+            results["compose_tweet"] = result
+
+        report = {
+            "database": db_name,
+            "seed": seed,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "tables": table_counts(store.conn),
+            "benchmarks": results,
+            "follow_graph": {"follows": len(graph), "load_ms": graph_load_ms},
+            # ru_maxrss is in KiB on Linux
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "cache": store.cache.stats(),
+            "search_cache": store.search_cache.stats(),
+        }
+        if stats is not None:
+            report["queries"] = stats.snapshot()
+    finally:
+        store.close()
+    report["hydration"] = run_hydration_benchmark(db_name, runs=min(runs, HYDRATION_RUNS), seed=seed)
+    return report
+
+
+def main(argv):
+    """
+    Run the benchmarks and write the results as JSON.
+
+    Usage: python bench.py DATABASE [--runs N] [--seed S] [--output FILE] [--no-writes] [--query-stats]
+    """
+    args = argv[1:]
+    options = {"--runs": str(BENCH_RUNS), "--seed": "0", "--output": None}
+    positional = []
+    writes = True
+    query_stats = False
+    while args:
+        arg = args.pop(0)
+        if arg == "--no-writes":
+            writes = False
+        elif arg == "--query-stats":
+            query_stats = True
+        elif arg in options and args:
+            options[arg] = args.pop(0)
+        else:
+            positional.append(arg)
+    if len(positional) != 1:
+        print("Usage: python bench.py DATABASE [--runs N] [--seed S] [--output FILE] [--no-writes] [--query-stats]")
+        return 2
+    report = run_benchmarks(positional[0], int(options["--runs"]), int(options["--seed"]), writes,
+                            query_stats=query_stats)
+    output = json.dumps(report, indent=2)
+    if options["--output"]:
+        with open(options["--output"], "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,150 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Memory the cache may hold, in bytes, and seconds an entry stays valid
+CACHE_BYTES = 8 * 1024 * 1024
+CACHE_TTL = 60.0
+# Bookkeeping per entry on top of the key and value: the OrderedDict link and the (value, size, expiry) tuple
+ENTRY_OVERHEAD = 200
+
+_MISSING = object()
+
+
+def estimate_size(value):
+    """
+    Estimate the memory held by a cached value.
+
+    Args:
+        value: None, a scalar, or a tuple or list of scalars such as a database row.
+
+    Returns:
+        int: Approximate size in bytes.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class LRUCache:
+    """
+    A bounded, thread-safe cache with least-recently-used eviction and a time to live.
+
+    Entries are evicted when the total estimated size of keys and values would exceed max_bytes,
+    so the budget holds however large the cached rows are.
+
+    Args:
+        max_bytes (int, optional): Memory budget in bytes. Default is CACHE_BYTES.
+        ttl (float, optional): Seconds after which an entry is reloaded. Default is CACHE_TTL.
+        clock (callable, optional): Returns the current time in seconds. Default is time.monotonic.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES, ttl=CACHE_TTL, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _remove(self, key):
+        value, size, expires = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key, default=None):
+        """
+        Look up a key, counting a hit or a miss.
+
+        Returns:
+            The cached value, or default if the key is missing or has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entries to stay within the memory budget.
+        A value larger than the whole budget is not stored.
+        """
+        size = estimate_size(key) + estimate_size(value) + ENTRY_OVERHEAD
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            while self._bytes + size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (value, size, self.clock() + self.ttl)
+            self._bytes += size
+
+    def get_or_load(self, key, load):
+        """
+        Read through the cache: return the cached value, or call load() and cache its result.
+
+        Args:
+            key: The cache key.
+            load (callable): Computes the value on a miss; a None result is cached too.
+
+        Returns:
+            The value for the key.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = load()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, *keys):
+        """
+        Drop the given keys, so the next lookups reload them.
+        """
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        """
+        Drop every entry; the counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, hit_rate, evictions, expirations, invalidations, entries, bytes and max_bytes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,218 @@
+import sys
+
+
+# Expected counter values computed from the base tables, with only non-zero rows.
+EXPECTED_TWEET_STATS = """
+    SELECT tid, SUM(replies) AS reply_count, SUM(retweets) AS retweet_count
+    FROM (
+        SELECT replyto AS tid, COUNT(*) AS replies, 0 AS retweets
+        FROM tweets
+        WHERE replyto IS NOT NULL
+        GROUP BY replyto
+
+        UNION ALL
+
+        SELECT tid, 0, COUNT(*)
+        FROM retweets
+        GROUP BY tid
+        )
+    GROUP BY tid
+"""
+
+EXPECTED_USER_STATS = """
+    SELECT usr, SUM(tweets) AS tweet_count, SUM(followers) AS follower_count, SUM(following) AS following_count
+    FROM (
+        SELECT writer AS usr, COUNT(*) AS tweets, 0 AS followers, 0 AS following
+        FROM tweets
+        GROUP BY writer
+
+        UNION ALL
+
+        SELECT flwee, 0, COUNT(*), 0
+        FROM follows
+        GROUP BY flwee
+
+        UNION ALL
+
+        SELECT flwer, 0, 0, COUNT(*)
+        FROM follows
+        GROUP BY flwer
+        )
+    GROUP BY usr
+"""
+
+REBUILD_STATEMENTS = [
+    "DELETE FROM tweet_stats",
+    "INSERT INTO tweet_stats (tid, reply_count, retweet_count) " + EXPECTED_TWEET_STATS,
+    "DELETE FROM user_stats",
+    "INSERT INTO user_stats (usr, tweet_count, follower_count, following_count) " + EXPECTED_USER_STATS,
+]
+
+# Counter tables and the triggers that keep them up to date on every write to tweets and
+# retweets, whichever code path performs it.
+TWEET_COUNTER_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS tweet_stats (
+           tid            int,
+           reply_count    int NOT NULL DEFAULT 0,
+           retweet_count  int NOT NULL DEFAULT 0,
+           primary key (tid)
+       )""",
+    """CREATE TABLE IF NOT EXISTS user_stats (
+           usr              int,
+           tweet_count      int NOT NULL DEFAULT 0,
+           follower_count   int NOT NULL DEFAULT 0,
+           following_count  int NOT NULL DEFAULT 0,
+           primary key (usr)
+       )""",
+    """CREATE TRIGGER IF NOT EXISTS tweets_stats_insert AFTER INSERT ON tweets BEGIN
+           INSERT INTO user_stats (usr, tweet_count) VALUES (new.writer, 1)
+               ON CONFLICT (usr) DO UPDATE SET tweet_count = tweet_count + 1;
+           INSERT INTO tweet_stats (tid, reply_count) SELECT new.replyto, 1 WHERE new.replyto IS NOT NULL
+               ON CONFLICT (tid) DO UPDATE SET reply_count = reply_count + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS tweets_stats_delete AFTER DELETE ON tweets BEGIN
+           UPDATE user_stats SET tweet_count = tweet_count - 1 WHERE usr = old.writer;
+           UPDATE tweet_stats SET reply_count = reply_count - 1 WHERE tid = old.replyto;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS tweets_stats_update AFTER UPDATE OF writer, replyto ON tweets BEGIN
+           UPDATE user_stats SET tweet_count = tweet_count - 1 WHERE usr = old.writer;
+           UPDATE tweet_stats SET reply_count = reply_count - 1 WHERE tid = old.replyto;
+           INSERT INTO user_stats (usr, tweet_count) VALUES (new.writer, 1)
+               ON CONFLICT (usr) DO UPDATE SET tweet_count = tweet_count + 1;
+           INSERT INTO tweet_stats (tid, reply_count) SELECT new.replyto, 1 WHERE new.replyto IS NOT NULL
+               ON CONFLICT (tid) DO UPDATE SET reply_count = reply_count + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS retweets_stats_insert AFTER INSERT ON retweets BEGIN
+           INSERT INTO tweet_stats (tid, retweet_count) VALUES (new.tid, 1)
+               ON CONFLICT (tid) DO UPDATE SET retweet_count = retweet_count + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS retweets_stats_delete AFTER DELETE ON retweets BEGIN
+           UPDATE tweet_stats SET retweet_count = retweet_count - 1 WHERE tid = old.tid;
+       END""",
+]
+
+# The triggers that keep the follower and following counters up to date on every write to follows
+FOLLOW_COUNTER_STATEMENTS = [
+    """CREATE TRIGGER IF NOT EXISTS follows_stats_insert AFTER INSERT ON follows BEGIN
+           INSERT INTO user_stats (usr, following_count) VALUES (new.flwer, 1)
+               ON CONFLICT (usr) DO UPDATE SET following_count = following_count + 1;
+           INSERT INTO user_stats (usr, follower_count) VALUES (new.flwee, 1)
+               ON CONFLICT (usr) DO UPDATE SET follower_count = follower_count + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS follows_stats_delete AFTER DELETE ON follows BEGIN
+           UPDATE user_stats SET following_count = following_count - 1 WHERE usr = old.flwer;
+           UPDATE user_stats SET follower_count = follower_count - 1 WHERE usr = old.flwee;
+       END""",
+]
+
+SCHEMA_STATEMENTS = TWEET_COUNTER_STATEMENTS + FOLLOW_COUNTER_STATEMENTS
+
+
+def tweet_counts(conn, tid):
+    """
+    Look up the engagement counters of a tweet.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        tid (int): The tweet ID.
+
+    Returns:
+        tuple: (reply_count, retweet_count) of the tweet.
+    """
+    row = conn.execute("SELECT reply_count, retweet_count FROM tweet_stats WHERE tid = ?", (tid,)).fetchone()
+    return row if row is not None else (0, 0)
+
+
+def user_counts(conn, usr):
+    """
+    Look up the social counters of a user.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        usr (int): The user ID.
+
+    Returns:
+        tuple: (tweet_count, following_count, follower_count) of the user.
+    """
+    row = conn.execute("SELECT tweet_count, following_count, follower_count FROM user_stats WHERE usr = ?",
+                       (usr,)).fetchone()
+    return row if row is not None else (0, 0, 0)
+
+
+def rebuild_counters(conn):
+    """
+    Recompute every counter from the base tables.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+    """
+    with conn:
+        for statement in REBUILD_STATEMENTS:
+            conn.execute(statement)
+
+
+def verify_counters(conn):
+    """
+    Compare the counters against the base tables.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+
+    Returns:
+        list: (table, key) for every tweet_stats or user_stats entry that has drifted.
+    """
+    drift = []
+    for table, key, expected, actual in (
+        ("tweet_stats", "tid", EXPECTED_TWEET_STATS,
+         "SELECT tid, reply_count, retweet_count FROM tweet_stats WHERE reply_count != 0 OR retweet_count != 0"),
+        ("user_stats", "usr", EXPECTED_USER_STATS,
+         """SELECT usr, tweet_count, follower_count, following_count FROM user_stats
+            WHERE tweet_count != 0 OR follower_count != 0 OR following_count != 0"""),
+    ):
+        rows = conn.execute(f"""
+            SELECT DISTINCT {key}
+            FROM (
+                SELECT * FROM (SELECT * FROM ({expected}) EXCEPT SELECT * FROM ({actual}))
+                UNION ALL
+                SELECT * FROM (SELECT * FROM ({actual}) EXCEPT SELECT * FROM ({expected}))
+                )
+            ORDER BY {key}
+        """).fetchall()
+        drift.extend((table, row[0]) for row in rows)
+    return drift
+
+
+def main(argv):
+    """
+    Verify the counters of a database and optionally repair them.
+
+    Usage: python counters.py DATABASE [--rebuild]
+    """
+    from archive import merge_tiers
+    from store import connect
+
+    if len(argv) < 2:
+        print("Usage: python counters.py DATABASE [--rebuild]")
+        return 2
+    conn = connect(argv[1])
+    try:
+        # the counters include archived tweets and retweets
+        merge_tiers(conn)
+        drift = verify_counters(conn)
+        for table, key in drift:
+            print(f"Drift in {table}: {key}")
+        if "--rebuild" in argv[2:]:
+            rebuild_counters(conn)
+            print("Counters rebuilt.")
+            return 0
+        if drift:
+            print(f"{len(drift)} counters have drifted, run with --rebuild to repair them.")
+            return 1
+        print("Counters are consistent.")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,102 @@
+import sqlite3
+from urllib.parse import quote
+
+
+# Pragmas applied to every connection the application opens. WAL lets readers and a writer work
+# at the same time, busy_timeout makes concurrent writers wait for the lock instead of failing with
+# "database is locked", and wal_autocheckpoint together with journal_size_limit keeps the WAL file
+# from growing without bound under sustained writes.
+CONNECTION_PROFILE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,            # milliseconds
+    "cache_size": -65536,            # negative values are KiB, so 64 MiB
+    "mmap_size": 268435456,          # 256 MiB
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+    "wal_autocheckpoint": 1000,      # pages
+    "journal_size_limit": 67108864,  # bytes the WAL is truncated to after a checkpoint
+}
+
+# Pragmas of immutable connections, as used on snapshots. SQLite then takes no locks and never checks the file
+# for changes, and with a memory map large enough for the whole file it reads pages straight from the OS page
+# cache, which reader processes on the same host share, instead of copying them into its own cache.
+SNAPSHOT_PROFILE = {
+    "mmap_size": 1073741824,         # 1 GiB; SQLite caps it at its compile-time limit, 2 GB by default
+    "cache_size": -16384,            # 16 MiB, for temporary b-trees; file pages come from the memory map
+    "temp_store": "MEMORY",
+    "query_only": "ON",
+}
+
+# Pragmas that change the database file rather than the connection, which a read-only connection cannot set
+_FILE_PRAGMAS = {"journal_mode"}
+
+# Seconds between the TRUNCATE checkpoints run by long-lived writers such as the HTTP service. The automatic
+# checkpoints are PASSIVE and never wait for readers, so under a steady stream of readers they may never get
+# to reset the WAL.
+CHECKPOINT_INTERVAL = 60.0
+
+
+def apply_profile(conn, profile=None, read_only=False):
+    """
+    Apply a connection profile to an open connection.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        profile (dict, optional): Pragma names and values. Defaults to CONNECTION_PROFILE.
+        read_only (bool, optional): Skip the pragmas that would write to the database file. Default is False.
+    """
+    if profile is None:
+        profile = CONNECTION_PROFILE
+    for name, value in profile.items():
+        if read_only and name in _FILE_PRAGMAS:
+            continue
+        # PRAGMA does not accept parameters; names and values come from the profile, not from users
+        conn.execute(f"PRAGMA {name} = {value}").fetchall()
+
+
+def open_connection(db_name, read_only=False, profile=None, immutable=False, **kwargs):
+    """
+    Open a connection to the database with the connection profile applied.
+
+    Args:
+        db_name (str): Path of the SQLite database file.
+        read_only (bool, optional): Open the file with mode=ro so no write is possible. Default is False.
+        profile (dict, optional): Pragma names and values. Defaults to CONNECTION_PROFILE, or to
+            SNAPSHOT_PROFILE when immutable.
+        immutable (bool, optional): Open the file read-only with immutable=1, for files that nothing writes
+            to while they are open, such as snapshots. Default is False.
+        **kwargs: Passed on to sqlite3.connect, e.g. cached_statements.
+
+    Returns:
+        sqlite3.Connection: A connection object to the SQLite database.
+    """
+    if immutable:
+        conn = sqlite3.connect(f"file:{quote(db_name)}?mode=ro&immutable=1", uri=True, **kwargs)
+        apply_profile(conn, SNAPSHOT_PROFILE if profile is None else profile, read_only=True)
+        return conn
+    if read_only:
+        conn = sqlite3.connect(f"file:{quote(db_name)}?mode=ro", uri=True, **kwargs)
+    else:
+        conn = sqlite3.connect(db_name, **kwargs)
+    apply_profile(conn, profile, read_only)
+    return conn
+
+
+def checkpoint(conn, mode="TRUNCATE"):
+    """
+    Copy the WAL back into the database file.
+
+    With TRUNCATE (or RESTART) the checkpoint waits, up to busy_timeout, for readers of older snapshots so
+    that the WAL can start over from the beginning.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        mode (str, optional): PASSIVE, FULL, RESTART or TRUNCATE. Default is TRUNCATE.
+
+    Returns:
+        tuple: (busy, wal pages, pages checkpointed) as reported by PRAGMA wal_checkpoint.
+    """
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"unknown checkpoint mode {mode}")
+    return conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
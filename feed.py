@@ -0,0 +1,266 @@
+import heapq
+import sys
+
+
+FEED_PAGE_SIZE = 5
+
+# Tweets and retweets of accounts with at most this many followers are pushed to every
+# follower's timeline when they are written. Posts of accounts above it are pulled from
+# tweets and retweets and merged in when a feed is read, so one post of a popular account
+# does not turn into a timeline insert per follower.
+FANOUT_FOLLOWER_LIMIT = 10000
+
+# Timeline entries of a user, newest first, as feed rows (tid, writer, date, text, replyto, kind) where kind
+# is 0 for a tweet and 1 for a retweet (writer is then the retweeting user). The (date, tid, writer, kind)
+# tuple is unique per row and is the keyset cursor; the primary key of timeline is in that order.
+_FEED_QUERY = """
+    SELECT e.tid, e.usr AS writer, e.date, t.text, t.replyto, e.kind
+    FROM timeline e
+    JOIN tweets t ON t.tid = e.tid
+    WHERE e.owner = :usr {timeline_where}
+    ORDER BY e.date DESC, e.tid DESC, e.usr DESC, e.kind DESC
+    LIMIT :limit
+"""
+
+FIRST_PAGE_QUERY = _FEED_QUERY.format(timeline_where="")
+NEXT_PAGE_QUERY = _FEED_QUERY.format(
+    timeline_where="AND (e.date, e.tid, e.usr, e.kind) < (:date, :tid, :writer, :kind)")
+
+# The followees of a user above the fan-out limit, whose tweets and retweets are pulled when the feed is read
+PULLED_FOLLOWEES_QUERY = """
+    SELECT f.flwee
+    FROM follows f
+    JOIN user_stats s ON s.usr = f.flwee
+    WHERE f.flwer = :usr AND s.follower_count > :fanout_limit
+"""
+
+# Timeline entries of the followers of the writer of a new tweet or retweet, skipped when the
+# writer has more than :fanout_limit followers.
+_PUSH_TWEET = """
+    INSERT OR IGNORE INTO timeline (owner, date, tid, usr, kind)
+    SELECT f.flwer, t.tdate, t.tid, t.writer, 0
+    FROM tweets t
+    JOIN follows f ON f.flwee = t.writer
+    WHERE t.tid = :tid
+      AND COALESCE((SELECT follower_count FROM user_stats WHERE usr = t.writer), 0) <= :fanout_limit
+"""
+
+_PUSH_RETWEET = """
+    INSERT OR IGNORE INTO timeline (owner, date, tid, usr, kind)
+    SELECT f.flwer, r.rdate, r.tid, r.usr, 1
+    FROM retweets r
+    JOIN follows f ON f.flwee = r.usr
+    WHERE r.usr = :usr AND r.tid = :tid
+      AND COALESCE((SELECT follower_count FROM user_stats WHERE usr = r.usr), 0) <= :fanout_limit
+"""
+
+# Every tweet and retweet of :flwee, for the timeline of a new follower :flwer. Like the pushes, nothing is
+# copied when :flwee has more than :fanout_limit followers, since the feed pulls their posts.
+_BACKFILL_FOLLOW = """
+    INSERT OR IGNORE INTO timeline (owner, date, tid, usr, kind)
+    SELECT :flwer, tdate, tid, writer, 0 FROM tweets
+    WHERE writer = :flwee
+      AND COALESCE((SELECT follower_count FROM user_stats WHERE usr = :flwee), 0) <= :fanout_limit
+    UNION ALL
+    SELECT :flwer, rdate, tid, usr, 1 FROM retweets
+    WHERE usr = :flwee
+      AND COALESCE((SELECT follower_count FROM user_stats WHERE usr = :flwee), 0) <= :fanout_limit
+"""
+
+SCHEMA_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS timeline (
+           owner  int,
+           date   date,
+           tid    int,
+           usr    int,
+           kind   int,
+           primary key (owner, date, tid, usr, kind)
+       ) WITHOUT ROWID""",
+]
+
+# Like the pushes above, the rebuild leaves out accounts with more than FANOUT_FOLLOWER_LIMIT followers,
+# whose posts are pulled when a feed is read.
+REBUILD_STATEMENTS = [
+    "DELETE FROM timeline",
+    f"""INSERT OR IGNORE INTO timeline (owner, date, tid, usr, kind)
+       SELECT f.flwer, t.tdate, t.tid, t.writer, 0 FROM follows f JOIN tweets t ON t.writer = f.flwee
+       WHERE f.flwee NOT IN (SELECT usr FROM user_stats WHERE follower_count > {int(FANOUT_FOLLOWER_LIMIT)})
+       UNION ALL
+       SELECT f.flwer, r.rdate, r.tid, r.usr, 1 FROM follows f JOIN retweets r ON r.usr = f.flwee
+       WHERE f.flwee NOT IN (SELECT usr FROM user_stats WHERE follower_count > {int(FANOUT_FOLLOWER_LIMIT)})""",
+]
+
+def feed_cursor(row):
+    """
+    Build the keyset cursor that continues a feed after the given row.
+
+    Args:
+        row (tuple): The last feed row that was returned.
+
+    Returns:
+        tuple: (date, tid, writer, kind) of the row.
+    """
+    tid, writer, date, text, replyto, kind = row
+    return (date, tid, writer, kind)
+
+
+def get_feed_page(conn, usr_id, page_size=FEED_PAGE_SIZE, cursor=None, fanout_limit=FANOUT_FOLLOWER_LIMIT):
+    """
+    Retrieve one page of the feed of tweets and retweets from the users that usr_id follows.
+
+    The page of the timeline is merged with the tweets and retweets of the followees above fanout_limit,
+    each read from an index in feed order through lists.member_stream, so that a page costs about
+    page_size rows per stream whatever the followees' history. Rows that are both in the timeline and
+    pulled, which happens when an account crosses the limit, are returned once.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        usr_id (int): User ID for whom to retrieve the feed.
+        page_size (int, optional): Maximum number of rows to return. Default is FEED_PAGE_SIZE.
+        cursor (tuple, optional): Cursor from feed_cursor() of the last row already seen,
+            or None for the first page.
+        fanout_limit (int, optional): Follower count above which followees are pulled rather than
+            read from the timeline. Default is FANOUT_FOLLOWER_LIMIT.
+
+    Returns:
+        list: Up to page_size rows of (tid, writer, date, text, replyto, kind), newest first.
+    """
+    from lists import pulled_streams
+
+    params = {"usr": usr_id, "limit": page_size}
+    if cursor is None:
+        rows = conn.execute(FIRST_PAGE_QUERY, params).fetchall()
+    else:
+        params["date"], params["tid"], params["writer"], params["kind"] = cursor
+        rows = conn.execute(NEXT_PAGE_QUERY, params).fetchall()
+    pulled = [row[0] for row in conn.execute(PULLED_FOLLOWEES_QUERY, {"usr": usr_id, "fanout_limit": fanout_limit})]
+    if not pulled:
+        return rows
+    page = []
+    for row in heapq.merge(rows, *pulled_streams(conn, pulled, cursor, page_size), key=feed_cursor, reverse=True):
+        if not page or row != page[-1]:
+            page.append(row)
+            if len(page) == page_size:
+                break
+    return page
+
+
+def iter_feed_pages(conn, usr_id, page_size=FEED_PAGE_SIZE, fanout_limit=FANOUT_FOLLOWER_LIMIT):
+    """
+    Lazily yield the feed of a user one page at a time.
+
+    Each page is fetched only when the previous one has been consumed, so memory and
+    latency depend on the page size rather than on the followees' history.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        usr_id (int): User ID for whom to retrieve the feed.
+        page_size (int, optional): Number of rows per page. Default is FEED_PAGE_SIZE.
+        fanout_limit (int, optional): Follower count above which followees are pulled rather than
+            read from the timeline. Default is FANOUT_FOLLOWER_LIMIT.
+
+    Yields:
+        list: Non-empty pages of feed rows, newest first.
+    """
+    cursor = None
+    while True:
+        page = get_feed_page(conn, usr_id, page_size, cursor, fanout_limit)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        cursor = feed_cursor(page[-1])
+
+
+def push_tweet(conn, tid, fanout_limit=FANOUT_FOLLOWER_LIMIT):
+    """
+    Add a new tweet to the timelines of its writer's followers.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        tid (int): The ID of the tweet, which must already be inserted.
+        fanout_limit (int, optional): Writers with more followers than this are not pushed.
+            Default is FANOUT_FOLLOWER_LIMIT.
+    """
+    conn.execute(_PUSH_TWEET, {"tid": tid, "fanout_limit": fanout_limit})
+
+
+def push_tweets(conn, tids, fanout_limit=FANOUT_FOLLOWER_LIMIT):
+    """
+    Add a batch of new tweets to the timelines of their writers' followers.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        tids (iterable): The IDs of the tweets, which must already be inserted.
+        fanout_limit (int, optional): Writers with more followers than this are not pushed.
+            Default is FANOUT_FOLLOWER_LIMIT.
+    """
+    conn.executemany(_PUSH_TWEET, ({"tid": tid, "fanout_limit": fanout_limit} for tid in tids))
+
+
+def push_retweet(conn, usr, tid, fanout_limit=FANOUT_FOLLOWER_LIMIT):
+    """
+    Add a new retweet to the timelines of the retweeting user's followers.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        usr (int): The user who retweeted.
+        tid (int): The ID of the retweeted tweet; the retweet must already be inserted.
+        fanout_limit (int, optional): Users with more followers than this are not pushed.
+            Default is FANOUT_FOLLOWER_LIMIT.
+    """
+    conn.execute(_PUSH_RETWEET, {"usr": usr, "tid": tid, "fanout_limit": fanout_limit})
+
+
+def backfill_follow(conn, flwer, flwee, fanout_limit=FANOUT_FOLLOWER_LIMIT):
+    """
+    Add the existing tweets and retweets of a newly followed user to the follower's timeline.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        flwer (int): The user who started following.
+        flwee (int): The user being followed.
+        fanout_limit (int, optional): Nothing is added if flwee has more followers than this.
+            Default is FANOUT_FOLLOWER_LIMIT.
+    """
+    conn.execute(_BACKFILL_FOLLOW, {"flwer": flwer, "flwee": flwee, "fanout_limit": fanout_limit})
+
+
+def rebuild_timelines(conn):
+    """
+    Recompute every timeline from follows, tweets and retweets.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+    """
+    with conn:
+        for statement in REBUILD_STATEMENTS:
+            conn.execute(statement)
+
+
+def main(argv):
+    """
+    Rebuild the timelines of a database.
+
+    Usage: python feed.py DATABASE --rebuild
+    """
+    from archive import merge_tiers
+    from store import connect
+
+    if len(argv) < 3 or argv[2] != "--rebuild":
+        print("Usage: python feed.py DATABASE --rebuild")
+        return 2
+    conn = connect(argv[1])
+    try:
+        # the timelines keep the entries of archived tweets and retweets, which the feed reads from the cold tier
+        merge_tiers(conn)
+        rebuild_timelines(conn)
+        print("Timelines rebuilt.")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,444 @@
+import os
+import random
+import sqlite3
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from math import gcd
+
+from ids import ID_EPOCH_MS, SEQUENCE_BITS, id_timestamp_prefix
+from store import connect
+
+# The tables of SQLdata.db. Everything else (indexes, full-text index, counters, timelines, ID sequences)
+# is added by the migrations when the generated database is first opened with store.connect.
+BASE_SCHEMA = [
+    """CREATE TABLE users (
+  usr         int,
+  pwd         char(4),
+  name        char(20),
+  email       char(15),
+  city        char(12),
+  timezone    float,
+  primary key (usr)
+)""",
+    """CREATE TABLE follows (
+  flwer       int,
+  flwee       int,
+  start_date  date,
+  primary key (flwer,flwee),
+  foreign key (flwer) references users,
+  foreign key (flwee) references users
+)""",
+    """CREATE TABLE tweets (
+  tid         int,
+  writer      int,
+  tdate       date,
+  text        char(80),
+  replyto     int,
+  primary key (tid),
+  foreign key (writer) references users,
+  foreign key (replyto) references tweets
+)""",
+    """CREATE TABLE hashtags (
+  term        char(10),
+  primary key (term)
+)""",
+    """CREATE TABLE mentions (
+  tid         int,
+  term        char(10),
+  primary key (tid,term),
+  foreign key (tid) references tweets,
+  foreign key (term) references hashtags
+)""",
+    """CREATE TABLE retweets (
+  usr         int,
+  tid         int,
+  rdate       date,
+  primary key (usr,tid),
+  foreign key (usr) references users,
+  foreign key (tid) references tweets
+)""",
+    """CREATE TABLE lists (
+  lname        char(12),
+  owner        int,
+  primary key (lname),
+  foreign key (owner) references users
+)""",
+    """CREATE TABLE includes (
+  lname       char(12),
+  member      int,
+  primary key (lname,member),
+  foreign key (lname) references lists,
+  foreign key (member) references users
+)""",
+]
+
+# Named sizes for --scale; any count can also be given on its own.
+SCALES = {
+    "small": {"users": 1000, "tweets": 10000},
+    "medium": {"users": 100000, "tweets": 1000000},
+    "large": {"users": 1000000, "tweets": 10000000},
+}
+
+# Average number of accounts each user follows, and retweets per tweet
+FOLLOWING_PER_USER = 10
+RETWEETS_PER_TWEET = 0.5
+REPLY_FRACTION = 0.2
+# Users per list; a list has between LIST_MIN_MEMBERS and LIST_MAX_MEMBERS members
+USERS_PER_LIST = 50
+LIST_MIN_MEMBERS = 5
+LIST_MAX_MEMBERS = 30
+
+# Shape and scale of the Pareto draws below. Rank k (0 being the most popular) is drawn with probability
+# roughly proportional to (1 + k / scale) ** -(alpha + 1): the smaller alpha, the heavier the tail, and
+# the top rank gets about alpha / scale of the draws.
+POPULARITY_ALPHA = 0.8   # who gets followed, retweeted and added to lists
+POPULARITY_SCALE = 50
+ACTIVITY_ALPHA = 1.0     # who writes tweets and retweets
+ACTIVITY_SCALE = 100
+FOLLOWING_ALPHA = 1.5    # how many accounts a user follows; Pareto(1.5) has mean 3
+WORD_ALPHA = 1.1         # word, hashtag and city frequencies
+WORD_SCALE = 5
+VIRALITY_ALPHA = 0.7     # which tweets are retweeted
+VIRALITY_SCALE = 10
+
+VOCABULARY_SIZE = 5000
+HASHTAG_VOCABULARY_SIZE = 500
+TEXT_LENGTH = 80
+
+# Tweets are spread over the DAYS_SPAN days before END_DATE, which is fixed so that a seed
+# always produces the same database.
+END_DATE = datetime(2024, 12, 31, tzinfo=timezone.utc)
+DAYS_SPAN = 365
+
+# Rows per executemany and transaction while loading
+LOAD_BATCH_SIZE = 10000
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "be", "da", "fu", "go", "ha", "ji", "ku", "ma",
+              "no", "pe", "ri", "so", "ta", "ul", "ve", "wi", "ya", "zo", "ar", "el", "in", "on", "st", "th"]
+
+
+def power_law_index(rng, n, alpha, scale=1.0):
+    """
+    Draw an index in range(n) where small indexes are much more likely than large ones.
+
+    Args:
+        rng (random.Random): The random number generator.
+        n (int): The number of indexes.
+        alpha (float): Shape of the Pareto distribution; smaller values give a heavier tail.
+        scale (float, optional): Spreads the head of the distribution over more indexes. Default is 1.0.
+
+    Returns:
+        int: Index k, drawn with probability roughly proportional to (1 + k / scale) ** -(alpha + 1).
+    """
+    while True:
+        k = int(scale * (rng.paretovariate(alpha) - 1))
+        if k < n:
+            return k
+
+
+def _stride(n, rng):
+    """
+    Pick a multiplier coprime with n, so that k * stride % n is a permutation of range(n).
+    """
+    if n <= 2:
+        return 1
+    while True:
+        stride = rng.randrange(n // 3, n)
+        if gcd(stride, n) == 1:
+            return stride
+
+
+def _words(rng, count, min_syllables, max_syllables):
+    """
+    Make count distinct pronounceable words out of random syllables.
+    """
+    words = []
+    seen = set()
+    while len(words) < count:
+        word = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(min_syllables, max_syllables)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def _load(conn, sql, rows, batch_size=LOAD_BATCH_SIZE):
+    """
+    Insert rows with one executemany and one transaction per batch, without reading ahead.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        with conn:
+            conn.executemany(sql, batch)
+
+
+class Generator:
+    """
+    Produce the rows of a synthetic database from a seed.
+
+    Users are ranked twice, by popularity and by activity, each rank being a random permutation of the IDs.
+    The followers an account attracts follow a power law over its popularity rank, so a few accounts are
+    followed by a large share of the users (and are pulled rather than pushed to timelines) while most have a
+    handful of followers. The tweets and retweets it writes follow a power law over its activity rank.
+
+    Args:
+        users (int): Number of users.
+        tweets (int): Number of tweets.
+        seed (int): Seed of the random number generator.
+        following (int, optional): Average number of accounts a user follows. Default is FOLLOWING_PER_USER.
+        retweets (float, optional): Average number of retweets per tweet. Default is RETWEETS_PER_TWEET.
+    """
+
+    def __init__(self, users, tweets, seed, following=FOLLOWING_PER_USER, retweets=RETWEETS_PER_TWEET):
+        self.users = users
+        self.tweets = tweets
+        self.following = following
+        self.retweets = retweets
+        self.rng = random.Random(seed)
+        self.popularity_stride = _stride(users, self.rng)
+        self.activity_stride = _stride(users, self.rng)
+        self.tweet_stride = _stride(tweets, self.rng)
+        self.vocabulary = _words(self.rng, VOCABULARY_SIZE, 1, 4)
+        self.hashtags = _words(self.rng, HASHTAG_VOCABULARY_SIZE, 2, 4)
+        self.cities = [city.capitalize() for city in _words(self.rng, max(20, users // 1000), 2, 3)]
+        # tweet IDs in creation order, needed to pick reply and retweet targets
+        self.tids = array("q")
+
+    def popular_user(self):
+        """
+        Returns:
+            int: A user ID, drawn by popularity rank.
+        """
+        rank = power_law_index(self.rng, self.users, POPULARITY_ALPHA, POPULARITY_SCALE)
+        return rank * self.popularity_stride % self.users + 1
+
+    def active_user(self):
+        """
+        Returns:
+            int: A user ID, drawn by activity rank.
+        """
+        rank = power_law_index(self.rng, self.users, ACTIVITY_ALPHA, ACTIVITY_SCALE)
+        return rank * self.activity_stride % self.users + 1
+
+    def user_rows(self):
+        """
+        Yields:
+            tuple: (usr, pwd, name, email, city, timezone) for every user.
+        """
+        rng = self.rng
+        for usr in range(1, self.users + 1):
+            name = f"{rng.choice(self.vocabulary).capitalize()} {rng.choice(self.vocabulary).capitalize()}"[:20]
+            city = self.cities[power_law_index(rng, len(self.cities), WORD_ALPHA, WORD_SCALE)]
+            yield usr, f"{rng.randrange(10000):04d}", name, f"u{usr}@mail.com", city, rng.randint(-12, 12)
+
+    def follow_rows(self):
+        """
+        Yields:
+            tuple: (flwer, flwee, start_date) with out-degrees drawn from a Pareto distribution
+            and followees drawn by popularity.
+        """
+        rng = self.rng
+        scale = self.following / 3
+        start = END_DATE - timedelta(days=DAYS_SPAN)
+        for flwer in range(1, self.users + 1):
+            count = min(int(scale * rng.paretovariate(FOLLOWING_ALPHA)), (self.users - 1) // 2)
+            followees = set()
+            for _ in range(4 * count):
+                if len(followees) >= count:
+                    break
+                flwee = self.popular_user()
+                if flwee != flwer:
+                    followees.add(flwee)
+            for flwee in sorted(followees):
+                date = start + timedelta(days=rng.randrange(DAYS_SPAN))
+                yield flwer, flwee, date.strftime("%Y-%m-%d")
+
+    def text(self):
+        """
+        Returns:
+            tuple: (text of at most TEXT_LENGTH characters, list of its hashtag terms).
+        """
+        rng = self.rng
+        terms = [self.hashtags[power_law_index(rng, len(self.hashtags), WORD_ALPHA, WORD_SCALE)]
+                 for _ in range(min(3, int(rng.paretovariate(2.0)) - 1))]
+        tags = " ".join("#" + term for term in terms)
+        words = []
+        length = len(tags)
+        for _ in range(rng.randint(4, 12)):
+            word = self.vocabulary[power_law_index(rng, len(self.vocabulary), WORD_ALPHA, WORD_SCALE)]
+            if length + len(word) + 1 > TEXT_LENGTH:
+                break
+            words.append(word)
+            length += len(word) + 1
+        words.append(tags)
+        return " ".join(words).strip(), sorted(set(terms))
+
+    def tweet_rows(self):
+        """
+        Yields:
+            tuple: ((tid, writer, tdate, text, replyto), hashtag terms), oldest first, with tid
+            time-ordered like the IDs allocated by ids.reserve_tweet_ids.
+        """
+        rng = self.rng
+        start = (END_DATE - timedelta(days=DAYS_SPAN)).timestamp()
+        step = DAYS_SPAN * 86400 / self.tweets
+        last_tid = 0
+        for i in range(self.tweets):
+            created = start + (i + rng.random()) * step
+            tid = max(id_timestamp_prefix(created), last_tid + 1)
+            last_tid = tid
+            replyto = None
+            if i and rng.random() < REPLY_FRACTION:
+                # replies mostly go to recent tweets
+                replyto = self.tids[i - 1 - power_law_index(rng, i, 1.0)]
+            self.tids.append(tid)
+            writer = self.active_user()
+            text, terms = self.text()
+            tdate = datetime.fromtimestamp(created, tz=timezone.utc).strftime("%Y-%m-%d")
+            yield (tid, writer, tdate, text, replyto), terms
+
+    def retweet_rows(self):
+        """
+        Yields:
+            tuple: (usr, tid, rdate), with tweets drawn by a power law so a few are retweeted many times.
+            Must be called after tweet_rows has been consumed.
+        """
+        rng = self.rng
+        for _ in range(int(self.tweets * self.retweets)):
+            rank = power_law_index(rng, self.tweets, VIRALITY_ALPHA, VIRALITY_SCALE)
+            tid = self.tids[rank * self.tweet_stride % self.tweets]
+            # generated IDs are dated before ids.FIRST_TWEET_ID, so their time is read from the prefix here
+            created = datetime.fromtimestamp(((tid >> SEQUENCE_BITS) + ID_EPOCH_MS) / 1000, tz=timezone.utc)
+            date = min(created + timedelta(days=power_law_index(rng, DAYS_SPAN, 1.0)), END_DATE)
+            yield self.active_user(), tid, date.strftime("%Y-%m-%d")
+
+    def list_rows(self):
+        """
+        Yields:
+            tuple: ((lname, owner), members) for every list.
+        """
+        rng = self.rng
+        for i in range(max(1, self.users // USERS_PER_LIST)):
+            members = {self.popular_user() for _ in range(rng.randint(LIST_MIN_MEMBERS, LIST_MAX_MEMBERS))}
+            yield (f"list{i}", self.active_user()), sorted(members)
+
+
+def generate(db_name, users, tweets, seed=0, following=FOLLOWING_PER_USER, retweets=RETWEETS_PER_TWEET,
+             progress=None):
+    """
+    Create a new database with the schema of SQLdata.db filled with synthetic data.
+
+    The base tables are loaded first with journaling off, then the database is opened with store.connect
+    so that the migrations build indexes, full-text index, counters and timelines in bulk.
+
+    Args:
+        db_name (str): Path of the database file to create; it must not exist.
+        users (int): Number of users.
+        tweets (int): Number of tweets.
+        seed (int, optional): Seed of the random number generator; the same seed gives the same database.
+        following (int, optional): Average number of accounts a user follows. Default is FOLLOWING_PER_USER.
+        retweets (float, optional): Average number of retweets per tweet. Default is RETWEETS_PER_TWEET.
+        progress (callable, optional): Called with a message before each step.
+
+    Returns:
+        dict: Row count of every base table.
+    """
+    if os.path.exists(db_name):
+        raise FileExistsError(f"{db_name} already exists")
+    if progress is None:
+        progress = lambda message: None
+    generator = Generator(users, tweets, seed, following, retweets)
+
+    conn = sqlite3.connect(db_name)
+    try:
+        # nothing to recover if a fresh file is interrupted, so skip the journal while loading
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        for statement in BASE_SCHEMA:
+            conn.execute(statement)
+
+        progress(f"Generating {users} users")
+        _load(conn, "INSERT INTO users (usr, pwd, name, email, city, timezone) VALUES (?, ?, ?, ?, ?, ?)",
+              generator.user_rows())
+        progress("Generating follows")
+        _load(conn, "INSERT INTO follows (flwer, flwee, start_date) VALUES (?, ?, ?)", generator.follow_rows())
+
+        progress(f"Generating {tweets} tweets")
+        terms_seen = set()
+        rows = iter(generator.tweet_rows())
+        while True:
+            batch = list(islice(rows, LOAD_BATCH_SIZE))
+            if not batch:
+                break
+            mentions = [(tweet[0], term) for tweet, terms in batch for term in terms]
+            new_terms = {term for tid, term in mentions} - terms_seen
+            terms_seen |= new_terms
+            with conn:
+                conn.executemany("INSERT INTO tweets (tid, writer, tdate, text, replyto) VALUES (?, ?, ?, ?, ?)",
+                                 [tweet for tweet, terms in batch])
+                conn.executemany("INSERT INTO hashtags (term) VALUES (?)", ((term,) for term in sorted(new_terms)))
+                conn.executemany("INSERT INTO mentions (tid, term) VALUES (?, ?)", mentions)
+
+        progress("Generating retweets")
+        _load(conn, "INSERT OR IGNORE INTO retweets (usr, tid, rdate) VALUES (?, ?, ?)", generator.retweet_rows())
+
+        progress("Generating lists")
+        for list_row, members in generator.list_rows():
+            with conn:
+                conn.execute("INSERT INTO lists (lname, owner) VALUES (?, ?)", list_row)
+                conn.executemany("INSERT INTO includes (lname, member) VALUES (?, ?)",
+                                 ((list_row[0], member) for member in members))
+
+        counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ("users", "follows", "tweets", "hashtags", "mentions", "retweets", "lists", "includes")}
+    finally:
+        conn.close()
+
+    progress("Building indexes, counters and timelines")
+    connect(db_name).close()
+    return counts
+
+
+def main(argv):
+    """
+    Generate a synthetic database.
+
+    Usage: python generate.py DATABASE [--scale small|medium|large] [--users N] [--tweets N] [--seed S]
+           [--following N] [--retweets R]
+    """
+    usage = ("Usage: python generate.py DATABASE [--scale small|medium|large] [--users N] [--tweets N] [--seed S] "
+             "[--following N] [--retweets R]")
+    args = argv[1:]
+    options = {"--scale": "small", "--users": None, "--tweets": None, "--seed": "0",
+               "--following": str(FOLLOWING_PER_USER), "--retweets": str(RETWEETS_PER_TWEET)}
+    positional = []
+    while args:
+        arg = args.pop(0)
+        if arg in options and args:
+            options[arg] = args.pop(0)
+        else:
+            positional.append(arg)
+    if len(positional) != 1 or options["--scale"] not in SCALES:
+        print(usage)
+        return 2
+    scale = SCALES[options["--scale"]]
+    users = int(options["--users"] or scale["users"])
+    tweets = int(options["--tweets"] or scale["tweets"])
+    try:
+        counts = generate(positional[0], users, tweets, int(options["--seed"]), int(options["--following"]),
+                          float(options["--retweets"]), progress=print)
+    except FileExistsError as e:
+        print(f"{e}, choose a new file name.")
+        return 1
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,247 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate, chain
+
+SUGGESTION_K = 10
+# Follows added after the arrays were built are kept in per-user sets, and merged into the arrays
+# once there are this many of them
+COMPACT_THRESHOLD = 10000
+
+# Typecodes of the arrays: user IDs fit in 32 bits, edge positions may not
+_USER = "i"
+_OFFSET = "q"
+
+
+def _offsets(sorted_sources, size):
+    """
+    Build the offsets of a compressed sparse row from the source of every edge, sorted.
+
+    Returns:
+        array: size + 1 offsets; the edges of node u are at positions offsets[u] to offsets[u + 1].
+    """
+    return array(_OFFSET, (bisect_left(sorted_sources, node) for node in range(size + 1)))
+
+
+def _transpose(sources, targets, size):
+    """
+    Reverse the edges of a compressed sparse row with a counting sort, without reading the database again.
+
+    The edges are placed in the order of their sources, so each reversed neighbour list comes out sorted
+    when sources is.
+
+    Returns:
+        tuple: (offsets, targets) of the reversed edges.
+    """
+    counts = array(_OFFSET, bytes(array(_OFFSET).itemsize * (size + 1)))
+    for target in targets:
+        counts[target + 1] += 1
+    offsets = array(_OFFSET, accumulate(counts))
+    fill = offsets[:-1]
+    reversed_targets = array(_USER, bytes(array(_USER).itemsize * len(targets)))
+    for source, target in zip(sources, targets):
+        reversed_targets[fill[target]] = source
+        fill[target] += 1
+    return offsets, reversed_targets
+
+
+def _merge(offsets, targets, added, size):
+    """
+    Build a compressed sparse row holding the edges of an existing one plus the added ones.
+
+    Returns:
+        tuple: (offsets, targets), each neighbour list sorted.
+    """
+    new_offsets = array(_OFFSET, [0])
+    new_targets = array(_USER)
+    known = len(offsets) - 1
+    for node in range(size):
+        neighbours = targets[offsets[node]:offsets[node + 1]] if node < known else array(_USER)
+        extra = added.get(node)
+        if extra:
+            neighbours = array(_USER, sorted(extra.union(neighbours)))
+        new_targets.extend(neighbours)
+        new_offsets.append(len(new_targets))
+    return new_offsets, new_targets
+
+
+class FollowGraph:
+    """
+    The follows table in memory, as two compressed sparse rows: the accounts each user follows,
+    and the followers of each user.
+
+    Each direction is an array of offsets indexed by user ID and an array of user IDs, with the
+    neighbours of user u at positions offsets[u] to offsets[u + 1], sorted. User IDs are allocated
+    in sequence, so the offsets stay dense. Two-hop queries count and intersect whole neighbour
+    slices at once with Counter and set, rather than joining follows with itself in SQL.
+
+    New follows go to per-user sets until COMPACT_THRESHOLD of them have accumulated, then are merged
+    into the arrays. Follows made through other processes, or directly with SQL, are not seen until
+    the graph is loaded again.
+
+    Build it with FollowGraph.load. One graph can be shared by the stores of several threads.
+    """
+
+    def __init__(self, following, followers, compact_threshold=COMPACT_THRESHOLD):
+        self._following = following
+        self._followers = followers
+        self._added_following = {}
+        self._added_followers = {}
+        self._added = 0
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, conn, compact_threshold=COMPACT_THRESHOLD):
+        """
+        Build the graph from the follows table in one scan of its primary key.
+
+        Args:
+            conn (sqlite3.Connection): A connection object to the SQLite database.
+            compact_threshold (int, optional): Added follows kept apart before they are merged into
+                the arrays. Default is COMPACT_THRESHOLD.
+
+        Returns:
+            FollowGraph: The graph of every follow in the database.
+        """
+        pairs = array(_USER, chain.from_iterable(conn.execute("SELECT flwer, flwee FROM follows ORDER BY flwer, flwee")))
+        sources, targets = pairs[0::2], pairs[1::2]
+        del pairs
+        size = max(max(sources, default=-1), max(targets, default=-1)) + 1
+        following = (_offsets(sources, size), targets)
+        followers = _transpose(sources, targets, size)
+        return cls(following, followers, compact_threshold)
+
+    def __len__(self):
+        """
+        Returns:
+            int: Number of follows in the graph.
+        """
+        return len(self._following[1]) + self._added
+
+    def _neighbours(self, direction, added, usr):
+        """
+        Returns:
+            array: The neighbours of a user in one direction, the added ones last.
+        """
+        offsets, targets = direction
+        neighbours = targets[offsets[usr]:offsets[usr + 1]] if 0 <= usr < len(offsets) - 1 else array(_USER)
+        extra = added.get(usr)
+        if extra:
+            neighbours.extend(extra)
+        return neighbours
+
+    def _out(self, usr):
+        with self._lock:
+            return self._neighbours(self._following, self._added_following, usr)
+
+    def _in(self, usr):
+        with self._lock:
+            return self._neighbours(self._followers, self._added_followers, usr)
+
+    def add_follow(self, flwer, flwee):
+        """
+        Add a follow made after the graph was loaded; a follow already in the graph is ignored.
+        """
+        with self._lock:
+            if flwee in self._neighbours(self._following, self._added_following, flwer):
+                return
+            self._added_following.setdefault(flwer, set()).add(flwee)
+            self._added_followers.setdefault(flwee, set()).add(flwer)
+            self._added += 1
+            if self._added >= self.compact_threshold:
+                self._compact()
+
+    def _compact(self):
+        """
+        Merge the added follows into the arrays. Called with the lock held.
+        """
+        size = max(len(self._following[0]) - 1, max(self._added_following) + 1, max(self._added_followers) + 1)
+        self._following = _merge(*self._following, self._added_following, size)
+        self._followers = _merge(*self._followers, self._added_followers, size)
+        self._added_following = {}
+        self._added_followers = {}
+        self._added = 0
+
+    def following(self, usr):
+        """
+        Returns:
+            list: The user IDs the user follows, in ascending order.
+        """
+        return sorted(self._out(usr))
+
+    def followers(self, usr):
+        """
+        Returns:
+            list: The user IDs that follow the user, in ascending order.
+        """
+        return sorted(self._in(usr))
+
+    def follower_count(self, usr):
+        """
+        Returns:
+            int: Number of followers of the user.
+        """
+        with self._lock:
+            offsets = self._followers[0]
+            count = offsets[usr + 1] - offsets[usr] if 0 <= usr < len(offsets) - 1 else 0
+            return count + len(self._added_followers.get(usr, ()))
+
+    def is_following(self, flwer, flwee):
+        """
+        Returns:
+            bool: Whether flwer follows flwee.
+        """
+        return flwee in self._out(flwer)
+
+    def is_mutual(self, usr, other):
+        """
+        Returns:
+            bool: Whether the two users follow each other.
+        """
+        return self.is_following(usr, other) and self.is_following(other, usr)
+
+    def mutual_follows(self, usr):
+        """
+        Returns:
+            list: The user IDs that the user follows and that follow the user back, in ascending order.
+        """
+        return sorted(set(self._out(usr)).intersection(self._in(usr)))
+
+    def follower_overlap(self, usr, other):
+        """
+        Compare the followers of two users.
+
+        Returns:
+            tuple: (common, jaccard): the number of users following both, and that number divided by the
+            number of users following either, 0.0 when neither has followers.
+        """
+        followers = set(self._in(usr))
+        other_followers = self._in(other)
+        common = len(followers.intersection(other_followers))
+        union = len(followers) + len(set(other_followers)) - common
+        return common, (common / union if union else 0.0)
+
+    def who_to_follow(self, usr, k=SUGGESTION_K):
+        """
+        Suggest accounts followed by the accounts the user follows (friends of friends).
+
+        Every account followed by one of the user's followees is counted once per such followee;
+        the user and the accounts they already follow are left out.
+
+        Args:
+            usr (int): The user ID.
+            k (int, optional): Number of suggestions. Default is SUGGESTION_K.
+
+        Returns:
+            list: Up to k tuples of (usr, common), where common is the number of the user's followees
+            following the suggestion; the highest first, then the most followed, then by user ID.
+        """
+        followees = self._out(usr)
+        counts = Counter(chain.from_iterable(self._out(followee) for followee in followees))
+        for excluded in chain(followees, (usr,)):
+            counts.pop(excluded, None)
+        return heapq.nsmallest(k, counts.items(),
+                               key=lambda item: (-item[1], -self.follower_count(item[0]), item[0]))
@@ -0,0 +1,25 @@
+import re
+
+
+# finds all words within a text that follow a hashtag (includes if hashtag is at beginning, or back to back,
+# and ignores case sensitivity); compiled once since it runs for every tweet written
+HASHTAG_PATTERN = re.compile(r'#(\w+)|(?<=\B#)(\w+)', flags=re.IGNORECASE)
+
+
+def extract_hashtags(text):
+    """
+    Extract the hashtag terms of a tweet.
+
+    Args:
+        text (str): The text of the tweet.
+
+    Returns:
+        list: The distinct terms in lower case, without the leading #, in order of first appearance.
+    """
+    terms = []
+    for groups in HASHTAG_PATTERN.findall(text):
+        for group in groups:
+            term = group.lower()
+            if group and term not in terms:
+                terms.append(term)
+    return terms
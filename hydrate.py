@@ -0,0 +1,69 @@
+import json
+
+# The engagement counters and the hashtags of many tweets. The IDs are passed as one JSON array, so each
+# statement text is the same whatever the number of tweets, and each is one index lookup per tweet.
+TWEET_COUNTS_QUERY = """
+    SELECT tid, reply_count, retweet_count
+    FROM tweet_stats
+    WHERE tid IN (SELECT value FROM json_each(?))
+"""
+
+TWEET_HASHTAGS_QUERY = """
+    SELECT tid, term
+    FROM mentions
+    WHERE tid IN (SELECT value FROM json_each(?))
+    ORDER BY tid, term
+"""
+
+
+def query_tweet_counts(conn, tids):
+    """
+    Look up the engagement counters of many tweets in one query.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        tids (list): The tweet IDs.
+
+    Returns:
+        dict: (reply_count, retweet_count) by tweet ID, for the tweets that have counters.
+    """
+    return {tid: (reply_count, retweet_count)
+            for tid, reply_count, retweet_count in conn.execute(TWEET_COUNTS_QUERY, (json.dumps(tids),))}
+
+
+def query_hashtags(conn, tids):
+    """
+    Look up the hashtags of many tweets in one query.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        tids (list): The tweet IDs.
+
+    Returns:
+        dict: The list of terms, in alphabetical order, by tweet ID, for the tweets that mention any.
+    """
+    hashtags = {}
+    for tid, term in conn.execute(TWEET_HASHTAGS_QUERY, (json.dumps(tids),)):
+        hashtags.setdefault(tid, []).append(term)
+    return hashtags
+
+
+def hydrated_rows(tids, headers, counts, hashtags, parents):
+    """
+    Put together the rows of hydrated tweets from the results of the query of each concern.
+
+    Args:
+        tids (list): The tweet IDs, in the order of the rows.
+        headers (dict): (tid, writer, writer_name, tdate, text, replyto) by tweet ID.
+        counts (dict): (reply_count, retweet_count) by tweet ID; tweets without an entry count (0, 0).
+        hashtags (dict): Lists of terms by tweet ID.
+        parents (dict): The headers of the tweets replied to, by tweet ID.
+
+    Returns:
+        dict: (tid, writer, writer_name, tdate, text, replyto, reply_count, retweet_count, hashtags, parent)
+        by tweet ID, in the order of tids, for the tweets that have a header. hashtags is a tuple of terms
+        and parent the header of the tweet replied to, or None.
+    """
+    return {tid: headers[tid] + tuple(counts.get(tid, (0, 0))) + (tuple(hashtags.get(tid, ())),
+                                                                   parents.get(headers[tid][5]))
+            for tid in tids if tid in headers}
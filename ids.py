@@ -0,0 +1,129 @@
+import time
+from datetime import datetime, timezone
+
+
+# Tweet IDs are 64-bit integers whose upper bits are milliseconds since ID_EPOCH_MS and whose
+# lower SEQUENCE_BITS make IDs allocated within the same millisecond unique. They are taken
+# from a row of id_sequences inside the writing transaction, so the database write lock makes
+# allocation atomic across processes and IDs never go backwards, even if a clock does.
+ID_EPOCH_MS = 1577836800000  # 2020-01-01T00:00:00Z
+SEQUENCE_BITS = 22
+# The smallest ID next_tweet_id can issue: the prefix of 2026-10-18T00:00:00Z, before which tweet IDs were
+# not time-ordered. IDs below it are legacy IDs and carry no time.
+FIRST_TWEET_ID = (1792281600000 - ID_EPOCH_MS) << SEQUENCE_BITS
+
+SCHEMA_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS id_sequences (
+           name     char(12),
+           last_id  int NOT NULL,
+           primary key (name)
+       )""",
+    "INSERT OR IGNORE INTO id_sequences (name, last_id) SELECT 'tweets', COALESCE(MAX(tid), 0) FROM tweets",
+    "INSERT OR IGNORE INTO id_sequences (name, last_id) SELECT 'users', COALESCE(MAX(usr), 0) FROM users",
+]
+
+
+def id_timestamp_prefix(now=None):
+    """
+    Return the smallest tweet ID that can be allocated at a given time.
+
+    Args:
+        now (float, optional): Unix time in seconds. Defaults to the current time.
+
+    Returns:
+        int: The milliseconds since ID_EPOCH_MS shifted into the upper bits of an ID.
+    """
+    if now is None:
+        now = time.time()
+    return (int(now * 1000) - ID_EPOCH_MS) << SEQUENCE_BITS
+
+
+def tweet_id_time(tid):
+    """
+    Recover the allocation time of a tweet ID.
+
+    IDs from before time-ordered allocation (those below FIRST_TWEET_ID) have no timestamp.
+
+    Args:
+        tid (int): A tweet ID.
+
+    Returns:
+        datetime: The UTC time the ID was allocated, or None for older IDs.
+    """
+    if tid < FIRST_TWEET_ID:
+        return None
+    return datetime.fromtimestamp(((tid >> SEQUENCE_BITS) + ID_EPOCH_MS) / 1000, tz=timezone.utc)
+
+
+def next_tweet_id(conn):
+    """
+    Allocate a new, time-ordered tweet ID.
+
+    The allocation is part of the connection's current transaction and should be followed by the
+    insert that uses it before committing.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+
+    Returns:
+        int: A tweet ID greater than every ID allocated before it.
+    """
+    return reserve_tweet_ids(conn, 1)[0]
+
+
+def reserve_tweet_ids(conn, count):
+    """
+    Allocate a block of consecutive, time-ordered tweet IDs with a single update.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        count (int): The number of IDs to allocate.
+
+    Returns:
+        range: The allocated IDs, each greater than every ID allocated before the block.
+    """
+    last_id = conn.execute(
+        "UPDATE id_sequences SET last_id = MAX(last_id + :count, :prefix + :count - 1) WHERE name = 'tweets' "
+        "RETURNING last_id",
+        {"count": count, "prefix": id_timestamp_prefix()}).fetchone()[0]
+    return range(last_id - count + 1, last_id + 1)
+
+
+def next_sharded_tweet_id(conn, shard, shard_count):
+    """
+    Allocate a new, time-ordered tweet ID from the sequence of a shard.
+
+    Each shard has its own sequence, so writers to different shards never wait for each other. The IDs of
+    shard i are all congruent to i modulo shard_count, so no two shards allocate the same one; they are
+    greater than every ID allocated before them by the same shard, and than every ID in the database the
+    shards were split from.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the shard's SQLite database.
+        shard (int): The number of the shard, from 0 to shard_count - 1.
+        shard_count (int): The number of shards.
+
+    Returns:
+        int: The new tweet ID.
+    """
+    return conn.execute(
+        "UPDATE id_sequences SET last_id = MAX(last_id + 1, :prefix) + "
+        "((:shard - MAX(last_id + 1, :prefix)) % :count + :count) % :count WHERE name = 'tweets' RETURNING last_id",
+        {"shard": shard, "count": shard_count, "prefix": id_timestamp_prefix()}).fetchone()[0]
+
+
+def next_user_id(conn):
+    """
+    Allocate a new user ID.
+
+    User IDs are typed in at login, so they stay small consecutive numbers rather than time-ordered IDs.
+    The allocation is part of the connection's current transaction.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+
+    Returns:
+        int: A user ID greater than every ID allocated before it.
+    """
+    return conn.execute(
+        "UPDATE id_sequences SET last_id = last_id + 1 WHERE name = 'users' RETURNING last_id").fetchone()[0]
@@ -0,0 +1,222 @@
+import csv
+import json
+import sqlite3
+import sys
+import time
+from itertools import islice
+
+from archive import is_cold_attached, restore_thread
+from feed import FANOUT_FOLLOWER_LIMIT, push_tweets
+from hashtags import extract_hashtags
+from ids import next_sharded_tweet_id, reserve_tweet_ids
+
+# Number of tweets written per transaction
+INGEST_BATCH_SIZE = 5000
+
+
+def _batches(rows, batch_size):
+    """
+    Split an iterable into lists of at most batch_size items without reading ahead.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def ingest_tweets(conn, tweets, batch_size=INGEST_BATCH_SIZE, fanout_limit=FANOUT_FOLLOWER_LIMIT):
+    """
+    Insert many tweets with the same results as calling compose_tweet for each of them.
+
+    Tweets are written batch_size at a time, each batch in one transaction, with one executemany per
+    table: tweets, hashtags and mentions (both upserted with INSERT OR IGNORE) and the followers' timelines.
+    Full-text index and counters are kept up to date by their triggers. The archived threads the tweets of
+    a batch reply to are moved back to the main database first, as compose_tweet does.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        tweets (iterable): Dicts with keys writer and text, and optionally replyto and tdate
+            (DATE('now') when missing, as in compose_tweet).
+        batch_size (int, optional): Tweets per transaction. Default is INGEST_BATCH_SIZE.
+        fanout_limit (int, optional): Writers with more followers than this are not pushed to timelines.
+            Default is FANOUT_FOLLOWER_LIMIT.
+
+    Returns:
+        tuple: (number of tweets inserted, seconds taken).
+    """
+    started = time.perf_counter()
+    count = 0
+    cold = is_cold_attached(conn)
+    for batch in _batches(tweets, batch_size):
+        if cold:
+            replytos = {tweet.get("replyto") for tweet in batch} - {None}
+            for replyto, in conn.execute("SELECT tid FROM cold.tweets WHERE tid IN (SELECT value FROM json_each(?))",
+                                         (json.dumps(sorted(replytos)),)).fetchall():
+                restore_thread(conn, replyto)
+        with conn:
+            tids = reserve_tweet_ids(conn, len(batch))
+            tweet_rows = []
+            mention_rows = []
+            for tid, tweet in zip(tids, batch):
+                tweet_rows.append((tid, tweet["writer"], tweet.get("tdate"), tweet["text"], tweet.get("replyto")))
+                mention_rows.extend((tid, term) for term in extract_hashtags(tweet["text"]))
+            conn.executemany(
+                "INSERT INTO tweets(tid, writer, tdate, text, replyto) VALUES (?, ?, COALESCE(?, DATE('now')), ?, ?)",
+                tweet_rows)
+            conn.executemany("INSERT OR IGNORE INTO hashtags (term) VALUES (?)",
+                             ((term,) for term in {term for tid, term in mention_rows}))
+            conn.executemany("INSERT OR IGNORE INTO mentions (tid, term) VALUES (?, ?)", mention_rows)
+            push_tweets(conn, tids, fanout_limit)
+        count += len(batch)
+    return count, time.perf_counter() - started
+
+
+def ingest_sharded_tweets(store, tweets, batch_size=INGEST_BATCH_SIZE):
+    """
+    Insert many tweets into the shards of a database, with the same results as calling
+    ShardedTwitterStore.compose_tweet for each of them.
+
+    Each batch is split by the shard of its writers, and the part of every shard is written in one
+    transaction of that shard, with IDs from its sequence. Foreign keys cannot span files, so the writers
+    and the tweets replied to of a batch are checked first, as compose_tweet does; if one is missing,
+    nothing of the batch is written.
+
+    Args:
+        store (ShardedTwitterStore): The store of the sharded database.
+        tweets (iterable): Dicts as for ingest_tweets.
+        batch_size (int, optional): Tweets per batch. Default is INGEST_BATCH_SIZE.
+
+    Returns:
+        tuple: (number of tweets inserted, seconds taken).
+
+    Raises:
+        sqlite3.IntegrityError: A writer or a tweet replied to does not exist.
+    """
+    from shards import shard_of
+
+    started = time.perf_counter()
+    count = 0
+    for batch in _batches(tweets, batch_size):
+        writers = {tweet["writer"] for tweet in batch}
+        found = {row[0] for row in store.conn.execute(
+            "SELECT usr FROM users WHERE usr IN (SELECT value FROM json_each(?))", (json.dumps(list(writers)),))}
+        replytos = {tweet.get("replyto") for tweet in batch} - {None}
+        if found != writers or len(store.tweet_headers(list(replytos))) != len(replytos):
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+
+        by_shard = {}
+        for tweet in batch:
+            by_shard.setdefault(shard_of(tweet["writer"], len(store.shards)), []).append(tweet)
+        for shard, shard_tweets in sorted(by_shard.items()):
+            conn = store.shards[shard]
+            with conn:
+                tweet_rows = []
+                mention_rows = []
+                for tweet in shard_tweets:
+                    tid = next_sharded_tweet_id(conn, shard, len(store.shards))
+                    tweet_rows.append((tid, tweet["writer"], tweet.get("tdate"), tweet["text"], tweet.get("replyto")))
+                    mention_rows.extend((tid, term) for term in extract_hashtags(tweet["text"]))
+                conn.executemany(
+                    "INSERT INTO tweets(tid, writer, tdate, text, replyto) VALUES (?, ?, COALESCE(?, DATE('now')), ?, ?)",
+                    tweet_rows)
+                conn.executemany("INSERT OR IGNORE INTO hashtags (term) VALUES (?)",
+                                 ((term,) for term in {term for tid, term in mention_rows}))
+                conn.executemany("INSERT OR IGNORE INTO mentions (tid, term) VALUES (?, ?)", mention_rows)
+        count += len(batch)
+    # user and tweet counters and searches have changed under the store's caches
+    store.cache.clear()
+    store.search_cache.bump()
+    return count, time.perf_counter() - started
+
+
+def _optional_int(value):
+    """
+    Convert a field to int, treating missing and empty values as None.
+    """
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def read_tweets(path, file_format=None):
+    """
+    Lazily read tweets from a JSONL or CSV file.
+
+    Each JSON line, or CSV row with a header, has the fields writer and text, and optionally replyto and tdate.
+
+    Args:
+        path (str): The file to read.
+        file_format (str, optional): "jsonl" or "csv". Defaults to the file extension.
+
+    Yields:
+        dict: Tweets in the form accepted by ingest_tweets.
+    """
+    if file_format is None:
+        file_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            yield {
+                "writer": int(record["writer"]),
+                "text": record["text"],
+                "replyto": _optional_int(record.get("replyto")),
+                "tdate": record.get("tdate") or None,
+            }
+
+
+def main(argv):
+    """
+    Import tweets from a JSONL or CSV file.
+
+    Usage: python ingest.py DATABASE FILE [--format jsonl|csv] [--batch-size N] [--sharded]
+
+    With --sharded, the tweets go to the shards of the database, split with shards.py.
+    """
+    from shards import ShardedTwitterStore, shard_paths
+    from store import connect
+
+    args = argv[1:]
+    options = {"--format": None, "--batch-size": str(INGEST_BATCH_SIZE)}
+    positional = []
+    sharded = False
+    while args:
+        arg = args.pop(0)
+        if arg == "--sharded":
+            sharded = True
+        elif arg in options and args:
+            options[arg] = args.pop(0)
+        else:
+            positional.append(arg)
+    if len(positional) != 2:
+        print("Usage: python ingest.py DATABASE FILE [--format jsonl|csv] [--batch-size N] [--sharded]")
+        return 2
+    db_name, path = positional
+    if not sharded and shard_paths(db_name):
+        print(f"{db_name} has shards, whose tweets would not see the import; run with --sharded.")
+        return 2
+
+    tweets = read_tweets(path, options["--format"])
+    if sharded:
+        store = ShardedTwitterStore.open(db_name)
+        try:
+            count, seconds = ingest_sharded_tweets(store, tweets, int(options["--batch-size"]))
+        finally:
+            store.close()
+    else:
+        conn = connect(db_name)
+        try:
+            count, seconds = ingest_tweets(conn, tweets, int(options["--batch-size"]))
+        finally:
+            conn.close()
+    rate = count / seconds if seconds > 0 else float("inf")
+    print(f"Imported {count} tweets in {seconds:.2f} seconds ({rate:.0f} rows/sec).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
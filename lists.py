@@ -0,0 +1,210 @@
+import heapq
+from itertools import islice
+
+from feed import feed_cursor
+
+LIST_PAGE_SIZE = 5
+# lists.lname is a char(12)
+LIST_NAME_LENGTH = 12
+
+# The tweets, or the retweets, of one member, newest first, below a cursor. Rows are shaped like feed rows,
+# (tid, writer, date, text, replyto, kind), and come in the feed order (date, tid, writer, kind), so that the
+# streams of all the members can be merged. Both read a range of an index ordered the same way: the
+# (date, tid) <= bound starts the range at the cursor, and the full comparison drops the rows up to it.
+_MEMBER_TWEETS = """
+    SELECT tid, writer, tdate, text, replyto, 0
+    FROM tweets
+    WHERE writer = :member {after}
+    ORDER BY tdate DESC, tid DESC
+    LIMIT :limit
+"""
+
+_MEMBER_RETWEETS = """
+    SELECT r.tid, r.usr, r.rdate, t.text, t.replyto, 1
+    FROM retweets r
+    JOIN tweets t ON t.tid = r.tid
+    WHERE r.usr = :member {after}
+    ORDER BY r.rdate DESC, r.tid DESC
+    LIMIT :limit
+"""
+
+FIRST_MEMBER_TWEETS_QUERY = _MEMBER_TWEETS.format(after="")
+NEXT_MEMBER_TWEETS_QUERY = _MEMBER_TWEETS.format(
+    after="AND (tdate, tid) <= (:date, :tid) AND (tdate, tid, writer, 0) < (:date, :tid, :writer, :kind)")
+FIRST_MEMBER_RETWEETS_QUERY = _MEMBER_RETWEETS.format(after="")
+NEXT_MEMBER_RETWEETS_QUERY = _MEMBER_RETWEETS.format(
+    after="AND (r.rdate, r.tid) <= (:date, :tid) AND (r.rdate, r.tid, r.usr, 1) < (:date, :tid, :writer, :kind)")
+
+# (first page query, next page query) of each stream of a member
+_MEMBER_QUERIES = [
+    (FIRST_MEMBER_TWEETS_QUERY, NEXT_MEMBER_TWEETS_QUERY),
+    (FIRST_MEMBER_RETWEETS_QUERY, NEXT_MEMBER_RETWEETS_QUERY),
+]
+
+USER_LISTS_QUERY = """
+    SELECT l.lname, COUNT(i.member)
+    FROM lists l
+    LEFT JOIN includes i ON i.lname = l.lname
+    WHERE l.owner = ?
+    GROUP BY l.lname
+    ORDER BY l.lname
+"""
+
+SCHEMA_STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS lists_owner_lname ON lists (owner, lname)",
+    "CREATE INDEX IF NOT EXISTS tweets_writer_tdate_tid ON tweets (writer, tdate, tid)",
+    # the new index serves every lookup of the old one
+    "DROP INDEX IF EXISTS tweets_writer_tdate",
+    "CREATE INDEX IF NOT EXISTS retweets_usr_rdate_tid ON retweets (usr, rdate, tid)",
+]
+
+
+def create_list(conn, owner, lname):
+    """
+    Create an empty list.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        owner (int): The user ID of the owner.
+        lname (str): The name of the list, at most LIST_NAME_LENGTH characters and unique across users.
+
+    Returns:
+        bool: True if the list was created, False if the name is taken.
+    """
+    if not lname or len(lname) > LIST_NAME_LENGTH:
+        raise ValueError(f"list names have 1 to {LIST_NAME_LENGTH} characters")
+    with conn:
+        return conn.execute("INSERT OR IGNORE INTO lists (lname, owner) VALUES (?, ?)", (lname, owner)).rowcount == 1
+
+
+def add_list_member(conn, owner, lname, member):
+    """
+    Add a user to a list of the owner.
+
+    Returns:
+        bool: True if the user was added, False if they were already a member or the owner has no such list.
+    """
+    with conn:
+        return conn.execute("""
+            INSERT OR IGNORE INTO includes (lname, member)
+            SELECT lname, :member FROM lists WHERE lname = :lname AND owner = :owner
+        """, {"owner": owner, "lname": lname, "member": member}).rowcount == 1
+
+
+def remove_list_member(conn, owner, lname, member):
+    """
+    Remove a user from a list of the owner.
+
+    Returns:
+        bool: True if the user was removed, False if they were not a member or the owner has no such list.
+    """
+    with conn:
+        return conn.execute("""
+            DELETE FROM includes
+            WHERE lname = :lname AND member = :member
+              AND EXISTS (SELECT 1 FROM lists WHERE lname = :lname AND owner = :owner)
+        """, {"owner": owner, "lname": lname, "member": member}).rowcount == 1
+
+
+def user_lists(conn, owner):
+    """
+    Returns:
+        list: Rows of (lname, member_count) for every list of the owner, by name.
+    """
+    return conn.execute(USER_LISTS_QUERY, (owner,)).fetchall()
+
+
+def list_members(conn, lname):
+    """
+    Returns:
+        list: Rows of (usr, name, city) for every member of the list, by user ID.
+    """
+    return conn.execute("""
+        SELECT u.usr, u.name, u.city
+        FROM includes i
+        JOIN users u ON u.usr = i.member
+        WHERE i.lname = ?
+        ORDER BY u.usr
+    """, (lname,)).fetchall()
+
+
+def member_stream(conn, queries, member, cursor, batch_size):
+    """
+    Yield the rows of one stream of a member below a cursor, newest first, batch_size rows per statement.
+    """
+    first_query, next_query = queries
+    while True:
+        params = {"member": member, "limit": batch_size}
+        if cursor is not None:
+            params["date"], params["tid"], params["writer"], params["kind"] = cursor
+        rows = conn.execute(first_query if cursor is None else next_query, params).fetchall()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        cursor = feed_cursor(rows[-1])
+
+
+def pulled_streams(conn, members, cursor, batch_size):
+    """
+    Returns:
+        list: The stream of tweets and the stream of retweets of every member below a cursor; see member_stream.
+    """
+    return [member_stream(conn, queries, member, cursor, batch_size)
+            for member in members for queries in _MEMBER_QUERIES]
+
+
+def iter_list_timeline(conn, lname, cursor=None, batch_size=LIST_PAGE_SIZE):
+    """
+    Lazily yield the tweets and retweets of the members of a list, newest first, in the feed order.
+
+    Each member has a stream of tweets and a stream of retweets, each read from an index in order,
+    batch_size rows at a time; heapq.merge keeps the next row of every stream in a heap and yields
+    the newest. Rows are only read when the merge needs them, so taking n rows costs about n plus
+    one batch per stream, whatever the members' history.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        lname (str): The name of the list.
+        cursor (tuple, optional): Cursor from feed.feed_cursor() of the last row already seen,
+            or None to start from the newest.
+        batch_size (int, optional): Rows read per statement from each stream. Default is LIST_PAGE_SIZE.
+
+    Returns:
+        iterator: Rows of (tid, writer, date, text, replyto, kind), where kind is 0 for a tweet and 1 for a retweet.
+    """
+    members = [row[0] for row in conn.execute("SELECT member FROM includes WHERE lname = ?", (lname,))]
+    return heapq.merge(*pulled_streams(conn, members, cursor, batch_size), key=feed_cursor, reverse=True)
+
+
+def get_list_page(conn, lname, page_size=LIST_PAGE_SIZE, cursor=None):
+    """
+    Retrieve one page of a list timeline; see iter_list_timeline.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        lname (str): The name of the list.
+        page_size (int, optional): Maximum number of rows to return. Default is LIST_PAGE_SIZE.
+        cursor (tuple, optional): Cursor from feed.feed_cursor() of the last row already seen,
+            or None for the first page.
+
+    Returns:
+        list: Up to page_size rows of (tid, writer, date, text, replyto, kind), newest first.
+    """
+    return list(islice(iter_list_timeline(conn, lname, cursor, page_size), page_size))
+
+
+def iter_list_pages(conn, lname, page_size=LIST_PAGE_SIZE):
+    """
+    Lazily yield a list timeline one page at a time, from a single merge.
+
+    Yields:
+        list: Non-empty pages of rows, newest first.
+    """
+    rows = iter_list_timeline(conn, lname, batch_size=page_size)
+    while True:
+        page = list(islice(rows, page_size))
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
@@ -1,29 +1,44 @@
-import sqlite3
 import getpass
-import re
+import sqlite3
+import sys
+from itertools import chain
 
+from lists import LIST_NAME_LENGTH
+from querystats import QueryStats, print_snapshot
+from replay import SessionRecorder
+from shards import ShardedTwitterStore
+from store import ReadOnlyError, TwitterStore, connect, connect_cold_tier
 
-def connect_db():
+
+def connect_db(stats=None, read_only=False, sharded=False):
     """
     Connect to an SQLite database.
 
-    This function prompts the user for the database name and establishes a connection to the specified database.
+    This function prompts the user for the database name, establishes a connection to the specified database
+    and upgrades its schema (indexes and other additions) to the latest version.
+
+    Args:
+        stats (QueryStats, optional): Record the timings of every statement in it.
+        read_only (bool, optional): Open the database immutable and memory-mapped, for browsing a snapshot
+            made with snapshot.py; every write is refused. Default is False.
+        sharded (bool, optional): Keep tweets in the shards of the database, split with shards.py. Default is False.
 
     Returns:
-        sqlite3.Connection: A connection object to the SQLite database.
+        TwitterStore: The data access layer of the application, on a connection to the SQLite database.
 """
     db_name = input("Input database name: ")
-    conn = sqlite3.connect(db_name)
-    conn.commit()
-    return conn
+    if sharded:
+        return ShardedTwitterStore.open(db_name, stats=stats, read_only=read_only)
+    return TwitterStore(connect(db_name, stats=stats, immutable=read_only), read_only=read_only,
+                        cold=connect_cold_tier(db_name, stats=stats, immutable=read_only))
 
 
-def login_screen(conn):
+def login_screen(store):
     """
     Display a login screen with options to login, sign up, or exit.
 
     Args:
-        conn (sqlite3.Connection): A connection object to the SQLite database.
+        store (TwitterStore): The data access layer of the application.
 
     Returns:
         str: The user ID of the logged-in user or None if the user chooses to exit.
@@ -35,11 +50,11 @@ def login_screen(conn):
         choice = input("Enter choice: ")
 
         if choice == "1":
-            loggedin = login(conn)
+            loggedin = login(store)
             if loggedin is not None:
                 return loggedin
         elif choice == "2":
-            usr = signup(conn)
+            usr = signup(store)
             if usr is not None:
                 return usr
         elif choice == "3":
@@ -48,34 +63,32 @@ def login_screen(conn):
             print("Invalid choice. Please try again.")
 
 
-def login(conn):
+def login(store):
     """
     Authenticate a user by checking their credentials in the database.
 
     Args:
-        conn (sqlite3.Connection): A connection object to the SQLite database.
+        store (TwitterStore): The data access layer of the application.
 
     Returns:
         str: The user ID of the logged-in user or None if login fails.
     """
-    cursor = conn.cursor()
     count = 0
     while True:
         # getting user id and password
         usr = input("Enter user ID: ")
         pwd = getpass.getpass("Enter password: ")
 
-        # query to get user id and password matching the input user id
-        cursor.execute("SELECT usr, pwd FROM users WHERE usr = ?", (usr,))
-        result = cursor.fetchone()
+        # get user id and password matching the input user id
+        result = store.get_credentials(usr)
 
         if result:
             stored_usr, stored_pwd = result
             # if the password is the same then they can log in
             if pwd == stored_pwd:
                 print("Login successful!")
-                tweets_of_followee = get_tweets_of_followee(conn, usr)  # getting the tweets of the users that they follow
-                printing_tweets(conn,usr, tweets_of_followee) # printing the tweets
+                tweets_of_followee = get_tweets_of_followee(store, usr)  # getting the tweets of the users that they follow
+                printing_tweets(store,usr, tweets_of_followee) # printing the tweets
                 
                 return stored_usr
             # else the password is incorrect
@@ -91,33 +104,26 @@ def login(conn):
             return None
 
 
-def signup(conn):
+def signup(store):
     """
     Create a new user account and add it to the database.
 
     Args:
-        conn (sqlite3.Connection): A connection object to the SQLite database.
+        store (TwitterStore): The data access layer of the application.
 
     Returns:
         str: The user ID of the newly created user or None if the user chooses not to log in.
     """
-    cursor = conn.cursor()
+    if store.read_only:
+        print("Sign up is not available: the database is open read-only.")
+        return None
     name = input("Enter Name: ")
     pwd = getpass.getpass("Enter password: ")
     email = input("Enter Email: ")
     city = input("Enter City: ")
     timezone = input("Enter Timezone: ")
-    # query to geth max user id
-    cursor.execute(""" 
-        SELECT MAX(u.usr)
-        FROM users u
-""",)
-    # add 1 to max id to create a new unique user id
-    usr = cursor.fetchone()[0] + 1
-
-    cursor.execute("""INSERT INTO users (usr,pwd, name,email,city,timezone) VALUES (:usr,:pwd,:name, :email, :city,:timezone)"""
-                   ,{"usr":usr, "pwd": pwd,"name":name,"email": email,"city": city,"timezone": timezone})
-    conn.commit()
+    # create the user with a new unique user id
+    usr = store.signup(name, pwd, email, city, timezone)
 
     # giving user option to log in after signing up
     login_or_exit = input("Log in [Y/N]: ")
@@ -130,102 +136,81 @@ def signup(conn):
         return None
 
 
-def get_tweets_of_followee(conn, usr_id):
+def get_tweets_of_followee(store, usr_id):
     """
     Retrieve tweets from users that the specified user follows.
 
     Args:
-        conn (sqlite3.Connection): A connection object to the SQLite database.
+        store (TwitterStore): The data access layer of the application.
         usr_id (str): User ID for whom to retrieve tweets.
 
     Returns:
-        list: A list of tweets from followees, including original tweets and retweets.
+        iterator: Lazily fetched pages of tweets from followees, including original tweets and retweets.
     """
-    cursor = conn.cursor() 
-    # query to get the tweets of users they follow with retweets
-    cursor.execute(""" 
-    
-    SELECT * 
-    FROM (
-        SELECT t.tid, t.writer, t.tdate AS date, t.text, t.replyto
-        FROM tweets t
-        JOIN follows f ON t.writer = f.flwee
-        WHERE f.flwer = ?
-        
-        UNION ALL
-        
-        SELECT r.tid, r.usr, r.rdate AS date, t.text, t.replyto
-        FROM retweets r
-        JOIN tweets t ON r.tid = t.tid
-        JOIN follows f ON r.usr = f.flwee
-        WHERE f.flwer = ?
-        ) AS combined
-    ORDER BY date DESC;
-
-""", (usr_id, usr_id))
-    results = cursor.fetchall()
-    return results
+    # pages are fetched with a keyset cursor only when the display loop asks for them
+    return store.feed_pages(usr_id)
 
 
-def printing_tweets(conn, usr, followee_tweets):
+def printing_tweets(store, usr, followee_tweets):
     """
     Display 5 tweets from followees in the user's feed.
 
     Args:
-        conn (sqlite3.Connection): A connection object to the SQLite database.
+        store (TwitterStore): The data access layer of the application.
         usr (str): User ID of the currently logged-in user.
-        followee_tweets (list): List of tweets from followees.
+        followee_tweets (iterator): Pages of tweets from followees.
 
     Returns:
         None
     """
-    i = 0
-    amount_of_tweets = len(followee_tweets)
+    followee_tweets = iter(followee_tweets)
+    first_page = next(followee_tweets, None)
     # if the user doesn't follow anyone
-    if amount_of_tweets == 0:
+    if first_page is None:
         print("Follow people to get results in your feed!")
         return
 
-    tweet_functions(conn, usr, followee_tweets)
+    tweet_functions(store, usr, chain([first_page], followee_tweets))
     
     
-def display_tweet_statistics(conn, tweet_id):
-    cursor = conn.cursor()
-    # Fetch the number of retweets
-    cursor.execute("SELECT COUNT(*) FROM retweets WHERE tid = ?", (tweet_id,))
-    retweet_count = cursor.fetchone()[0]
-    
-    # Fetch the number of replies
-    cursor.execute("SELECT COUNT(*) FROM tweets WHERE replyto = ?", (tweet_id,))
-    reply_count = cursor.fetchone()[0]
+def display_tweet_statistics(store, tweet_id):
+    # Fetch the number of replies and retweets
+    reply_count, retweet_count = store.tweet_counts(tweet_id)
     
     print(f"Tweet ID: {tweet_id}")
     print(f"Retweets: {retweet_count}, Replies: {reply_count}")
 
 
-def tweet_functions(conn, usr, followee_tweets):
-    cursor = conn.cursor()
-    rows = followee_tweets
-    total_rows = len(rows)
-    # sets the amount of tweets we want to appear
-    batch_size = 5 
-    final_batch = []
-    # start of tweets
-    start_idx = 0
+def print_tweet_information(detail, date):
+    """
+    Print the information of a selected tweet.
+
+    Args:
+        detail (tuple): The tweet as returned by TwitterStore.hydrate_tweets.
+        date (str): The date shown for the row: that of the retweet, for a retweet in the feed.
+    """
+    tid, writer, writer_name, tdate, text, replyto, reply_count, retweet_count, hashtags, parent = detail
+    replying_to = f"{replyto} by {parent[2]}" if parent is not None else replyto
+    print(f'''\nInformation: \n[tweet id: {tid}] [writer id: {writer}] [writer name: {writer_name}] [tdate: {date}]\n[replying to: {replying_to}] [reply count: {reply_count}] [retweet count: {retweet_count}]''')
+    if hashtags:
+        print("[hashtags: " + " ".join("#" + term for term in hashtags) + "]")
+
+
+def tweet_functions(store, usr, followee_tweets):
+    # tweets that have been displayed so far, so that a row number can be selected, and their details
+    rows = []
+    details = {}
      # condition for input validation
     stop_print = False
-    # print tweets as long as the first index of batch is less than total
-    while start_idx < total_rows and not stop_print: 
-        # find end of the range of indexes that include current batch
-        end_idx = start_idx + batch_size 
-        # get current batch of tweets as own array
-        current_batch = rows[start_idx:end_idx] 
-
-        for i, row in enumerate(current_batch, start=start_idx + 1):
+    # each batch is one page of the feed, fetched only when the user asks for more
+    for current_batch in followee_tweets:
+        for i, row in enumerate(current_batch, start=len(rows) + 1):
             # displaying each tweet with row number
             print(f"{i}. [tweet id: {row[0]}] [text: {row[3]}]")
+        rows.extend(current_batch)
+        # the writer names, counters, hashtags and replied-to tweets of the whole page in a few queries
+        details.update(store.hydrate_tweets([row[0] for row in current_batch]))
 
-       
         print('')
 
         # condition for input validation and asking if user wants to view more tweets
@@ -240,15 +225,15 @@ def tweet_functions(conn, usr, followee_tweets):
                 break
             else:
                 print("Invalid Option.")
-        start_idx = end_idx
-        final_batch = current_batch
+        if stop_print:
+            break
 
     # if we passed the available amount of tweets and assuming we didn't break out manually
-    if start_idx >= total_rows and stop_print == False:
+    if stop_print == False:
         print("No more tweets.")
 
-    # create index of tweets that can be seleceted based on amount of tweets displayed
-    twt_range = start_idx - batch_size + len(final_batch)
+    # index of tweets that can be seleceted is the amount of tweets displayed
+    twt_range = len(rows)
     # condition for input validiation and asking user for specific tweet
     if twt_range > 0:
         valid_row = False
@@ -263,46 +248,14 @@ def tweet_functions(conn, usr, followee_tweets):
                     specific_row = rows[retrieve_row - 1]
                     cur_tid = specific_row[0]
 
-                    #queries for finding reply and retweet counts, as well as the tweet writers name
-                    find_rep = '''
-                    SELECT t.tid, count(r.tid)
-                    FROM tweets t
-                    LEFT JOIN tweets r ON t.tid = r.replyto
-                    WHERE t.tid == ?
-                    GROUP BY t.tid
-                                    '''
-                    
-                    find_ret = '''
-                    SELECT t.tid, count(r.usr)
-                    FROM tweets t
-                    LEFT JOIN retweets r ON t.tid = r.tid
-                    WHERE t.tid == ?
-                    GROUP BY t.tid
-                                '''
-                    
-                    find_name = '''
-                    SELECT u.name
-                    FROM tweets t
-                    LEFT JOIN users u ON t.writer = u.usr
-                    WHERE t.tid == ?
-                    GROUP BY t.tid
-                                '''
-                    cursor.execute(find_rep,(cur_tid,))
-                    rep_cnt = cursor.fetchone()[1]
-                    
-                    cursor.execute(find_ret,(cur_tid,))
-                    ret_cnt = cursor.fetchone()[1]
-
-                    cursor.execute(find_name, (cur_tid,))
-                    usr_name = cursor.fetchone()[0]
-
-                    #printing tweet information
-                    print(f'''\nInformation: \n[tweet id: {cur_tid}] [writer id: {specific_row[1]}] [writer name: {usr_name}] [tdate: {specific_row[2]}]\n[replying to: {specific_row[4]}] [reply count: {rep_cnt}] [retweet count: {ret_cnt}]''')
+                    #printing tweet information, as read with the page
+                    print_tweet_information(details[cur_tid], specific_row[2])
 
                     # printing additional options
                     print("\nOptions:")
                     print("1. Reply")
                     print("2. Retweet")
+                    print("3. View thread")
 
                     # input condition and asking user if they want to choose an option
                     valid_option = False
@@ -311,10 +264,13 @@ def tweet_functions(conn, usr, followee_tweets):
                         if choice == '1':
                             valid_option = True
                             tweet = input("Compose your tweet: ")
-                            compose_tweet(conn, usr, tweet, cur_tid)
+                            compose_tweet(store, usr, tweet, cur_tid)
                         elif choice == '2':
                             valid_option = True
-                            retweet(conn, usr, cur_tid)
+                            retweet(store, usr, cur_tid)
+                        elif choice == '3':
+                            valid_option = True
+                            display_thread(store, cur_tid)
                         elif choice == 's':
                             valid_option = True
                             pass
@@ -329,27 +285,24 @@ def tweet_functions(conn, usr, followee_tweets):
                 print("Invalid Option")
 
 
-def retweet(conn, usr, tweet_id):
-    cursor = conn.cursor()
-    
-    # Check if the user has already retweeted this tweet to avoid duplicate retweets
-    cursor.execute("SELECT COUNT(*) FROM retweets WHERE usr = ? AND tid = ?", (usr, tweet_id))
-    if cursor.fetchone()[0] > 0:
+def retweet(store, usr, tweet_id):
+    # Insert the retweet, unless the user has already retweeted this tweet
+    try:
+        retweeted = store.retweet(usr, tweet_id)
+    except ReadOnlyError:
+        print("Cannot retweet: the database is open read-only.")
+        return
+    except sqlite3.IntegrityError:
+        # a user or tweet that does not exist, as the server reports it
+        print("Cannot retweet: a user or tweet referred to does not exist.")
+        return
+    if not retweeted:
         print("You have already retweeted this tweet.")
         return
-
-    # Get the current time for the retweet timestamp
-    from datetime import datetime
-    current_time = datetime.now().strftime('%Y-%m-%d')
-    
-    # Insert the retweet into the retweets table
-    cursor.execute("INSERT INTO retweets (usr, tid, rdate) VALUES (?, ?, ?)", (usr, tweet_id, current_time))
-    conn.commit()
     print("The tweet has been retweeted.")
 
 
-def search_tweets(conn, current_user):
-    cursor = conn.cursor()
+def search_tweets(store, current_user):
     usr = current_user
 
     # define the batch size of tweets 
@@ -361,44 +314,12 @@ def search_tweets(conn, current_user):
         keywords_input = input("Enter keywords separated by spaces to filter tweets [or leave it empty to display all]: ").strip()
         keywords = keywords_input.split()
 
-        # seperate arrays for the keyword conditions, mention specific conditions, and keyword alues
-        keyword_conditions = []
-        mention_conditions = []
-        keyword_values = []
-
-        for keyword in keywords:
-            # check if keyword starts with #
-            if keyword.startswith('#'):
-                # if it starts with #, remove # and search for it in mentions table
-                mention_conditions.append("m.term = ?")
-                keyword_values.append(f"{keyword[1:]}")
-            else:
-                # otherwise search for it in tweet text
-                keyword_conditions.append("t.text LIKE ?")
-                keyword_values.append(f"%{keyword}%")
-        
-        if keyword_conditions or mention_conditions:
-            # combine keyword and mention conditions for use in query
-            conditions = " OR ".join(keyword_conditions + mention_conditions)
-            
-            query_template = f'''
-                SELECT DISTINCT t.tid, t.writer, t.text, t.tdate, t.replyto
-                FROM tweets t
-                LEFT JOIN mentions m ON t.tid = m.tid
-                WHERE {conditions}
-                ORDER BY tdate DESC
-            '''
-            cursor.execute(query_template, keyword_values)
-        else:
-            cursor.execute('''
-                SELECT tid, writer, text, tdate, replyto
-                FROM tweets
-                ORDER BY tdate DESC
-                        ''')
-
-        
-        rows = cursor.fetchall()
+        # keywords starting with # are searched in the mentions table, the others in the full-text index of
+        # tweet text; only the best matches (or most recent tweets when no keywords are given) are fetched
+        rows = store.search_tweets(keywords)
         total_rows = len(rows)
+        # details of the tweets displayed, read a batch at a time
+        details = {}
         
         start_idx = 0
         stop_print = False
@@ -410,6 +331,7 @@ def search_tweets(conn, current_user):
             for i, row in enumerate(current_batch, start=start_idx + 1):
                 # Process and display each row as needed with a row number
                 print(f"{i}. [tweet id: {row[0]}] [text: {row[2]}]")
+            details.update(store.hydrate_tweets([row[0] for row in current_batch]))
 
             # Ask the user if they want to view more rows
             print('')
@@ -452,53 +374,23 @@ def search_tweets(conn, current_user):
                         print("1. More tweet information")
                         print("2. Reply")
                         print("3. Retweet")
+                        print("4. View thread")
                         valid_option = False
                         while valid_option == False:
                             choice = input("Enter choice [Or s to skip]: ").lower()
                             if choice == '1':
                                 valid_option = True
-        
-                                
-                                find_rep = '''
-                                SELECT t.tid, count(r.tid)
-                                FROM tweets t
-                                LEFT JOIN tweets r ON t.tid = r.replyto
-                                WHERE t.tid == ?
-                                GROUP BY t.tid
-                                                '''
-                                
-                                find_ret = '''
-                                SELECT t.tid, count(r.usr)
-                                FROM tweets t
-                                LEFT JOIN retweets r ON t.tid = r.tid
-                                WHERE t.tid == ?
-                                GROUP BY t.tid
-                                            '''
-                                
-                                find_name = '''
-                                SELECT u.name
-                                FROM tweets t
-                                LEFT JOIN users u ON t.writer = u.usr
-                                WHERE t.tid == ?
-                                GROUP BY t.tid
-                                            '''
-                                cursor.execute(find_rep,(cur_tid,))
-                                rep_cnt = cursor.fetchone()[1]
-
-                                cursor.execute(find_ret,(cur_tid,))
-                                ret_cnt = cursor.fetchone()[1]
-
-                                cursor.execute(find_name, (cur_tid,))
-                                usr_name = cursor.fetchone()[0]
-                                
-                                print(f'''\nInformation: \n[tweet id: {cur_tid}] [writer id: {specific_row[1]}] [writer name: {usr_name}] [tdate: {specific_row[3]}]\n[replying to: {specific_row[4]}] [reply count: {rep_cnt}] [retweet count: {ret_cnt}]''')
+                                print_tweet_information(details[cur_tid], specific_row[3])
                             elif choice == '2':
                                 valid_option = True
                                 tweet = input("Compose your tweet: ")
-                                compose_tweet(conn, usr, tweet, cur_tid)
+                                compose_tweet(store, usr, tweet, cur_tid)
                             elif choice == '3':
                                 valid_option = True
-                                retweet(conn, usr, cur_tid)
+                                retweet(store, usr, cur_tid)
+                            elif choice == '4':
+                                valid_option = True
+                                display_thread(store, cur_tid)
                             elif choice == 's':
                                 valid_option = True
                                 pass
@@ -525,65 +417,65 @@ def search_tweets(conn, current_user):
                 print("Invalid Option.")
 
 
-def compose_tweet(conn, usr, text, replyto):
-    cursor = conn.cursor()
-
-    # finding the max tid of all tweet ids
-    cursor.execute(""" 
-        SELECT MAX(t.tid)
-        FROM tweets t
-""",)
-    # set the tid of this new tweet as one above the max to ensure unique status
-    tid = cursor.fetchone()[0] + 1
-
-    # insert tweet given the function arguments
-    cursor.execute("INSERT INTO tweets(tid, writer, tdate, text, replyto) VALUES (?, ?, DATE('now'), ?, ?)", (tid, usr, text, replyto))
-
-    # function that finds all words within the text string that contains a hashtag (includes if hashtag is at beginning, or back to back, and ignores case sensitivity)
-    hashtags = re.findall(r'#(\w+)|(?<=\B#)(\w+)', text, flags=re.IGNORECASE)
-    # adds and combines the captured group into a list
-    hashtags = [group for group in sum(hashtags, ()) if group]
-    # change all terms into lower case
-    hashtags = [hashtag.lower() for hashtag in hashtags]
-
-    # for each of the terms, check first if the term is already in the hashtags table
-    for term in hashtags:
-        cursor.execute('''
-        SELECT *
-        FROM hashtags
-        WHERE term LIKE ?;
-                        ''', (term,))
-        value = cursor.fetchone()
-
-        # if it is not, insert as a new term
-        if value is None:
-            cursor.execute("INSERT INTO hashtags (term) VALUES (?)", (term,))
-        # always add the terms to the mentions table for every hashtag associated with that tweet
-        cursor.execute('INSERT INTO mentions (tid, term) VALUES (?, ?)', (tid, term))
-    conn.commit()
+def display_thread(store, tid, page_size=10):
+    """
+    Display the conversation a tweet belongs to: the tweets it replies to, then its replies page by page.
+
+    Args:
+        store (TwitterStore): The data access layer of the application.
+        tid (int): The tweet ID.
+        page_size (int, optional): The number of replies to display at a time. Default is 10.
+
+    Replies are indented under the tweet they reply to.
+    """
+    print("\nThread:")
+    for tweet_id, writer, tdate, text, replyto, depth in store.thread_ancestors(tid):
+        print(f"[tweet id: {tweet_id}] [writer id: {writer}] [tdate: {tdate}] {text}")
+    tweet_id, writer, writer_name, tdate, text, replyto, reply_count, retweet_count = store.tweet_detail(tid)
+    print(f"> [tweet id: {tweet_id}] [writer id: {writer}] [tdate: {tdate}] {text}")
+
+    cursor = None
+    while True:
+        replies = store.thread_replies(tid, page_size, cursor)
+        for tweet_id, writer, tdate, text, replyto, depth, path in replies:
+            print(f"{'    ' * depth}[tweet id: {tweet_id}] [writer id: {writer}] [tdate: {tdate}] {text}")
+        if len(replies) < page_size:
+            break
+        if input("More replies [Y/N]: ").strip().lower() != 'y':
+            break
+        cursor = replies[-1][6]
+
+
+def compose_tweet(store, usr, text, replyto):
+    # insert tweet given the function arguments, together with its hashtags
+    try:
+        store.compose_tweet(usr, text, replyto)
+    except ReadOnlyError:
+        print("Cannot post: the database is open read-only.")
+        return
+    except sqlite3.IntegrityError:
+        print("Cannot post: a user or tweet referred to does not exist.")
+        return
     if replyto is None:
         print("Your tweet has been posted.")    
     else:
         print("Your reply has been posted.")
 
 
-def list_followers(conn, current_user):
+def list_followers(store, current_user):
     """
     List and display followers of the current user and allow the user to view details of a selected follower.
 
     Args:
-        conn: The SQLite database connection.
+        store (TwitterStore): The data access layer of the application.
         current_user (int): The user ID of the current user.
 
     This function retrieves and displays a list of followers of the current user, along with their usernames. 
     It allows the current user to select a follower to view more details or return to the previous menu.
     """
 
-    cursor = conn.cursor()
-    
     # Fetching all followers of the current user
-    cursor.execute("SELECT flwer, name FROM follows JOIN users ON follows.flwer = users.usr WHERE flwee = ?", (current_user,))
-    followers = cursor.fetchall()
+    followers = store.followers(current_user)
     
     # If we have no followers, notify the user
     if not followers:
@@ -601,18 +493,18 @@ def list_followers(conn, current_user):
         if choice == 0:
             return
         follower_usr, follower_name = followers[choice-1]
-        display_follower_details(conn, follower_usr,current_user)
+        display_follower_details(store, follower_usr,current_user)
     except (ValueError, IndexError):
         print("Invalid choice.")
 
 
-def display_follower_details(conn, follower_usr,current_usr):
+def display_follower_details(store, follower_usr,current_usr):
     """
     Display details of a follower, including their information, tweet count, following count, and followers.
     Allows the current user to follow the displayed follower and view more of their tweets.
 
     Args:
-        conn: The SQLite database connection.
+        store (TwitterStore): The data access layer of the application.
         follower_usr (int): The user ID of the follower.
         current_usr (int): The user ID of the current user.
 
@@ -620,21 +512,8 @@ def display_follower_details(conn, follower_usr,current_usr):
     following count, and followers. It also provides options for the current user to follow the displayed follower
     and view more of their tweets.
     """
-    cursor = conn.cursor()
-    
-
     # Fetching the number of tweets, users being followed, and followers for the selected user
-    cursor.execute("SELECT name FROM users WHERE usr = ?", (follower_usr,))
-    follower_name = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(*) FROM tweets WHERE writer = ?", (follower_usr,))
-    tweet_count = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(*) FROM follows WHERE flwer = ?", (follower_usr,))
-    following_count = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(*) FROM follows WHERE flwee = ?", (follower_usr,))
-    follower_count = cursor.fetchone()[0]
+    usr, follower_name, city, tweet_count, following_count, follower_count = store.profile(follower_usr)
     
     # Displaying the details
     print(f"\nDetails for {follower_name}:")
@@ -643,8 +522,7 @@ def display_follower_details(conn, follower_usr,current_usr):
     print(f"Followers: {follower_count}")
     
     # Fetching the 3 most recent tweets
-    cursor.execute("SELECT text FROM tweets WHERE writer = ? ORDER BY tdate DESC LIMIT 3", (follower_usr,))
-    recent_tweets = cursor.fetchall()
+    recent_tweets = store.user_tweets(follower_usr, limit=3)
     if recent_tweets:
         print("\n3 Most Recent Tweets:")
         for tweet in recent_tweets:
@@ -653,24 +531,10 @@ def display_follower_details(conn, follower_usr,current_usr):
     # Asking the user for further actions
     action = input("\nChoose an action (follow/see more tweets/go back): ")
     if action == "follow":
-        cursor.execute("SELECT 1 FROM follows WHERE flwer = ? AND flwee = ?", (current_usr, follower_usr))
-        already_following = cursor.fetchone()
-    
-        if already_following:
-            print(f"You are already following {follower_usr}.")
-        else:
-        # Implement the follow functionality
-            cursor.execute("INSERT INTO follows(flwer, flwee, start_date) VALUES (?, ?, date('now'))", (current_usr,follower_usr))
-            conn.commit()
-            print(f"You are now following {follower_usr}!")
+        # Implement the follow functionality, unless they are already followed
+        follow_user(store, current_usr, follower_usr)
     elif action == "see more tweets":
-        cursor.execute("""
-                    SELECT text, tdate
-                    FROM tweets
-                    WHERE writer = ?
-                    ORDER BY tdate DESC
-                """, (follower_usr,))
-        tweets = cursor.fetchall()
+        tweets = store.user_tweets(follower_usr)
         for text, tdate in tweets:
             print(f"{tdate}: {text}")
 
@@ -680,45 +544,25 @@ def display_follower_details(conn, follower_usr,current_usr):
         print("Invalid action.")
 
 
-def search_users(conn, current_user):
+def search_users(store, current_user):
     """
     Search for users by a keyword (name or city) and display matching users. 
     Allows the current user to view details of a selected user from the search results.
 
     Args:
-        conn: The SQLite database connection.
+        store (TwitterStore): The data access layer of the application.
         current_user (int): The user ID of the current user.
 
     This function prompts the user to enter a keyword and searches for users whose names or cities contain 
     the keyword. It then displays the matching users and offers the option to view details of a selected user.
     """
 
-    cursor = conn.cursor()
-
     keyword = input("Enter a keyword to search for users: ")
-
-    # SQL query for searching users by name and city containing the keyword
-    query = """
-        SELECT usr, name, city
-        FROM users
-        WHERE name LIKE ? OR city LIKE ?
-        ORDER BY
-        CASE
-            WHEN name LIKE ? THEN 0
-            ELSE 1
-        END,
-        CASE
-            WHEN name LIKE ? THEN LENGTH(name)
-            ELSE LENGTH(city)
-        END,
-        usr
-    """
     word = keyword
-    keyword = f"%{keyword}%"
 
-    # Execute the query with the keyword as a parameter for both name and city
-    cursor.execute(query, (keyword, keyword, keyword, keyword))
-    users = cursor.fetchall()
+    # searching users by name and city containing the keyword, one page at a time plus one
+    # more user to know whether there is another page
+    users = store.search_users(keyword, 5 + 1)
 
     if not users:
         
@@ -740,6 +584,8 @@ def search_users(conn, current_user):
                 show_more = input("Show more users [Y/N]? ").strip().lower()
                 if show_more == "y":
                     valid_sm = True
+                    # fetch the next page after the users already fetched
+                    users += store.search_users(keyword, 5, offset=len(users))
                 elif show_more == 'n':
                     valid_sm = True
                     break  # Exit both loops when 'n' is entered
@@ -751,22 +597,22 @@ def search_users(conn, current_user):
             choice = int(input("\nEnter the user number to see more details or 0 to go back: "))
             if choice == 0:
                 return
-            elif 1 <= choice <= len(users):
+            elif 1 <= choice <= min(displayed_users, len(users)):
                 selected_user = users[choice - 1]
-                display_user_details(conn, selected_user, current_user)
+                display_user_details(store, selected_user, current_user)
             else:
                 print("Invalid user number. Please try again.")
         except ValueError:
             print("Invalid input. Please enter a number.")
 
 
-def display_user_details(conn, user, current_user):
+def display_user_details(store, user, current_user):
     """
     Display details of a user, including their information, tweet count, following count, and followers.
     Allows the current user to follow the displayed user and view more of their tweets.
 
     Arguments:
-        conn: The SQLite database connection.
+        store (TwitterStore): The data access layer of the application.
         user (tuple): A tuple containing user information (user ID, name, city).
         current_user (int): The user ID of the current user.
 
@@ -774,18 +620,10 @@ def display_user_details(conn, user, current_user):
     following count, and followers. It also provides options for the current user to follow the displayed user
     and view more of their tweets.
 """   
-    cursor = conn.cursor()
     usr, name, city = user
 
     # Fetch the number of tweets, users being followed, and followers for the selected user
-    cursor.execute("SELECT COUNT(*) FROM tweets WHERE writer = ?", (usr,))
-    tweet_count = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(*) FROM follows WHERE flwer = ?", (usr,))
-    following_count = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(*) FROM follows WHERE flwee = ?", (usr,))
-    follower_count = cursor.fetchone()[0]
+    tweet_count, following_count, follower_count = store.user_counts(usr)
 
     # Display the user details
     print(f"\nUser ID: {usr}")
@@ -794,10 +632,13 @@ def display_user_details(conn, user, current_user):
     print(f"Number of Tweets: {tweet_count}")
     print(f"Following: {following_count} users")
     print(f"Followers: {follower_count}")
+    if usr != current_user:
+        common, jaccard = store.follower_overlap(current_user, usr)
+        print(f"Follows you: {'yes' if store.is_following(usr, current_user) else 'no'}")
+        print(f"Followers in common with you: {common}")
 
     # Fetch up to 3 most recent tweets of the user
-    cursor.execute("SELECT text, tdate FROM tweets WHERE writer = ? AND replyto IS NULL ORDER BY tdate DESC LIMIT 3", (usr,))
-    recent_tweets = cursor.fetchall()
+    recent_tweets = store.user_tweets(usr, limit=3, originals_only=True)
 
     if recent_tweets:
         print("\n3 Most Recent Tweets:")
@@ -813,62 +654,56 @@ def display_user_details(conn, user, current_user):
         choice = input("Enter your choice: ")
 
         if choice == "1":
-            follow_user(conn, current_user, usr)
+            follow_user(store, current_user, usr)
         elif choice == "2":
-            display_more_tweets(conn, usr)
+            display_more_tweets(store, usr)
         elif choice == "3":
             return
         else:
             print("Invalid choice. Please try again.")
 
 
-def follow_user(conn, current_user, target_user):
+def follow_user(store, current_user, target_user):
     """
     Follow a target user and add the relationship to the database.
 
     Arguments:
-        conn: The SQLite database connection.
+        store (TwitterStore): The data access layer of the application.
         current_user (int): The user ID of the follower.
         target_user (int): The user ID of the user to be followed.
 
     This function checks if the current user is already following the target user. If not, it establishes
     a follow relationship between the current user and the target user, recording the start date.
 """
-    cursor = conn.cursor()
-
-    # Check if the current user is already following the target user
-    cursor.execute("SELECT 1 FROM follows WHERE flwer = ? AND flwee = ?", (current_user, target_user))
-    already_following = cursor.fetchone()
-
-    if already_following:
+    # Follow the target user, unless the current user is already following them
+    try:
+        followed = store.follow(current_user, target_user)
+    except ReadOnlyError:
+        print("Cannot follow: the database is open read-only.")
+        return
+    except sqlite3.IntegrityError:
+        print("Cannot follow: a user referred to does not exist.")
+        return
+    if not followed:
         print(f"You are already following User ID {target_user}.")
     else:
-        # Follow the target user
-        cursor.execute("INSERT INTO follows(flwer, flwee, start_date) VALUES (?, ?, DATE('now'))", (current_user, target_user))
-        conn.commit()
         print(f"You are now following User ID {target_user}!")
 
 
-def display_more_tweets(conn, user_id, chunk_size=3):
+def display_more_tweets(store, user_id, chunk_size=3):
     """
     Display tweets from a user in chunks, allowing the user to view more tweets if available.
 
     Arguments:
-        conn: The SQLite database connection.
+        store (TwitterStore): The data access layer of the application.
         user_id (int): The user's ID for whom to display tweets.
         chunk_size (int, optional): The number of tweets to display in each chunk. Default is 3.
 
     This function retrieves and displays tweets from the specified user, excluding replies, in chunks.
     It starts by showing the initial chunk of tweets and then continues to display more tweets based on user input.
 """
-    cursor = conn.cursor()
-
     # Fetch all tweets of the user that are not replies, ordered by date.
-    cursor.execute(
-        "SELECT text, tdate FROM tweets WHERE writer = ? AND replyto IS NULL ORDER BY tdate DESC",
-        (user_id,)
-    )
-    tweets = cursor.fetchall()
+    tweets = store.user_tweets(user_id, originals_only=True)
 
     if not tweets:
         print("No more tweets from this user.")
@@ -908,9 +743,186 @@ def display_more_tweets(conn, user_id, chunk_size=3):
         start_idx += chunk_size  # Move the start index to skip the displayed tweets
 
 
+def who_to_follow(store, current_user):
+    """
+    Suggest accounts followed by the accounts the current user follows, and show the details of a chosen one.
+
+    Args:
+        store (TwitterStore): The data access layer of the application.
+        current_user (int): The user ID of the current user.
+
+    Suggestions followed by more of the user's followees come first; from the details the user can follow them.
+    """
+    suggestions = store.who_to_follow(current_user)
+    if not suggestions:
+        print("No suggestions found. Follow more users to get some.")
+        return
+
+    print("\nWho to Follow:")
+    for i, (usr, name, city, common) in enumerate(suggestions, start=1):
+        print(f"{i}. User ID: {usr}, Name: {name}, City: {city} (followed by {common} you follow)")
+
+    try:
+        choice = int(input("\nEnter the user number to see more details or 0 to go back: "))
+    except ValueError:
+        choice = -1
+    if choice == 0:
+        return
+    if 1 <= choice <= len(suggestions):
+        usr, name, city, common = suggestions[choice - 1]
+        display_user_details(store, (usr, name, city), current_user)
+    else:
+        print("Invalid choice.")
+
+
+def select_list(store, current_user):
+    """
+    Ask the current user to pick one of their lists.
+
+    Returns:
+        str: The name of the chosen list, or None if they have no lists or made an invalid choice.
+    """
+    lists = store.user_lists(current_user)
+    if not lists:
+        print("You have no lists.")
+        return None
+    for i, (lname, member_count) in enumerate(lists, start=1):
+        print(f"{i}. {lname} ({member_count} members)")
+    try:
+        choice = int(input("Enter the list number: "))
+    except ValueError:
+        choice = 0
+    if 1 <= choice <= len(lists):
+        return lists[choice - 1][0]
+    print("Invalid choice.")
+    return None
+
+
+def view_list(store, current_user, lname):
+    """
+    Display the members of a list, then the tweets and retweets of its members, newest first, five at a time.
+
+    Args:
+        store (TwitterStore): The data access layer of the application.
+        current_user (int): The user ID of the current user.
+        lname (str): The name of the list.
+
+    Tweets can be replied to, retweeted and opened as threads, like in the feed.
+    """
+    members = store.list_members(lname)
+    print(f"\nMembers of {lname}:")
+    if not members:
+        print("No members yet.")
+        return
+    for usr, name, city in members:
+        print(f"- {name} (User ID: {usr}, City: {city})")
+
+    # pages are merged from the members' tweets only when the display loop asks for them
+    pages = iter(store.list_pages(lname))
+    first_page = next(pages, None)
+    if first_page is None:
+        print("No tweets from the members of this list.")
+        return
+    print(f"\nTimeline of {lname}:")
+    tweet_functions(store, current_user, chain([first_page], pages))
+
+
+def manage_lists(store, current_user):
+    """
+    Show the lists of the current user and let them create lists, view a list's timeline, and add or remove members.
+
+    Args:
+        store (TwitterStore): The data access layer of the application.
+        current_user (int): The user ID of the current user.
+    """
+    while True:
+        lists = store.user_lists(current_user)
+        print("\nYour Lists:")
+        if not lists:
+            print("You have no lists.")
+        for lname, member_count in lists:
+            print(f"- {lname} ({member_count} members)")
+
+        print("\nOptions:")
+        print("1. Create a list")
+        print("2. View a list")
+        print("3. Add a member")
+        print("4. Remove a member")
+        print("5. Go back")
+        choice = input("Enter your choice: ")
+
+        if choice in ("1", "3", "4") and store.read_only:
+            print("Lists cannot be changed: the database is open read-only.")
+        elif choice == "1":
+            lname = input(f"List name (up to {LIST_NAME_LENGTH} characters): ").strip()
+            if not lname or len(lname) > LIST_NAME_LENGTH:
+                print(f"List names have 1 to {LIST_NAME_LENGTH} characters.")
+            elif store.create_list(current_user, lname):
+                print(f"List {lname} created.")
+            else:
+                print(f"The name {lname} is already taken.")
+        elif choice in ("2", "3", "4"):
+            lname = select_list(store, current_user)
+            if lname is None:
+                continue
+            if choice == "2":
+                view_list(store, current_user, lname)
+                continue
+            try:
+                member = int(input("Enter the user ID: "))
+            except ValueError:
+                print("Invalid user ID.")
+                continue
+            if choice == "3":
+                if store.user_name(member) is None:
+                    print(f"There is no user with ID {member}.")
+                elif store.add_list_member(current_user, lname, member):
+                    print(f"User ID {member} added to {lname}.")
+                else:
+                    print(f"User ID {member} is already in {lname}.")
+            elif store.remove_list_member(current_user, lname, member):
+                print(f"User ID {member} removed from {lname}.")
+            else:
+                print(f"User ID {member} is not in {lname}.")
+        elif choice == "5":
+            return
+        else:
+            print("Invalid choice. Please try again.")
+
+
+def trending_hashtags(store):
+    """
+    Display the top hashtags of the last 24 hours and of the last 7 days.
+
+    Args:
+        store (TwitterStore): The data access layer of the application.
+
+    Recent mentions weigh more than older ones, so the lists show what is trending now rather than
+    what has been mentioned the most overall.
+    """
+    for title, hourly in (("Last 24 hours", True), ("Last 7 days", False)):
+        trends = store.trending_hashtags(hourly=hourly)
+        print(f"\nTrending Hashtags, {title}:")
+        if not trends:
+            print("No hashtags mentioned.")
+        for i, (term, score, mentions) in enumerate(trends, start=1):
+            print(f"{i}. #{term} ({mentions} mentions)")
+
+
 def main():
+    # With --query-stats, time every statement and print the totals and slow queries on exit
+    stats = QueryStats() if "--query-stats" in sys.argv[1:] else None
+    # With --read-only, browse a snapshot without writing to it
+    read_only = "--read-only" in sys.argv[1:]
+    # With --sharded, read and write tweets in the shards of the database
+    sharded = "--sharded" in sys.argv[1:]
+    # With --record FILE, append the calls of every session to FILE, to be replayed with replay.py
+    record = sys.argv[sys.argv.index("--record") + 1] if "--record" in sys.argv[1:-1] else None
+
     # Establish a connection to the database
-    conn = connect_db()
+    store = connect_db(stats, read_only, sharded)
+    if record is not None:
+        store = SessionRecorder(store, record)
     
     # Initialize the current_user to None
     current_user = None
@@ -919,7 +931,7 @@ def main():
         while True:
             # If no user is currently logged in, display the login screen
             if not current_user:
-                current_user = login_screen(conn)
+                current_user = login_screen(store)
 
             # Display the main menu options
             print("\nMain Menu:")
@@ -928,37 +940,55 @@ def main():
             print("3. Compose Tweet")
             print("4. List followers")
             print("5. Logout")
+            print("6. Trending Hashtags")
+            print("7. Who to Follow")
+            print("8. My Lists")
             
             # Prompt the user for their choice
             choice = input("Enter choice: ")
 
             if choice == "1":
                 # Option to search for tweets
-                search_tweets(conn, current_user)
+                search_tweets(store, current_user)
             elif choice == "2":
                 # Option to search for users
-                search_users(conn, current_user)
+                search_users(store, current_user)
             elif choice == "3":
                 # Option to compose and post a tweet
                 text = input("Compose your tweet: ")
-                compose_tweet(conn, current_user, text, None)
+                compose_tweet(store, current_user, text, None)
             elif choice == "4":
                 # Option to list the followers of the current user
                 print(current_user)
-                list_followers(conn, current_user)
+                list_followers(store, current_user)
             elif choice == "5":
                 # Option to log out, resetting the current_user to None
                 current_user = None  # Logging out
+                if record is not None:
+                    store.end_session()
                 print("Logged out successfully!")
+            elif choice == "6":
+                # Option to see the hashtags trending today and this week
+                trending_hashtags(store)
+            elif choice == "7":
+                # Option to see accounts followed by the accounts the current user follows
+                who_to_follow(store, current_user)
+            elif choice == "8":
+                # Option to manage the current user's lists and read their timelines
+                manage_lists(store, current_user)
             else:
                 # Handle invalid input
                 print("Invalid choice. Try again.")
 
     finally:
         # Close the database connection when exiting the application
-        if conn:
-            conn.close()
+        if store:
+            store.close()
             print("Database connection closed.")
+        if stats is not None:
+            print_snapshot(stats.snapshot())
+            print(f"\nCache: {store.cache.stats()}")
+            print(f"Search cache: {store.search_cache.stats()}")
 
 
 if __name__ == "__main__":
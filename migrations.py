@@ -0,0 +1,368 @@
+import sys
+
+from dbconfig import open_connection
+from feed import NEXT_PAGE_QUERY, PULLED_FOLLOWEES_QUERY
+from lists import NEXT_MEMBER_RETWEETS_QUERY, NEXT_MEMBER_TWEETS_QUERY, USER_LISTS_QUERY
+from search import USER_SEARCH_QUERY
+
+
+# The day and hour of a tweet, as migration 7 computed them when it shipped; see trending.py
+_TRENDING_DAY = """CASE
+    WHEN t.tdate GLOB '[0-9][0-9]-[A-Za-z][A-Za-z][A-Za-z]-[0-9][0-9][0-9][0-9]'
+    THEN substr(t.tdate, 8, 4) || '-'
+         || printf('%02d', (instr('JANFEBMARAPRMAYJUNJULAUGSEPOCTNOVDEC', upper(substr(t.tdate, 4, 3))) + 2) / 3)
+         || '-' || substr(t.tdate, 1, 2)
+    ELSE DATE(t.tdate)
+END"""
+_TRENDING_HOUR = "strftime('%Y-%m-%d %H:00', ((t.tid >> 22) + 1577836800000) / 1000.0, 'unixepoch')"
+_TRENDING_HAS_HOUR = f"t.tid >= 4194304 AND substr({_TRENDING_HOUR}, 1, 10) = {_TRENDING_DAY}"
+
+# Each migration is (version, description, statements). Versions are applied in order
+# and the highest applied version is stored in PRAGMA user_version, so a database is
+# only ever upgraded once per step. The statements of a shipped migration never change, so they are
+# written out here rather than built from module constants that later changes may edit; fixes go in
+# new migrations.
+MIGRATIONS = [
+    (1, "secondary indexes for feed, profile, follower and search queries", [
+        "CREATE INDEX IF NOT EXISTS tweets_writer_tdate ON tweets (writer, tdate)",
+        "CREATE INDEX IF NOT EXISTS tweets_replyto ON tweets (replyto)",
+        "CREATE INDEX IF NOT EXISTS tweets_tdate ON tweets (tdate)",
+        "CREATE INDEX IF NOT EXISTS follows_flwee_flwer ON follows (flwee, flwer)",
+        "CREATE INDEX IF NOT EXISTS retweets_tid ON retweets (tid)",
+        "CREATE INDEX IF NOT EXISTS mentions_term_tid ON mentions (term, tid)",
+    ]),
+    (2, "trigram full-text index over tweet text, kept in sync by triggers", [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS tweets_fts
+           USING fts5(text, content='tweets', content_rowid='tid', tokenize='trigram')""",
+        """CREATE TRIGGER IF NOT EXISTS tweets_fts_insert AFTER INSERT ON tweets BEGIN
+               INSERT INTO tweets_fts (rowid, text) VALUES (new.tid, new.text);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS tweets_fts_delete AFTER DELETE ON tweets BEGIN
+               INSERT INTO tweets_fts (tweets_fts, rowid, text) VALUES ('delete', old.tid, old.text);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS tweets_fts_update AFTER UPDATE OF tid, text ON tweets BEGIN
+               INSERT INTO tweets_fts (tweets_fts, rowid, text) VALUES ('delete', old.tid, old.text);
+               INSERT INTO tweets_fts (rowid, text) VALUES (new.tid, new.text);
+           END""",
+        # backfill the index from the existing tweets
+        "INSERT INTO tweets_fts (tweets_fts) VALUES ('rebuild')",
+    ]),
+    (3, "reply, retweet, tweet, follower and following counters maintained by triggers", [
+        """CREATE TABLE IF NOT EXISTS tweet_stats (
+           tid            int,
+           reply_count    int NOT NULL DEFAULT 0,
+           retweet_count  int NOT NULL DEFAULT 0,
+           primary key (tid)
+       )""",
+        """CREATE TABLE IF NOT EXISTS user_stats (
+           usr              int,
+           tweet_count      int NOT NULL DEFAULT 0,
+           follower_count   int NOT NULL DEFAULT 0,
+           following_count  int NOT NULL DEFAULT 0,
+           primary key (usr)
+       )""",
+        """CREATE TRIGGER IF NOT EXISTS tweets_stats_insert AFTER INSERT ON tweets BEGIN
+           INSERT INTO user_stats (usr, tweet_count) VALUES (new.writer, 1)
+               ON CONFLICT (usr) DO UPDATE SET tweet_count = tweet_count + 1;
+           INSERT INTO tweet_stats (tid, reply_count) SELECT new.replyto, 1 WHERE new.replyto IS NOT NULL
+               ON CONFLICT (tid) DO UPDATE SET reply_count = reply_count + 1;
+       END""",
+        """CREATE TRIGGER IF NOT EXISTS tweets_stats_delete AFTER DELETE ON tweets BEGIN
+           UPDATE user_stats SET tweet_count = tweet_count - 1 WHERE usr = old.writer;
+           UPDATE tweet_stats SET reply_count = reply_count - 1 WHERE tid = old.replyto;
+       END""",
+        """CREATE TRIGGER IF NOT EXISTS tweets_stats_update AFTER UPDATE OF writer, replyto ON tweets BEGIN
+           UPDATE user_stats SET tweet_count = tweet_count - 1 WHERE usr = old.writer;
+           UPDATE tweet_stats SET reply_count = reply_count - 1 WHERE tid = old.replyto;
+           INSERT INTO user_stats (usr, tweet_count) VALUES (new.writer, 1)
+               ON CONFLICT (usr) DO UPDATE SET tweet_count = tweet_count + 1;
+           INSERT INTO tweet_stats (tid, reply_count) SELECT new.replyto, 1 WHERE new.replyto IS NOT NULL
+               ON CONFLICT (tid) DO UPDATE SET reply_count = reply_count + 1;
+       END""",
+        """CREATE TRIGGER IF NOT EXISTS retweets_stats_insert AFTER INSERT ON retweets BEGIN
+           INSERT INTO tweet_stats (tid, retweet_count) VALUES (new.tid, 1)
+               ON CONFLICT (tid) DO UPDATE SET retweet_count = retweet_count + 1;
+       END""",
+        """CREATE TRIGGER IF NOT EXISTS retweets_stats_delete AFTER DELETE ON retweets BEGIN
+           UPDATE tweet_stats SET retweet_count = retweet_count - 1 WHERE tid = old.tid;
+       END""",
+        """CREATE TRIGGER IF NOT EXISTS follows_stats_insert AFTER INSERT ON follows BEGIN
+           INSERT INTO user_stats (usr, following_count) VALUES (new.flwer, 1)
+               ON CONFLICT (usr) DO UPDATE SET following_count = following_count + 1;
+           INSERT INTO user_stats (usr, follower_count) VALUES (new.flwee, 1)
+               ON CONFLICT (usr) DO UPDATE SET follower_count = follower_count + 1;
+       END""",
+        """CREATE TRIGGER IF NOT EXISTS follows_stats_delete AFTER DELETE ON follows BEGIN
+           UPDATE user_stats SET following_count = following_count - 1 WHERE usr = old.flwer;
+           UPDATE user_stats SET follower_count = follower_count - 1 WHERE usr = old.flwee;
+       END""",
+        # count the existing rows
+        "DELETE FROM tweet_stats",
+        """INSERT INTO tweet_stats (tid, reply_count, retweet_count)
+           SELECT tid, SUM(replies), SUM(retweets)
+           FROM (
+               SELECT replyto AS tid, COUNT(*) AS replies, 0 AS retweets FROM tweets
+               WHERE replyto IS NOT NULL GROUP BY replyto
+               UNION ALL
+               SELECT tid, 0, COUNT(*) FROM retweets GROUP BY tid
+               )
+           GROUP BY tid""",
+        "DELETE FROM user_stats",
+        """INSERT INTO user_stats (usr, tweet_count, follower_count, following_count)
+           SELECT usr, SUM(tweets), SUM(followers), SUM(following)
+           FROM (
+               SELECT writer AS usr, COUNT(*) AS tweets, 0 AS followers, 0 AS following FROM tweets GROUP BY writer
+               UNION ALL
+               SELECT flwee, 0, COUNT(*), 0 FROM follows GROUP BY flwee
+               UNION ALL
+               SELECT flwer, 0, 0, COUNT(*) FROM follows GROUP BY flwer
+               )
+           GROUP BY usr""",
+    ]),
+    (4, "per-user home timelines filled on write", [
+        """CREATE TABLE IF NOT EXISTS timeline (
+           owner  int,
+           date   date,
+           tid    int,
+           usr    int,
+           kind   int,
+           primary key (owner, date, tid, usr, kind)
+       ) WITHOUT ROWID""",
+        "DELETE FROM timeline",
+        """INSERT OR IGNORE INTO timeline (owner, date, tid, usr, kind)
+           SELECT f.flwer, t.tdate, t.tid, t.writer, 0 FROM follows f JOIN tweets t ON t.writer = f.flwee
+           UNION ALL
+           SELECT f.flwer, r.rdate, r.tid, r.usr, 1 FROM follows f JOIN retweets r ON r.usr = f.flwee""",
+    ]),
+    (5, "sequences for race-free tweet and user ID allocation", [
+        """CREATE TABLE IF NOT EXISTS id_sequences (
+           name     char(12),
+           last_id  int NOT NULL,
+           primary key (name)
+       )""",
+        "INSERT OR IGNORE INTO id_sequences (name, last_id) SELECT 'tweets', COALESCE(MAX(tid), 0) FROM tweets",
+        "INSERT OR IGNORE INTO id_sequences (name, last_id) SELECT 'users', COALESCE(MAX(usr), 0) FROM users",
+    ]),
+    (6, "trigram full-text index over user names and cities, kept in sync by triggers", [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS users_fts
+           USING fts5(name, city, content='users', content_rowid='usr', tokenize='trigram')""",
+        """CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+               INSERT INTO users_fts (rowid, name, city) VALUES (new.usr, new.name, new.city);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+               INSERT INTO users_fts (users_fts, rowid, name, city) VALUES ('delete', old.usr, old.name, old.city);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF usr, name, city ON users BEGIN
+               INSERT INTO users_fts (users_fts, rowid, name, city) VALUES ('delete', old.usr, old.name, old.city);
+               INSERT INTO users_fts (rowid, name, city) VALUES (new.usr, new.name, new.city);
+           END""",
+        # backfill the index from the existing users
+        "INSERT INTO users_fts (users_fts) VALUES ('rebuild')",
+    ]),
+    (7, "daily and hourly hashtag mention rollups maintained by triggers", [
+        """CREATE TABLE IF NOT EXISTS hashtag_daily (
+           day    date,
+           term   char(10),
+           count  int NOT NULL DEFAULT 0,
+           primary key (day, term)
+       ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS hashtag_hourly (
+           hour   char(16),
+           term   char(10),
+           count  int NOT NULL DEFAULT 0,
+           primary key (hour, term)
+       ) WITHOUT ROWID""",
+        f"""CREATE TRIGGER IF NOT EXISTS mentions_trending_insert AFTER INSERT ON mentions BEGIN
+           INSERT INTO hashtag_daily (day, term, count)
+               SELECT {_TRENDING_DAY}, new.term, 1 FROM tweets t WHERE t.tid = new.tid AND {_TRENDING_DAY} IS NOT NULL
+               ON CONFLICT (day, term) DO UPDATE SET count = count + 1;
+           INSERT INTO hashtag_hourly (hour, term, count)
+               SELECT {_TRENDING_HOUR}, new.term, 1 FROM tweets t WHERE t.tid = new.tid AND {_TRENDING_HAS_HOUR}
+               ON CONFLICT (hour, term) DO UPDATE SET count = count + 1;
+       END""",
+        f"""CREATE TRIGGER IF NOT EXISTS mentions_trending_delete AFTER DELETE ON mentions BEGIN
+           UPDATE hashtag_daily SET count = count - 1
+               WHERE term = old.term AND day = (SELECT {_TRENDING_DAY} FROM tweets t WHERE t.tid = old.tid);
+           UPDATE hashtag_hourly SET count = count - 1
+               WHERE term = old.term AND hour = (SELECT {_TRENDING_HOUR} FROM tweets t WHERE t.tid = old.tid AND {_TRENDING_HAS_HOUR});
+       END""",
+        "DELETE FROM hashtag_daily",
+        f"""INSERT INTO hashtag_daily (day, term, count)
+        SELECT {_TRENDING_DAY} AS day, m.term, COUNT(*) FROM mentions m JOIN tweets t ON t.tid = m.tid
+        WHERE day IS NOT NULL GROUP BY day, m.term""",
+        "DELETE FROM hashtag_hourly",
+        f"""INSERT INTO hashtag_hourly (hour, term, count)
+        SELECT {_TRENDING_HOUR} AS hour, m.term, COUNT(*) FROM mentions m JOIN tweets t ON t.tid = m.tid
+        WHERE {_TRENDING_HAS_HOUR} GROUP BY hour, m.term""",
+    ]),
+    (8, "reply index ordered by tid for paginated thread views", [
+        "CREATE INDEX IF NOT EXISTS tweets_replyto_tid ON tweets (replyto, tid)",
+        # the new index serves every lookup of the old one
+        "DROP INDEX IF EXISTS tweets_replyto",
+    ]),
+    (9, "list owner index and per-member indexes in feed order for list timelines", [
+        "CREATE INDEX IF NOT EXISTS lists_owner ON lists (owner)",
+        "CREATE INDEX IF NOT EXISTS tweets_writer_tdate_tid ON tweets (writer, tdate, tid)",
+        # the new index serves every lookup of the old one
+        "DROP INDEX IF EXISTS tweets_writer_tdate",
+        "CREATE INDEX IF NOT EXISTS retweets_usr_rdate_tid ON retweets (usr, rdate, tid)",
+    ]),
+    (10, "no timeline entries for accounts above the fan-out limit, whose posts the feed pulls", [
+        # 10000 is FANOUT_FOLLOWER_LIMIT in feed.py at the time of this migration
+        """DELETE FROM timeline
+           WHERE usr IN (SELECT usr FROM user_stats WHERE follower_count > 10000)""",
+    ]),
+    (11, "list owner index ordered by list name, so the lists of a user are grouped without a sort", [
+        "CREATE INDEX IF NOT EXISTS lists_owner_lname ON lists (owner, lname)",
+        # the new index serves every lookup of the old one
+        "DROP INDEX IF EXISTS lists_owner",
+    ]),
+]
+
+# The queries behind the feed, profile, follower list, tweet detail, tweet search, user search and lists.
+# None of them may fall back to a full table scan, or sort rows in a temporary B-tree, once the migrations
+# are applied.
+HOT_QUERIES = {
+    "get_tweets_of_followee": (NEXT_PAGE_QUERY, {"usr": 1, "limit": 5, "date": "9", "tid": 0, "writer": 0, "kind": 0}),
+    "pulled_followees": (PULLED_FOLLOWEES_QUERY, {"usr": 1, "fanout_limit": 10000}),
+    "user_counts": ("SELECT tweet_count, following_count, follower_count FROM user_stats WHERE usr = ?", (1,)),
+    "recent_tweets": ("SELECT text, tdate FROM tweets WHERE writer = ? ORDER BY tdate DESC LIMIT 3", (1,)),
+    "list_followers": ("SELECT flwer, name FROM follows JOIN users ON follows.flwer = users.usr WHERE flwee = ?", (1,)),
+    "tweet_counts": ("SELECT reply_count, retweet_count FROM tweet_stats WHERE tid = ?", (1,)),
+    "search_text": ("SELECT rowid, bm25(tweets_fts) FROM tweets_fts WHERE tweets_fts MATCH ? ORDER BY 2 LIMIT 100",
+                    ('"oilers"',)),
+    "search_term": ("SELECT tid, 0.0 AS score FROM mentions WHERE term IN (?)", ("edmonton",)),
+    "search_users": (USER_SEARCH_QUERY, {"name_query": 'name : "edm"', "city_query": 'city : "edm"',
+                                         "pattern": "%edm%", "limit": 100, "offset": 0}),
+    "user_lists": (USER_LISTS_QUERY, (1,)),
+    "list_member_tweets": (NEXT_MEMBER_TWEETS_QUERY, {"member": 1, "limit": 5, "date": "9", "tid": 0, "writer": 0,
+                                                      "kind": 0}),
+    "list_member_retweets": (NEXT_MEMBER_RETWEETS_QUERY, {"member": 1, "limit": 5, "date": "9", "tid": 0,
+                                                          "writer": 0, "kind": 0}),
+}
+
+# Hot queries that rank their matches by relevance, which no index can order; they sort only the
+# rows that match, and may use a temporary B-tree for it.
+RANKED_QUERIES = {"search_text", "search_users"}
+
+
+def schema_version(conn):
+    """
+    Return the schema version recorded in the database.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+
+    Returns:
+        int: The highest migration version applied to the database.
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Apply every migration newer than the database's schema version.
+
+    Each migration runs in its own transaction together with the version bump, so an
+    interrupted upgrade leaves the database at the last completed version.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+
+    Returns:
+        int: The schema version after upgrading.
+    """
+    current = schema_version(conn)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        with conn:
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA does not accept parameters; version is always an int from MIGRATIONS
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        current = version
+    return current
+
+
+def query_plan_scans(conn, sql, params, sorts=True):
+    """
+    Find full table scans, and sorts in a temporary B-tree, in the query plan of a statement.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        sql (str): The statement to explain.
+        params (tuple or dict): Parameters bound to the statement.
+        sorts (bool, optional): Whether to report "USE TEMP B-TREE" details, which mean the rows are read
+            in full and sorted rather than read from an index in order. Default is True.
+
+    Returns:
+        list: The plan details that scan a real table (scans of subqueries and
+        constant rows are not counted, nor are virtual table scans driven by a constraint
+        such as an FTS5 MATCH) or that use a temporary B-tree.
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    scans = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+        detail = row[3]
+        words = detail.split()
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] in tables:
+            if "VIRTUAL TABLE INDEX" in detail and not detail.endswith(":"):
+                continue
+            scans.append(detail)
+        elif sorts and "TEMP B-TREE" in detail:
+            scans.append(detail)
+    return scans
+
+
+def check_query_plans(conn, queries=None):
+    """
+    Check that none of the hot queries full-scans a table, or sorts in a temporary B-tree unless it is
+    one of RANKED_QUERIES.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        queries (dict, optional): Mapping of name to (sql, params). Defaults to HOT_QUERIES.
+
+    Returns:
+        dict: Mapping of query name to its offending plan details; empty when every query is indexed.
+    """
+    if queries is None:
+        queries = HOT_QUERIES
+    failures = {}
+    for name, (sql, params) in queries.items():
+        scans = query_plan_scans(conn, sql, params, sorts=name not in RANKED_QUERIES)
+        if scans:
+            failures[name] = scans
+    return failures
+
+
+def main(argv):
+    """
+    Upgrade a database and optionally check the hot query plans.
+
+    Usage: python migrations.py DATABASE [--check]
+    """
+    if len(argv) < 2:
+        print("Usage: python migrations.py DATABASE [--check]")
+        return 2
+    conn = open_connection(argv[1])
+    try:
+        version = migrate(conn)
+        print(f"Schema version: {version}")
+        if "--check" in argv[2:]:
+            failures = check_query_plans(conn)
+            for name, scans in failures.items():
+                for detail in scans:
+                    print(f"{name}: {detail}")
+            if failures:
+                print("Query plan check failed.")
+                return 1
+            print("Query plan check passed.")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,275 @@
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+# Statements that take at least this many milliseconds, execution and fetching together, go to the slow-query log
+SLOW_QUERY_MS = 100.0
+# Number of slow queries kept in memory for snapshots
+SLOW_LOG_SIZE = 100
+# Longest repr of the parameters of a slow query that is logged
+MAX_PARAMS_LENGTH = 200
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """
+    Reduce a statement to its shape, so that the calls of the same statement are counted together.
+
+    Literals become ?, runs of placeholders (as in IN lists) become "?, ..." and whitespace is collapsed.
+
+    Args:
+        sql (str): The statement as executed.
+
+    Returns:
+        str: The normalized statement.
+    """
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    return _PLACEHOLDER_LIST.sub("?, ...", sql)
+
+
+def explain(conn, sql, parameters=()):
+    """
+    Run EXPLAIN QUERY PLAN for a statement.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        sql (str): The statement.
+        parameters (tuple or dict, optional): Parameters bound to the statement.
+
+    Returns:
+        list: The detail column of every plan row, or None if the statement cannot be explained.
+    """
+    try:
+        # a plain cursor, so explaining is not itself recorded
+        return [row[3] for row in sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, parameters)]
+    except (sqlite3.Error, ValueError):
+        return None
+
+
+class QueryStats:
+    """
+    Per-statement call count, total and max latency and rows returned, and a log of slow queries.
+
+    One QueryStats can be shared by the connections of several threads.
+
+    Args:
+        slow_ms (float, optional): Latency at or above which a call is logged as slow. Default is SLOW_QUERY_MS.
+        slow_log (str, optional): File the slow queries are appended to as JSON lines, in addition to
+            the last SLOW_LOG_SIZE kept in memory.
+    """
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, slow_log=None):
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._plans = {}
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+
+    def record(self, conn, sql, parameters, elapsed_ms, rows):
+        """
+        Add one call of a statement.
+
+        Args:
+            conn (sqlite3.Connection): The connection the statement ran on, used to explain slow calls.
+            sql (str): The statement as executed.
+            parameters (tuple or dict): Parameters bound to the statement.
+            elapsed_ms (float): Time spent executing the statement and fetching its rows.
+            rows (int): Number of rows fetched.
+        """
+        key = normalize_sql(sql)
+        slow = elapsed_ms >= self.slow_ms
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                entry = self._statements[key] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "slow": 0}
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["rows"] += rows
+            entry["slow"] += slow
+            plan = self._plans.get(key)
+        if not slow:
+            return
+
+        # the plan of a statement rarely changes, so it is explained once per normalized statement
+        if plan is None:
+            plan = explain(conn, sql, parameters)
+            with self._lock:
+                self._plans[key] = plan
+        params = repr(parameters)
+        record = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "elapsed_ms": round(elapsed_ms, 3),
+            "rows": rows,
+            "sql": key,
+            "params": params if len(params) <= MAX_PARAMS_LENGTH else params[:MAX_PARAMS_LENGTH] + "...",
+            "plan": plan,
+        }
+        with self._lock:
+            self._slow.append(record)
+            if self.slow_log:
+                with open(self.slow_log, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: "statements", a list of per-statement stats with the most total time first,
+            and "slow", the most recent slow queries, oldest first.
+        """
+        with self._lock:
+            statements = [
+                {"sql": sql, "calls": entry["calls"], "total_ms": round(entry["total_ms"], 3),
+                 "mean_ms": round(entry["total_ms"] / entry["calls"], 3), "max_ms": round(entry["max_ms"], 3),
+                 "rows": entry["rows"], "slow": entry["slow"]}
+                for sql, entry in self._statements.items()
+            ]
+            slow = list(self._slow)
+        statements.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return {"statements": statements, "slow": slow}
+
+    def reset(self):
+        """
+        Forget every statement and slow query recorded so far.
+        """
+        with self._lock:
+            self._statements.clear()
+            self._plans.clear()
+            self._slow.clear()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    A cursor that times each statement, from execute until its rows have been fetched.
+
+    A call is recorded when its results are exhausted, when the cursor runs another statement,
+    or when it is closed or garbage collected, whichever comes first.
+    """
+
+    _call = None
+
+    def _start(self, sql, parameters, elapsed):
+        self._finish()
+        self._call = [sql, parameters, elapsed, 0]
+
+    def _add(self, elapsed, rows):
+        if self._call is not None:
+            self._call[2] += elapsed
+            self._call[3] += rows
+
+    def _finish(self):
+        call = self._call
+        if call is None:
+            return
+        self._call = None
+        stats = getattr(self.connection, "stats", None)
+        if stats is not None:
+            sql, parameters, elapsed, rows = call
+            stats.record(self.connection, sql, parameters, elapsed * 1000, rows)
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._start(sql, parameters, time.perf_counter() - started)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        # keep the first parameters for EXPLAIN; they may come from a generator that can only be read once
+        seq_of_parameters = list(seq_of_parameters)
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._start(sql, seq_of_parameters[0] if seq_of_parameters else (), time.perf_counter() - started)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(time.perf_counter() - started, row is not None)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add(time.perf_counter() - started, len(rows))
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(time.perf_counter() - started, len(rows))
+        self._finish()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(time.perf_counter() - started, 0)
+            self._finish()
+            raise
+        self._add(time.perf_counter() - started, 1)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    A connection whose statements are recorded in its stats attribute.
+
+    Pass it as factory to sqlite3.connect, then set stats to a QueryStats; while stats is None
+    nothing is recorded.
+    """
+
+    stats = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def print_snapshot(snapshot, limit=20, file=None):
+    """
+    Print the statements with the most total time and the slow queries of a snapshot.
+
+    Args:
+        snapshot (dict): As returned by QueryStats.snapshot.
+        limit (int, optional): Number of statements to print. Default is 20.
+        file (file, optional): Where to print. Defaults to sys.stdout.
+    """
+    file = file or sys.stdout
+    print(f"{'calls':>8} {'total ms':>11} {'mean ms':>9} {'max ms':>9} {'rows':>9}  statement", file=file)
+    for entry in snapshot["statements"][:limit]:
+        print(f"{entry['calls']:>8} {entry['total_ms']:>11.2f} {entry['mean_ms']:>9.3f} {entry['max_ms']:>9.3f} "
+              f"{entry['rows']:>9}  {entry['sql'][:100]}", file=file)
+    for record in snapshot["slow"]:
+        print(f"\nSlow query, {record['elapsed_ms']} ms, {record['rows']} rows: {record['sql']}", file=file)
+        print(f"  params: {record['params']}", file=file)
+        for detail in record["plan"] or []:
+            print(f"  {detail}", file=file)
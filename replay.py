@@ -0,0 +1,339 @@
+import json
+import os
+import sys
+import threading
+import time
+from functools import wraps
+
+from bench import percentile
+from cache import LRUCache
+from feed import FEED_PAGE_SIZE
+from lists import LIST_PAGE_SIZE
+from search import SearchCache
+from shards import ShardedTwitterStore, connect_shard, shard_paths
+from snapshot import create_snapshot
+from store import TwitterStore, _iter_pages, connect, connect_cold_tier
+
+# Sessions replayed at once, each on its own thread and connection
+REPLAY_CONCURRENCY = 16
+# Store methods the menu calls, and the high-level action each is reported under
+ACTIONS = {
+    "get_credentials": "login",
+    "signup": "signup",
+    "feed_page": "feed_page",
+    "list_page": "list_page",
+    "search_tweets": "search_tweets",
+    "search_users": "search_users",
+    "hydrate_tweets": "tweet_details",
+    "tweet_detail": "thread",
+    "thread_ancestors": "thread",
+    "thread_replies": "thread",
+    "profile": "user_details",
+    "user_counts": "user_details",
+    "user_tweets": "user_details",
+    "user_name": "user_details",
+    "is_following": "user_details",
+    "follower_overlap": "user_details",
+    "followers": "followers",
+    "who_to_follow": "who_to_follow",
+    "trending_hashtags": "trending",
+    "user_lists": "lists",
+    "list_members": "lists",
+    "create_list": "lists",
+    "add_list_member": "lists",
+    "remove_list_member": "lists",
+    "compose_tweet": "compose",
+    "follow": "follow",
+    "retweet": "retweet",
+}
+# Positional arguments left out of recordings, by method: passwords are recorded as empty strings
+REDACTED_ARGS = {"signup": (1,)}
+
+
+class SessionRecorder:
+    """
+    Wrap a store and append every call of the methods in ACTIONS to a recording, with its time.
+
+    Each call is one JSON line with the session it belongs to, its offset in seconds from the start of the
+    session ("t"), the method ("op"), its arguments and how long it took ("ms"). A session starts with the
+    first call after the recorder is created or after end_session(), which is the login, and ends at logout
+    or exit. Feeds and list timelines are recorded a page at a time, when the menu asks for the next page.
+    Every other attribute is that of the store.
+
+    Args:
+        store (TwitterStore): The store the calls are made on.
+        path (str): The recording, a JSON lines file that calls are appended to.
+    """
+
+    def __init__(self, store, path):
+        self.store = store
+        self._file = open(path, "a", encoding="utf-8")
+        self._sessions = 0
+        self._session = None
+        self._started = None
+
+    def __getattr__(self, name):
+        value = getattr(self.store, name)
+        if name not in ACTIONS:
+            return value
+
+        @wraps(value)
+        def recorded(*args, **kwargs):
+            return self._call(name, value, args, kwargs)
+        return recorded
+
+    def _call(self, name, method, args, kwargs):
+        if self._session is None:
+            self._sessions += 1
+            self._session = f"{os.getpid()}-{int(time.time())}-{self._sessions}"
+            self._started = time.perf_counter()
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            redacted = REDACTED_ARGS.get(name, ())
+            event = {
+                "session": self._session,
+                "t": round(started - self._started, 3),
+                "op": name,
+                "args": ["" if i in redacted else arg for i, arg in enumerate(args)],
+                "kwargs": kwargs,
+                "ms": round(elapsed_ms, 3),
+            }
+            self._file.write(json.dumps(event) + "\n")
+            self._file.flush()
+
+    def feed_pages(self, usr, page_size=FEED_PAGE_SIZE):
+        """
+        Lazily iterate over the pages of a user's home feed, recording a feed_page call per page.
+        """
+        return _iter_pages(lambda cursor: self.feed_page(usr, page_size, cursor), page_size)
+
+    def list_pages(self, lname, page_size=LIST_PAGE_SIZE):
+        """
+        Lazily iterate over the pages of a list timeline, recording a list_page call per page.
+        """
+        return _iter_pages(lambda cursor: self.list_page(lname, page_size, cursor), page_size)
+
+    def end_session(self):
+        """
+        End the current session, at logout; the next call starts a new one.
+        """
+        self._session = None
+
+    def close(self):
+        """
+        Close the recording and the store.
+        """
+        self.end_session()
+        self._file.close()
+        self.store.close()
+
+
+def load_sessions(paths):
+    """
+    Read the sessions of one or more recordings.
+
+    Args:
+        paths (list): Recordings written by SessionRecorder.
+
+    Returns:
+        list: The sessions in the order they were recorded, each a list of calls in order of "t".
+    """
+    sessions = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    event = json.loads(line)
+                    sessions.setdefault((path, event["session"]), []).append(event)
+    return [sorted(events, key=lambda event: event["t"]) for events in sessions.values()]
+
+
+def _summary(latencies, errors):
+    """
+    Returns:
+        dict: calls, errors, p50_ms, p90_ms, p99_ms, mean_ms and max_ms of a list of latencies.
+    """
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50), 4),
+        "p90_ms": round(percentile(latencies, 0.90), 4),
+        "p99_ms": round(percentile(latencies, 0.99), 4),
+        "mean_ms": round(sum(latencies) / len(latencies), 4),
+        "max_ms": round(latencies[-1], 4),
+    }
+
+
+def replay_sessions(db_name, sessions, count=None, concurrency=REPLAY_CONCURRENCY, speedup=1.0, ramp=0.0,
+                    sharded=False):
+    """
+    Replay recorded sessions concurrently and measure the latency of every call.
+
+    Sessions are replayed by concurrency threads, each with its own store, which share a cache, a search
+    cache and a follow graph, like the connections of the HTTP service. Every session waits between its calls
+    as long as the user did, divided by speedup, so that a session's calls start at their recorded offsets;
+    a call that starts late, because the previous ones took longer than recorded, adds to the lag. Calls that
+    fail, e.g. following a user that does not exist in the database, count as errors and the session goes on.
+
+    Args:
+        db_name (str): Path of the SQLite database file, which the sessions write to.
+        sessions (list): Sessions as returned by load_sessions.
+        count (int, optional): Sessions to replay, going round the recorded ones as many times as needed.
+            Defaults to each recorded session once.
+        concurrency (int, optional): Sessions replayed at once. Default is REPLAY_CONCURRENCY.
+        speedup (float, optional): How many times faster than recorded the sessions run; 0 replays every
+            call as soon as the previous one returns. Default is 1.0.
+        ramp (float, optional): Seconds over which the starts of the sessions are spread. Default is 0.
+        sharded (bool, optional): Keep tweets in the shards of the database, split with shards.py; every
+            thread has its own connection to each shard. Default is False.
+
+    Returns:
+        dict: The numbers of sessions and calls, elapsed seconds, calls per second, the latency of the calls
+        of each action of ACTIONS, the lag of the calls behind their schedule, and the cache counters.
+    """
+    count = len(sessions) if count is None else count
+    cache = LRUCache()
+    search_cache = SearchCache()
+    store = TwitterStore(connect(db_name))
+    try:
+        graph = store.follow_graph()
+    finally:
+        store.close()
+    lock = threading.Lock()
+    pending = iter(range(count))
+    calls = []
+
+    def replay(store, i):
+        # a session starts at its place in the ramp, or when a thread is free
+        session_start = max(started + ramp * i / count, time.perf_counter())
+        timed = []
+        for event in sessions[i % len(sessions)]:
+            due = session_start + (event["t"] / speedup if speedup else 0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            begun = time.perf_counter()
+            try:
+                getattr(store, event["op"])(*event["args"], **event["kwargs"])
+                failed = False
+            except Exception:
+                failed = True
+            timed.append((ACTIONS.get(event["op"], event["op"]), (time.perf_counter() - begun) * 1000,
+                          max(begun - due, 0) * 1000, failed))
+        return timed
+
+    def worker():
+        # connections are used and closed by the thread that opened them
+        if sharded:
+            store = ShardedTwitterStore(connect(db_name), [connect_shard(path) for path in shard_paths(db_name)],
+                                        cache, graph, search_cache=search_cache)
+        else:
+            store = TwitterStore(connect(db_name), cache, graph, search_cache=search_cache,
+                                 cold=connect_cold_tier(db_name))
+        try:
+            while True:
+                with lock:
+                    i = next(pending, None)
+                if i is None:
+                    return
+                session_calls = replay(store, i)
+                with lock:
+                    calls.extend(session_calls)
+        finally:
+            store.close()
+
+    threads = [threading.Thread(target=worker, name=f"session-{n}") for n in range(max(1, min(concurrency, count)))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = {}
+    errors = {}
+    for action, latency_ms, lag_ms, failed in calls:
+        latencies.setdefault(action, []).append(latency_ms)
+        errors[action] = errors.get(action, 0) + failed
+    lags = sorted(lag_ms for action, latency_ms, lag_ms, failed in calls)
+    return {
+        "database": db_name,
+        "sharded": sharded,
+        "recorded_sessions": len(sessions),
+        "sessions": count,
+        "concurrency": concurrency,
+        "speedup": speedup,
+        "ramp_s": ramp,
+        "calls": len(calls),
+        "errors": sum(errors.values()),
+        "elapsed_s": round(elapsed, 3),
+        "calls_per_sec": round(len(calls) / elapsed, 1),
+        "actions": {action: _summary(latencies[action], errors[action]) for action in sorted(latencies)},
+        "lag_p50_ms": round(percentile(lags, 0.50), 4) if lags else None,
+        "lag_p99_ms": round(percentile(lags, 0.99), 4) if lags else None,
+        "cache": cache.stats(),
+        "search_cache": search_cache.stats(),
+    }
+
+
+def main(argv):
+    """
+    Replay recordings made with python main.py --record against a copy of a database, and write the results as JSON.
+
+    Usage: python replay.py DATABASE RECORDING [RECORDING ...] [--copy FILE] [--sessions N] [--concurrency N]
+           [--speedup X] [--ramp S] [--output FILE] [--sharded]
+    """
+    usage = ("Usage: python replay.py DATABASE RECORDING [RECORDING ...] [--copy FILE] [--sessions N] "
+             "[--concurrency N] [--speedup X] [--ramp S] [--output FILE] [--sharded]")
+    args = argv[1:]
+    options = {"--copy": None, "--sessions": None, "--concurrency": str(REPLAY_CONCURRENCY), "--speedup": "1",
+               "--ramp": "0", "--output": None}
+    positional = []
+    sharded = False
+    while args:
+        arg = args.pop(0)
+        if arg == "--sharded":
+            sharded = True
+        elif arg in options and args:
+            options[arg] = args.pop(0)
+        else:
+            positional.append(arg)
+    if len(positional) < 2:
+        print(usage)
+        return 2
+    db_name = positional[0]
+    copy_name = options["--copy"] or os.path.splitext(db_name)[0] + ".replay.db"
+    if os.path.abspath(copy_name) == os.path.abspath(db_name):
+        print("The copy cannot be the database itself.")
+        return 2
+    if bool(shard_paths(db_name)) != sharded:
+        print(f"{db_name} has shards; run with --sharded." if not sharded
+              else f"{db_name} has no shards, create them with python shards.py {db_name} --split N")
+        return 2
+    sessions = load_sessions(positional[1:])
+    if not sessions:
+        print("No sessions recorded.")
+        return 1
+
+    started = time.perf_counter()
+    # the copy is a snapshot, with the cold database and shards of the database if it has any
+    pages = create_snapshot(db_name, copy_name)
+    print(f"Copied {db_name} to {copy_name}: {pages} pages in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    count = int(options["--sessions"]) if options["--sessions"] else None
+    report = replay_sessions(copy_name, sessions, count, int(options["--concurrency"]), float(options["--speedup"]),
+                             float(options["--ramp"]), sharded)
+    output = json.dumps(report, indent=2)
+    if options["--output"]:
+        with open(options["--output"], "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
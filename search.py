@@ -0,0 +1,270 @@
+import threading
+
+from cache import LRUCache
+
+SEARCH_LIMIT = 100
+USER_SEARCH_LIMIT = 100
+# Memory the tweet search cache may hold, in bytes, and seconds a result stays valid. Writes made through
+# the store invalidate results at once; the TTL bounds how long writes made elsewhere go unnoticed.
+SEARCH_CACHE_BYTES = 4 * 1024 * 1024
+SEARCH_CACHE_TTL = 30.0
+
+# FTS5's trigram tokenizer matches any substring of three or more characters, so it keeps
+# the substring semantics of the old `text LIKE '%kw%'` search. Shorter keywords cannot be
+# served by the index and still fall back to LIKE.
+MIN_INDEXED_LENGTH = 3
+
+# The full-text index over tweet text, kept in sync with tweets by triggers
+TWEETS_FTS_STATEMENTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tweets_fts
+       USING fts5(text, content='tweets', content_rowid='tid', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS tweets_fts_insert AFTER INSERT ON tweets BEGIN
+           INSERT INTO tweets_fts (rowid, text) VALUES (new.tid, new.text);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS tweets_fts_delete AFTER DELETE ON tweets BEGIN
+           INSERT INTO tweets_fts (tweets_fts, rowid, text) VALUES ('delete', old.tid, old.text);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS tweets_fts_update AFTER UPDATE OF tid, text ON tweets BEGIN
+           INSERT INTO tweets_fts (tweets_fts, rowid, text) VALUES ('delete', old.tid, old.text);
+           INSERT INTO tweets_fts (rowid, text) VALUES (new.tid, new.text);
+       END""",
+]
+
+
+def fts_phrase(keyword):
+    """
+    Quote a keyword as an FTS5 phrase so that operators and punctuation in it are taken literally.
+
+    Args:
+        keyword (str): The keyword to quote.
+
+    Returns:
+        str: The keyword as an FTS5 string literal.
+    """
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+def split_keywords(keywords):
+    """
+    Separate search keywords into text keywords and hashtag terms.
+
+    Args:
+        keywords (list): Keywords as entered by the user; those starting with # are hashtags.
+
+    Returns:
+        tuple: (text keywords, hashtag terms without the leading #).
+    """
+    text_terms = []
+    hashtag_terms = []
+    for keyword in keywords:
+        if keyword.startswith('#'):
+            hashtag_terms.append(keyword[1:])
+        else:
+            text_terms.append(keyword)
+    return text_terms, hashtag_terms
+
+
+def normalize_keywords(keywords):
+    """
+    Reduce search keywords to the form that decides their results, so equivalent searches share a cache entry.
+
+    Keywords are lower-cased, deduplicated and sorted, with the #terms apart from the text keywords. The same
+    tweets match, since text keywords match case-insensitively, hashtags are stored in lower case and a tweet
+    matches if it matches any keyword. A keyword given twice no longer counts twice in the bm25 ranking, and
+    keywords of one or two non-ASCII letters, which LIKE compares case-sensitively, are searched in lower case.
+
+    Args:
+        keywords (list): Keywords as entered by the user; those starting with # are hashtags.
+
+    Returns:
+        tuple: (text keywords, hashtag terms without the leading #), each a sorted tuple.
+    """
+    text_terms, hashtag_terms = split_keywords([keyword.lower() for keyword in keywords])
+    return tuple(sorted(set(text_terms))), tuple(sorted(set(hashtag_terms)))
+
+
+class SearchCache:
+    """
+    The tweet IDs found by recent tweet searches, by normalized keywords and limit.
+
+    Entries are kept in an LRUCache, bounded in bytes and by a TTL. Every tweet written bumps a write
+    generation that is part of the key, so results computed before the write are never returned again
+    and age out of the LRU; a new tweet can change any result, since it changes the bm25 statistics of
+    the whole index as well as the matches of its own words.
+
+    Args:
+        max_bytes (int, optional): Memory budget in bytes. Default is SEARCH_CACHE_BYTES.
+        ttl (float, optional): Seconds after which a result is searched again. Default is SEARCH_CACHE_TTL.
+    """
+
+    def __init__(self, max_bytes=SEARCH_CACHE_BYTES, ttl=SEARCH_CACHE_TTL):
+        self.entries = LRUCache(max_bytes, ttl)
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def key(self, keywords, limit):
+        """
+        Returns:
+            tuple: The cache key of a search at the current write generation. Read it before searching,
+            so that a result computed across a write is stored under the older generation.
+        """
+        return (self.generation,) + normalize_keywords(keywords) + (limit,)
+
+    def get(self, key):
+        """
+        Returns:
+            list: The tweet IDs stored for the key, best match first, or None.
+        """
+        return self.entries.get(key)
+
+    def put(self, key, tids):
+        """
+        Store the tweet IDs found for a key.
+        """
+        self.entries.put(key, tids)
+
+    def bump(self):
+        """
+        Start a new write generation, invalidating every result stored so far.
+        """
+        with self._lock:
+            self.generation += 1
+
+    def clear(self):
+        """
+        Drop every stored result; the counters are kept.
+        """
+        self.entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: The LRUCache counters of the entries, and the current generation.
+        """
+        stats = self.entries.stats()
+        stats["generation"] = self.generation
+        return stats
+
+
+def find_tweets(conn, keywords, limit=SEARCH_LIMIT, scored=False):
+    """
+    Find the best matching tweets for a set of keywords.
+
+    A tweet matches if its text contains any of the text keywords or it mentions any of the
+    #terms. Text matches are ranked by bm25 relevance, hashtag-only matches follow, and ties
+    are broken by the most recent date. With no keywords the most recent tweets are returned.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        keywords (list): Keywords to search for; those starting with # are matched against mentions.
+        limit (int, optional): Maximum number of tweets to return. Default is SEARCH_LIMIT.
+        scored (bool, optional): Add the score of each tweet to its row, lower first, for merging the
+            results of several databases. Default is False.
+
+    Returns:
+        list: Up to limit rows of (tid, writer, text, tdate, replyto), or (tid, writer, text, tdate, replyto,
+        score) when scored, best match first.
+    """
+    score = ", 0.0" if scored else ""
+    text_terms, hashtag_terms = split_keywords(keywords)
+    if not text_terms and not hashtag_terms:
+        return conn.execute(f'''
+            SELECT tid, writer, text, tdate, replyto{score}
+            FROM tweets
+            ORDER BY tdate DESC, tid DESC
+            LIMIT ?
+        ''', (limit,)).fetchall()
+
+    # each branch yields (tid, score); lower scores rank first, like the bm25 values in the FTS5 rank column
+    branches = []
+    values = []
+    indexed_terms = [term for term in text_terms if len(term) >= MIN_INDEXED_LENGTH]
+    short_terms = [term for term in text_terms if len(term) < MIN_INDEXED_LENGTH]
+    if indexed_terms:
+        branches.append("SELECT rowid AS tid, rank AS score FROM tweets_fts WHERE tweets_fts MATCH ?")
+        values.append(" OR ".join(fts_phrase(term) for term in indexed_terms))
+    if short_terms:
+        branches.append("SELECT tid, 0.0 AS score FROM tweets WHERE " + " OR ".join("text LIKE ?" for _ in short_terms))
+        values.extend(f"%{term}%" for term in short_terms)
+    if hashtag_terms:
+        branches.append("SELECT tid, 0.0 AS score FROM mentions WHERE term IN (" + ", ".join("?" for _ in hashtag_terms) + ")")
+        values.extend(hashtag_terms)
+
+    query = f'''
+        SELECT t.tid, t.writer, t.text, t.tdate, t.replyto{", hits.score" if scored else ""}
+        FROM (
+            SELECT tid, MIN(score) AS score
+            FROM ({" UNION ALL ".join(branches)})
+            GROUP BY tid
+            ) AS hits
+        JOIN tweets t ON t.tid = hits.tid
+        ORDER BY hits.score, t.tdate DESC, t.tid DESC
+        LIMIT ?
+    '''
+    return conn.execute(query, values + [limit]).fetchall()
+
+
+# Users whose name contains the keyword, shortest names first, then users whose city but not
+# name contains it, shortest cities first. The trigram index finds the candidates and LIKE keeps
+# exactly the rows, and the case-insensitivity, of the unindexed search.
+USER_SEARCH_QUERY = """
+    SELECT usr, name, city
+    FROM (
+        SELECT u.usr, u.name, u.city, 0 AS kind, LENGTH(u.name) AS length
+        FROM users_fts f
+        JOIN users u ON u.usr = f.rowid
+        WHERE users_fts MATCH :name_query AND u.name LIKE :pattern
+
+        UNION ALL
+
+        SELECT u.usr, u.name, u.city, 1, LENGTH(u.city)
+        FROM users_fts f
+        JOIN users u ON u.usr = f.rowid
+        WHERE users_fts MATCH :city_query AND u.city LIKE :pattern AND NOT COALESCE(u.name LIKE :pattern, 0)
+        )
+    ORDER BY kind, length, usr
+    LIMIT :limit OFFSET :offset
+"""
+
+# The same ranking without the index, for keywords the trigram index cannot serve
+_USER_SCAN_QUERY = """
+    SELECT usr, name, city
+    FROM users
+    WHERE name LIKE :pattern OR city LIKE :pattern
+    ORDER BY
+    CASE
+        WHEN name LIKE :pattern THEN 0
+        ELSE 1
+    END,
+    CASE
+        WHEN name LIKE :pattern THEN LENGTH(name)
+        ELSE LENGTH(city)
+    END,
+    usr
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def find_users(conn, keyword, limit=USER_SEARCH_LIMIT, offset=0):
+    """
+    Find users whose name or city contains a keyword.
+
+    Name matches come before city matches, then shorter names (or cities) first, then by user ID.
+    Keywords of at least MIN_INDEXED_LENGTH characters are looked up in the users_fts trigram index;
+    shorter ones, and those with the LIKE wildcards % or _, scan the users table as before.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        keyword (str): The text to look for.
+        limit (int, optional): Maximum number of users to return; -1 for all. Default is USER_SEARCH_LIMIT.
+        offset (int, optional): Number of users of the ranking to skip. Default is 0.
+
+    Returns:
+        list: Up to limit rows of (usr, name, city).
+    """
+    params = {"pattern": f"%{keyword}%", "limit": limit, "offset": offset}
+    if len(keyword) < MIN_INDEXED_LENGTH or "%" in keyword or "_" in keyword:
+        return conn.execute(_USER_SCAN_QUERY, params).fetchall()
+    params["name_query"] = "name : " + fts_phrase(keyword)
+    params["city_query"] = "city : " + fts_phrase(keyword)
+    return conn.execute(USER_SEARCH_QUERY, params).fetchall()
@@ -0,0 +1,612 @@
+import asyncio
+import contextvars
+import json
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from cache import LRUCache
+from dbconfig import CHECKPOINT_INTERVAL, checkpoint
+from lists import LIST_NAME_LENGTH
+from querystats import SLOW_QUERY_MS, QueryStats
+from search import SearchCache
+from shards import ShardedTwitterStore, connect_shard, shard_paths
+from store import ReadOnlyError, TwitterStore, connect, connect_cold_tier
+
+READ_CONNECTIONS = 4
+REQUEST_TIMEOUT = 5.0
+# Requests accepted at once, across readers and the writer; further requests get 503 right away
+MAX_PENDING = 256
+MAX_BODY_SIZE = 64 * 1024
+
+FEED_FIELDS = ("tid", "writer", "date", "text", "replyto", "kind")
+TWEET_FIELDS = ("tid", "writer", "text", "tdate", "replyto")
+TWEET_DETAIL_FIELDS = ("tid", "writer", "writer_name", "tdate", "text", "replyto", "reply_count", "retweet_count")
+TWEET_HEADER_FIELDS = ("tid", "writer", "writer_name", "tdate", "text", "replyto")
+HYDRATED_FIELDS = TWEET_DETAIL_FIELDS + ("hashtags", "parent")
+USER_FIELDS = ("usr", "name", "city")
+PROFILE_FIELDS = ("usr", "name", "city", "tweet_count", "following_count", "follower_count")
+TRENDING_FIELDS = ("term", "score", "mentions")
+THREAD_FIELDS = ("tid", "writer", "tdate", "text", "replyto", "depth")
+SUGGESTION_FIELDS = ("usr", "name", "city", "common")
+LIST_FIELDS = ("lname", "members")
+
+_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+            504: "Gateway Timeout"}
+
+
+class HTTPError(Exception):
+    """
+    An error that is sent back to the client with the given status.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class _Jobs:
+    """
+    The operations a request has submitted to a StorePool, so that they can be stopped when it times out.
+    """
+
+    def __init__(self):
+        self.futures = []
+        self.running = set()
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def start(self, store):
+        """
+        Note that an operation is starting on a store, on its worker thread.
+
+        Raises:
+            HTTPError: The request has timed out already; the operation must not run.
+        """
+        with self._lock:
+            if self.cancelled:
+                raise HTTPError(504, "request timed out")
+            self.running.add(store)
+
+    def finish(self, store):
+        with self._lock:
+            self.running.discard(store)
+
+    def cancel(self):
+        """
+        Stop the operations of the request: those still queued are dropped and the statements of those running
+        are interrupted, which rolls back their transaction.
+        """
+        with self._lock:
+            self.cancelled = True
+            for future in self.futures:
+                future.cancel()
+            for store in self.running:
+                store.interrupt()
+
+    def outstanding(self):
+        """
+        Returns:
+            list: The submitted operations that have not completed yet.
+        """
+        return [future for future in self.futures if not future.done()]
+
+
+# The operations of the request being handled, set by TwitterServer.respond
+_jobs = contextvars.ContextVar("jobs", default=None)
+
+
+def _records(fields, rows):
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def _hydrated_records(fields, rows, details):
+    """
+    Build the records of a page of tweets, each with the details of its tweet from TwitterStore.hydrate_tweets
+    under "tweet".
+    """
+    records = _records(fields, rows)
+    for record in records:
+        detail = details.get(record["tid"])
+        if detail is not None:
+            detail = dict(zip(HYDRATED_FIELDS, detail))
+            detail["hashtags"] = list(detail["hashtags"])
+            if detail["parent"] is not None:
+                detail["parent"] = dict(zip(TWEET_HEADER_FIELDS, detail["parent"]))
+        record["tweet"] = detail
+    return records
+
+
+def _int_param(params, name, default=None):
+    value = params.get(name, [None])[0]
+    if value is None or value == "":
+        if default is None:
+            raise HTTPError(400, f"missing parameter '{name}'")
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(400, f"parameter '{name}' must be an integer")
+
+
+def _feed_cursor_param(params):
+    cursor = params.get("cursor", [None])[0]
+    if not cursor:
+        return None
+    try:
+        cursor = json.loads(cursor)
+    except ValueError:
+        cursor = None
+    if not isinstance(cursor, list) or len(cursor) != 4:
+        raise HTTPError(400, "parameter 'cursor' must be the 'next' value of a previous page")
+    return tuple(cursor)
+
+
+def _next_feed_cursor(rows, page_size):
+    if len(rows) < page_size:
+        return None
+    tid, writer, date, text, replyto, kind = rows[-1]
+    return json.dumps([date, tid, writer, kind])
+
+
+def _int_field(body, name, required=True):
+    value = body.get(name)
+    if value is None and not required:
+        return None
+    if not isinstance(value, int):
+        raise HTTPError(400, f"field '{name}' must be an integer")
+    return value
+
+
+class StorePool:
+    """
+    Run store operations on worker threads: reads on a pool of read-only connections,
+    writes on a single read-write connection so they are serialized.
+
+    Args:
+        db_name (str): Path of the SQLite database file.
+        readers (int, optional): Number of read-only connections. Default is READ_CONNECTIONS.
+        stats (QueryStats, optional): Where every connection records its statements. Defaults to a new QueryStats.
+        cache (LRUCache, optional): The profile and tweet cache shared by every connection, so that the
+            writer's invalidations reach the readers. Defaults to a new LRUCache.
+        graph (FollowGraph, optional): The follow graph shared by every connection, so that the writer's
+            follows reach the readers. Defaults to loading it on the writer connection at startup.
+        read_only (bool, optional): Open every connection immutable, for serving a snapshot; writes fail
+            with ReadOnlyError. Default is False.
+        sharded (bool, optional): Keep tweets in the shards of the database, split with shards.py; every
+            worker thread has a ShardedTwitterStore with its own connection to each shard. Default is False.
+
+    The tweet search cache is shared too, so that a tweet composed on the writer invalidates it for every reader.
+    """
+
+    def __init__(self, db_name, readers=READ_CONNECTIONS, stats=None, cache=None, graph=None, read_only=False,
+                 sharded=False):
+        self.db_name = db_name
+        self.read_only = read_only
+        self.sharded = sharded
+        self.stats = stats if stats is not None else QueryStats()
+        self.cache = cache if cache is not None else LRUCache()
+        self.search_cache = SearchCache()
+        self.graph = graph
+        self._local = threading.local()
+        # the writer is opened first so that the schema is upgraded before any read-only connection exists
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer",
+                                          initializer=self._open, initargs=(False,))
+        # and it loads the graph before the readers are opened, so that they all share it
+        self.graph = self._writer.submit(self._call, TwitterStore.follow_graph, ()).result()
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="reader",
+                                           initializer=self._open, initargs=(True,))
+
+    def _open(self, read_only):
+        conn = connect(self.db_name, read_only=read_only, stats=self.stats, immutable=self.read_only)
+        if self.sharded:
+            shards = [connect_shard(path, read_only, self.stats, self.read_only) for path in shard_paths(self.db_name)]
+            self._local.store = ShardedTwitterStore(conn, shards, self.cache, self.graph, read_only or self.read_only,
+                                                    self.search_cache)
+            return
+        cold = connect_cold_tier(self.db_name, stats=self.stats, immutable=self.read_only)
+        self._local.store = TwitterStore(conn, self.cache, self.graph, read_only or self.read_only,
+                                         self.search_cache, cold)
+
+    def _call(self, operation, args, jobs=None):
+        store = self._local.store
+        if getattr(TwitterStore, getattr(operation, "__name__", ""), None) is operation:
+            # routes pass methods of TwitterStore; a ShardedTwitterStore runs its overrides of them
+            operation = getattr(type(store), operation.__name__)
+        if jobs is None:
+            return operation(store, *args)
+        jobs.start(store)
+        try:
+            return operation(store, *args)
+        finally:
+            jobs.finish(store)
+
+    def _submit(self, executor, operation, args):
+        # operations submitted while a request is handled are tracked, so that its timeout can stop them
+        jobs = _jobs.get()
+        future = executor.submit(self._call, operation, args, jobs)
+        if jobs is not None:
+            jobs.futures.append(future)
+        return asyncio.wrap_future(future)
+
+    def read(self, operation, *args):
+        """
+        Run operation(store, *args) on a read-only connection.
+
+        Returns:
+            asyncio.Future: The result of the operation.
+        """
+        return self._submit(self._readers, operation, args)
+
+    def write(self, operation, *args):
+        """
+        Run operation(store, *args) on the writer connection, after every write submitted before it.
+
+        Returns:
+            asyncio.Future: The result of the operation.
+        """
+        return self._submit(self._writer, operation, args)
+
+    def close(self):
+        """
+        Wait for the submitted operations and shut the worker threads down.
+        """
+        self._readers.shutdown()
+        self._writer.shutdown()
+
+
+class TwitterServer:
+    """
+    A JSON over HTTP front-end for the operations of the main menu.
+
+    GET  /feed?usr=U[&page_size=N][&cursor=C]    home feed page; "next" is the cursor of the following page
+    GET  /tweets/search?q=KEYWORDS[&limit=N]     tweet search, # keywords match hashtags
+    GET  /tweets/TID                             tweet details and counters
+    GET  /tweets/TID/thread[?page_size=N][&cursor=C][&depth=N]  ancestors and one page of replies
+    GET  /users/search?q=KEYWORD[&limit=N][&offset=N]  user search by name or city
+    GET  /users/USR                              profile and counters
+    GET  /users/USR/suggestions[?k=N]            who to follow: accounts followed by the user's followees
+    GET  /users/USR/mutuals                      users the user follows that follow them back
+    GET  /users/USR/overlap?with=USR             followers two users have in common
+    GET  /hashtags/trending[?k=N][&hourly=1][&window=N]  top hashtags of the last days or hours
+    GET  /lists?owner=USR                        the lists of a user and their member counts
+    GET  /lists/LNAME/members                    members of a list
+    GET  /lists/LNAME/timeline[?page_size=N][&cursor=C]  tweets and retweets of the members, like /feed
+    POST /tweets    {"usr", "text", "replyto"}   compose a tweet or a reply
+    POST /follows   {"flwer", "flwee"}           follow a user
+    POST /retweets  {"usr", "tid"}               retweet a tweet
+    POST /lists     {"owner", "lname"}           create a list
+    POST /lists/LNAME/members {"owner", "member"}  add a member to a list
+    DELETE /lists/LNAME/members/USR?owner=USR    remove a member from a list
+    GET  /stats[?reset=1]                        per-statement timings, slow queries and cache counters
+
+    With &hydrate=1, every tweet of /feed, /tweets/search and /lists/LNAME/timeline also has "tweet": its
+    writer's name, counters, hashtags and the tweet it replies to, read for the whole page at once.
+
+    Args:
+        pool (StorePool): The connections that requests run on.
+        timeout (float, optional): Seconds a request may take before it fails with 504. Default is REQUEST_TIMEOUT.
+        max_pending (int, optional): Requests in progress above which new ones fail with 503. Default is MAX_PENDING.
+    """
+
+    def __init__(self, pool, timeout=REQUEST_TIMEOUT, max_pending=MAX_PENDING):
+        self.pool = pool
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def _tweet_records(self, fields, rows, params):
+        """
+        Build the records of a page of tweets, hydrated if the request asks for it with hydrate=1.
+        """
+        if params.get("hydrate", ["0"])[0] != "1":
+            return _records(fields, rows)
+        details = await self.pool.read(TwitterStore.hydrate_tweets, [row[0] for row in rows])
+        return _hydrated_records(fields, rows, details)
+
+    async def dispatch(self, method, target, body):
+        """
+        Run the operation of a request.
+
+        Returns:
+            tuple: (status, JSON-serializable response).
+        """
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+        pool = self.pool
+
+        if method == "GET":
+            if parts == ["stats"]:
+                snapshot = pool.stats.snapshot()
+                snapshot["cache"] = pool.cache.stats()
+                snapshot["search_cache"] = pool.search_cache.stats()
+                if params.get("reset", ["0"])[0] == "1":
+                    pool.stats.reset()
+                return 200, snapshot
+            if parts == ["feed"]:
+                page_size = _int_param(params, "page_size", 5)
+                rows = await pool.read(TwitterStore.feed_page, _int_param(params, "usr"), page_size,
+                                       _feed_cursor_param(params))
+                return 200, {"tweets": await self._tweet_records(FEED_FIELDS, rows, params),
+                             "next": _next_feed_cursor(rows, page_size)}
+            if parts == ["lists"]:
+                rows = await pool.read(TwitterStore.user_lists, _int_param(params, "owner"))
+                return 200, {"lists": _records(LIST_FIELDS, rows)}
+            if len(parts) == 3 and parts[0] == "lists" and parts[2] == "members":
+                rows = await pool.read(TwitterStore.list_members, unquote(parts[1]))
+                return 200, {"users": _records(USER_FIELDS, rows)}
+            if len(parts) == 3 and parts[0] == "lists" and parts[2] == "timeline":
+                page_size = _int_param(params, "page_size", 5)
+                rows = await pool.read(TwitterStore.list_page, unquote(parts[1]), page_size,
+                                       _feed_cursor_param(params))
+                return 200, {"tweets": await self._tweet_records(FEED_FIELDS, rows, params),
+                             "next": _next_feed_cursor(rows, page_size)}
+            if parts == ["tweets", "search"]:
+                keywords = params.get("q", [""])[0].split()
+                rows = await pool.read(TwitterStore.search_tweets, keywords, _int_param(params, "limit", 100))
+                return 200, {"tweets": await self._tweet_records(TWEET_FIELDS, rows, params)}
+            if parts == ["hashtags", "trending"]:
+                window = _int_param(params, "window", 0) or None
+                rows = await pool.read(TwitterStore.trending_hashtags, _int_param(params, "k", 10),
+                                       params.get("hourly", ["0"])[0] == "1", window)
+                return 200, {"hashtags": _records(TRENDING_FIELDS, rows)}
+            if parts == ["users", "search"]:
+                rows = await pool.read(TwitterStore.search_users, params.get("q", [""])[0],
+                                       _int_param(params, "limit", 100), _int_param(params, "offset", 0))
+                return 200, {"users": _records(USER_FIELDS, rows)}
+            if len(parts) == 3 and parts[0] == "tweets" and parts[1].isdigit() and parts[2] == "thread":
+                tid = int(parts[1])
+                page_size = _int_param(params, "page_size", 20)
+                depth = _int_param(params, "depth", 50)
+                cursor = params.get("cursor", [None])[0]
+                ancestors = await pool.read(TwitterStore.thread_ancestors, tid, depth)
+                replies = await pool.read(TwitterStore.thread_replies, tid, page_size, cursor, depth)
+                next_cursor = replies[-1][6] if len(replies) == page_size else None
+                return 200, {"ancestors": _records(THREAD_FIELDS, ancestors),
+                             "replies": _records(THREAD_FIELDS, replies), "next": next_cursor}
+            if len(parts) == 3 and parts[0] == "users" and parts[1].isdigit():
+                usr = int(parts[1])
+                if parts[2] == "suggestions":
+                    rows = await pool.read(TwitterStore.who_to_follow, usr, _int_param(params, "k", 10))
+                    return 200, {"users": _records(SUGGESTION_FIELDS, rows)}
+                if parts[2] == "mutuals":
+                    rows = await pool.read(TwitterStore.mutual_follows, usr)
+                    return 200, {"users": _records(USER_FIELDS, rows)}
+                if parts[2] == "overlap":
+                    common, jaccard = await pool.read(TwitterStore.follower_overlap, usr,
+                                                      _int_param(params, "with"))
+                    return 200, {"common": common, "jaccard": round(jaccard, 4)}
+            if len(parts) == 2 and parts[0] in ("tweets", "users") and parts[1].isdigit():
+                if parts[0] == "tweets":
+                    row = await pool.read(TwitterStore.tweet_detail, int(parts[1]))
+                    fields = TWEET_DETAIL_FIELDS
+                else:
+                    row = await pool.read(TwitterStore.profile, int(parts[1]))
+                    fields = PROFILE_FIELDS
+                if row is None:
+                    raise HTTPError(404, f"{parts[0][:-1]} {parts[1]} not found")
+                return 200, dict(zip(fields, row))
+        elif method == "POST":
+            try:
+                body = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "body must be a JSON object")
+            if not isinstance(body, dict):
+                raise HTTPError(400, "body must be a JSON object")
+            if parts == ["tweets"]:
+                text = body.get("text")
+                if not isinstance(text, str):
+                    raise HTTPError(400, "field 'text' must be a string")
+                tid = await pool.write(TwitterStore.compose_tweet, _int_field(body, "usr"), text,
+                                       _int_field(body, "replyto", required=False))
+                return 201, {"tid": tid}
+            if parts == ["follows"]:
+                followed = await pool.write(TwitterStore.follow, _int_field(body, "flwer"), _int_field(body, "flwee"))
+                return 200, {"followed": followed}
+            if parts == ["retweets"]:
+                retweeted = await pool.write(TwitterStore.retweet, _int_field(body, "usr"), _int_field(body, "tid"))
+                return 200, {"retweeted": retweeted}
+            if parts == ["lists"]:
+                lname = body.get("lname")
+                if not isinstance(lname, str) or not 1 <= len(lname) <= LIST_NAME_LENGTH:
+                    raise HTTPError(400, f"field 'lname' must be a string of 1 to {LIST_NAME_LENGTH} characters")
+                created = await pool.write(TwitterStore.create_list, _int_field(body, "owner"), lname)
+                return (201 if created else 200), {"created": created}
+            if len(parts) == 3 and parts[0] == "lists" and parts[2] == "members":
+                added = await pool.write(TwitterStore.add_list_member, _int_field(body, "owner"), unquote(parts[1]),
+                                         _int_field(body, "member"))
+                return 200, {"added": added}
+        elif method == "DELETE":
+            if len(parts) == 4 and parts[0] == "lists" and parts[2] == "members" and parts[3].isdigit():
+                removed = await pool.write(TwitterStore.remove_list_member, _int_param(params, "owner"),
+                                           unquote(parts[1]), int(parts[3]))
+                return 200, {"removed": removed}
+        else:
+            raise HTTPError(405, f"method {method} not allowed")
+        raise HTTPError(404, f"no route for {method} {url.path}")
+
+    def _release(self, future=None):
+        self.pending -= 1
+
+    async def respond(self, method, target, body):
+        """
+        Run a request with backpressure and a timeout.
+
+        A request that times out has its queued operations dropped and its running statements interrupted.
+        It holds its pending slot until its operations have actually stopped, so that slow queries still
+        count against max_pending after the client has had its 504.
+
+        Returns:
+            tuple: (status, JSON-serializable response).
+        """
+        if self.pending >= self.max_pending:
+            return 503, {"error": "server is busy, retry later"}
+        self.pending += 1
+        jobs = _Jobs()
+        # the task wait_for runs dispatch in copies this context, so the pool sees the request's jobs
+        _jobs.set(jobs)
+        try:
+            return await asyncio.wait_for(self.dispatch(method, target, body), self.timeout)
+        except HTTPError as e:
+            return e.status, {"error": e.message}
+        except ReadOnlyError as e:
+            return 403, {"error": str(e)}
+        except sqlite3.IntegrityError as e:
+            # a user, tweet or list that does not exist, or a value the schema does not allow
+            if "FOREIGN KEY" in str(e):
+                return 404, {"error": "a user or tweet referred to does not exist"}
+            return 400, {"error": str(e)}
+        except asyncio.TimeoutError:
+            jobs.cancel()
+            return 504, {"error": f"request took longer than {self.timeout} seconds"}
+        except Exception as e:
+            return 500, {"error": str(e)}
+        finally:
+            _jobs.set(None)
+            outstanding = jobs.outstanding()
+            if outstanding:
+                asyncio.gather(*(asyncio.wrap_future(future) for future in outstanding),
+                               return_exceptions=True).add_done_callback(self._release)
+            else:
+                self._release()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serve the HTTP/1.1 requests of one client connection, keeping it alive between requests.
+        """
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.timeout * 2)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0) or 0)
+                if length > MAX_BODY_SIZE:
+                    status, response = 413, {"error": "request body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, response = await self.respond(method.upper(), target, body)
+                    keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+                payload = json.dumps(response).encode("utf-8")
+                head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(payload)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n")
+                if status == 503:
+                    head += "Retry-After: 1\r\n"
+                writer.write(head.encode("latin-1") + b"\r\n" + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _checkpoint(store):
+    # each shard has a WAL of its own
+    for conn in [store.conn] + (store.shards if isinstance(store, ShardedTwitterStore) else []):
+        checkpoint(conn)
+
+
+async def checkpoint_periodically(pool, interval=CHECKPOINT_INTERVAL):
+    """
+    Run a TRUNCATE checkpoint on the writer connection every interval seconds, in line with the writes,
+    so that the WAL cannot grow without bound while readers keep the automatic checkpoints from finishing.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await pool.write(_checkpoint)
+        except Exception as e:
+            print(f"Checkpoint failed: {e}")
+
+
+async def serve(db_name, host="127.0.0.1", port=8080, readers=READ_CONNECTIONS,
+                timeout=REQUEST_TIMEOUT, max_pending=MAX_PENDING, stats=None, read_only=False, sharded=False):
+    """
+    Serve the database over HTTP until cancelled. With read_only, a snapshot is served and writes fail with 403.
+    With sharded, tweets are read from and written to the shards of the database.
+    """
+    pool = StorePool(db_name, readers, stats, read_only=read_only, sharded=sharded)
+    app = TwitterServer(pool, timeout, max_pending)
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    # an immutable file has no WAL to checkpoint
+    checkpoints = None if read_only else asyncio.create_task(checkpoint_periodically(pool))
+    print(f"Serving {db_name}{' read-only' if read_only else ''} on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if checkpoints is not None:
+            checkpoints.cancel()
+        pool.close()
+
+
+def main(argv):
+    """
+    Start the HTTP server.
+
+    Usage: python server.py DATABASE [--host H] [--port P] [--readers N] [--timeout S] [--max-pending N]
+           [--slow-ms MS] [--slow-log FILE] [--read-only] [--sharded]
+    """
+    usage = ("Usage: python server.py DATABASE [--host H] [--port P] [--readers N] [--timeout S] [--max-pending N] "
+             "[--slow-ms MS] [--slow-log FILE] [--read-only] [--sharded]")
+    args = argv[1:]
+    options = {"--host": "127.0.0.1", "--port": "8080", "--readers": str(READ_CONNECTIONS),
+               "--timeout": str(REQUEST_TIMEOUT), "--max-pending": str(MAX_PENDING),
+               "--slow-ms": str(SLOW_QUERY_MS), "--slow-log": None}
+    positional = []
+    read_only = False
+    sharded = False
+    while args:
+        arg = args.pop(0)
+        if arg == "--read-only":
+            read_only = True
+        elif arg == "--sharded":
+            sharded = True
+        elif arg in options and args:
+            options[arg] = args.pop(0)
+        else:
+            positional.append(arg)
+    if len(positional) != 1:
+        print(usage)
+        return 2
+    if bool(shard_paths(positional[0])) != sharded:
+        # tweets written to the main file of a sharded database would not be seen by sharded readers
+        print(f"{positional[0]} has shards; run with --sharded." if not sharded
+              else f"{positional[0]} has no shards, create them with python shards.py {positional[0]} --split N")
+        return 2
+    stats = QueryStats(float(options["--slow-ms"]), options["--slow-log"])
+    try:
+        asyncio.run(serve(positional[0], options["--host"], int(options["--port"]), int(options["--readers"]),
+                          float(options["--timeout"]), int(options["--max-pending"]), stats, read_only, sharded))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,610 @@
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from operator import itemgetter
+
+from archive import TWEET_TABLE_STATEMENTS
+from counters import TWEET_COUNTER_STATEMENTS, user_counts
+from dbconfig import open_connection
+from feed import FEED_PAGE_SIZE, feed_cursor
+from hashtags import extract_hashtags
+from hydrate import query_hashtags, query_tweet_counts
+from ids import next_sharded_tweet_id
+from lists import (FIRST_MEMBER_RETWEETS_QUERY, FIRST_MEMBER_TWEETS_QUERY, LIST_PAGE_SIZE, NEXT_MEMBER_RETWEETS_QUERY,
+                   NEXT_MEMBER_TWEETS_QUERY, member_stream)
+from querystats import InstrumentedConnection
+from search import TWEETS_FTS_STATEMENTS, find_tweets
+from store import STATEMENT_CACHE_SIZE, TwitterStore, connect
+from threads import THREAD_MAX_DEPTH, THREAD_PAGE_SIZE
+from trending import SCHEMA_STATEMENTS as TRENDING_STATEMENTS, TRENDING_K, merged_trending_hashtags
+
+# Replies read per statement from each shard while walking a thread
+REPLY_BATCH_SIZE = 20
+
+# The tables of a shard: those of the main database that hold tweets, without the foreign keys, whose
+# parent rows (users, and the tweets replied to) may be in another file. Retweets are kept with the
+# tweet retweeted, so its retweet counter and the join of a retweet with its tweet stay in one shard.
+_SHARD_TABLES = TWEET_TABLE_STATEMENTS + [
+    """CREATE TABLE IF NOT EXISTS hashtags (
+           term  char(10),
+           primary key (term)
+       )""",
+    """CREATE TABLE IF NOT EXISTS id_sequences (
+           name     char(12),
+           last_id  int NOT NULL,
+           primary key (name)
+       )""",
+    "INSERT OR IGNORE INTO id_sequences (name, last_id) SELECT 'tweets', COALESCE(MAX(tid), 0) FROM tweets",
+]
+
+# The full-text index, the tweet, retweet and per-writer tweet counters and the hashtag rollups are kept
+# in each shard by the same triggers as in an unsharded database. A reply is counted in the shard of its
+# writer, so the reply count of a tweet is the sum over the shards.
+SHARD_SCHEMA_STATEMENTS = _SHARD_TABLES + TWEETS_FTS_STATEMENTS + TWEET_COUNTER_STATEMENTS + TRENDING_STATEMENTS
+
+# The replies to a tweet held by a shard, from a tid on, in the order they were written
+_SHARD_REPLIES_QUERY = """
+    SELECT tid, writer, tdate, text, replyto
+    FROM tweets
+    WHERE replyto = ? AND tid >= ?
+    ORDER BY tid
+    LIMIT ?
+"""
+
+
+def shard_of(writer, shard_count):
+    """
+    Pick the shard of a writer's tweets.
+
+    Returns:
+        int: A number from 0 to shard_count - 1, from a CRC-32 of the user ID, so that consecutive
+        user IDs are spread over the shards.
+    """
+    return zlib.crc32(int(writer).to_bytes(8, "big", signed=True)) % shard_count
+
+
+def shard_path(db_name, shard):
+    """
+    Returns:
+        str: The path of a shard of a database, e.g. SQLdata.shard0.db for shard 0 of SQLdata.db.
+    """
+    root, ext = os.path.splitext(db_name)
+    return f"{root}.shard{shard}{ext}"
+
+
+def shard_paths(db_name):
+    """
+    Returns:
+        list: The paths of the shard files of a database that exist, by shard number.
+    """
+    paths = []
+    while os.path.exists(shard_path(db_name, len(paths))):
+        paths.append(shard_path(db_name, len(paths)))
+    return paths
+
+
+def connect_shard(path, read_only=False, stats=None, immutable=False):
+    """
+    Open a connection to a shard, with the connection profile of dbconfig applied; see store.connect.
+
+    The connection may be used from any thread, one at a time, so that the shards can be queried in
+    parallel. A read-write connection also creates the tables of the shard if they are missing.
+
+    Returns:
+        sqlite3.Connection: A connection object to the shard.
+    """
+    options = {"cached_statements": STATEMENT_CACHE_SIZE, "check_same_thread": False}
+    if stats is not None:
+        options["factory"] = InstrumentedConnection
+    conn = open_connection(path, read_only or immutable, None, immutable, **options)
+    if stats is not None:
+        conn.stats = stats
+    if not (read_only or immutable):
+        with conn:
+            for statement in SHARD_SCHEMA_STATEMENTS:
+                conn.execute(statement)
+    return conn
+
+
+def split_shards(db_name, shard_count):
+    """
+    Copy the tweets, mentions and retweets of a database into new shard files, by the writer of each tweet.
+
+    The database itself is left as it is. Its tweets are no longer read or written by a
+    ShardedTwitterStore, which keeps everything else (users, follows, lists) in it.
+
+    Args:
+        db_name (str): Path of the SQLite database file.
+        shard_count (int): Number of shards to create.
+
+    Returns:
+        list: The number of tweets copied to each shard.
+    """
+    paths = [shard_path(db_name, shard) for shard in range(shard_count)]
+    existing = [path for path in paths + [shard_path(db_name, shard_count)] if os.path.exists(path)]
+    if existing:
+        raise FileExistsError(f"{existing[0]} already exists")
+    # upgrade the database first, for its tweet ID sequence
+    connect(db_name).close()
+    counts = []
+    for shard, path in enumerate(paths):
+        conn = connect_shard(path)
+        try:
+            conn.create_function("shard_of", 2, shard_of, deterministic=True)
+            conn.execute("ATTACH DATABASE ? AS source", (db_name,))
+            with conn:
+                conn.execute("""
+                    INSERT INTO tweets (tid, writer, tdate, text, replyto)
+                    SELECT tid, writer, tdate, text, replyto FROM source.tweets
+                    WHERE shard_of(writer, ?) = ?
+                    ORDER BY tid
+                """, (shard_count, shard))
+                conn.execute("""
+                    INSERT INTO mentions (tid, term)
+                    SELECT m.tid, m.term FROM source.mentions m JOIN main.tweets t ON t.tid = m.tid
+                    ORDER BY m.tid, m.term
+                """)
+                conn.execute("INSERT INTO hashtags (term) SELECT DISTINCT term FROM mentions")
+                conn.execute("""
+                    INSERT INTO retweets (usr, tid, rdate)
+                    SELECT r.usr, r.tid, r.rdate FROM source.retweets r JOIN main.tweets t ON t.tid = r.tid
+                    ORDER BY r.usr, r.tid
+                """)
+                # new IDs start above every ID of the source, whichever shard allocates them
+                conn.execute("""
+                    UPDATE main.id_sequences
+                    SET last_id = MAX(last_id, (SELECT last_id FROM source.id_sequences WHERE name = 'tweets'))
+                    WHERE name = 'tweets'
+                """)
+            counts.append(conn.execute("SELECT COUNT(*) FROM tweets").fetchone()[0])
+            conn.execute("DETACH DATABASE source")
+        finally:
+            conn.close()
+    return counts
+
+
+class ShardedTwitterStore(TwitterStore):
+    """
+    A TwitterStore whose tweets, mentions and retweets are spread over several SQLite files.
+
+    The tweets of a user, with their mentions, are in the shard picked by shard_of, and retweets are with
+    the tweet retweeted. Users, follows and lists stay in the main database. Composing a tweet and
+    retweeting write to one shard only, in its own transaction, so writers to different shards never wait
+    for each other's lock and each file has its own WAL.
+
+    Feeds, tweet searches and tweet lookups send a query to every shard at once, on a thread per shard,
+    and merge the results: feed pages with a streaming merge on (date, tid, writer, kind), searches on
+    their score then date. Followees' tweets are read from the shards when a feed is read, rather than
+    from timelines filled on write, since a timeline insert per follower would write to the main database.
+
+    Open it with ShardedTwitterStore.open, on a database split with split_shards. Connections, like those
+    of a TwitterStore, are for one thread at a time.
+
+    Args:
+        conn (sqlite3.Connection): A connection to the main database, as returned by store.connect().
+        shards (list): Connections to the shards, by shard number, as returned by connect_shard().
+        cache, graph, read_only, search_cache: As for TwitterStore.
+    """
+
+    def __init__(self, conn, shards, cache=None, graph=None, read_only=False, search_cache=None):
+        super().__init__(conn, cache, graph, read_only, search_cache)
+        self.shards = shards
+        self._executor = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="shard")
+
+    @classmethod
+    def open(cls, db_name, stats=None, read_only=False):
+        """
+        Connect to a database and every shard of it.
+
+        Args:
+            db_name (str): Path of the main SQLite database file.
+            stats (QueryStats, optional): Record the statements of every connection in it.
+            read_only (bool, optional): Open every file immutable and refuse writes, as for snapshots.
+                Default is False.
+
+        Returns:
+            ShardedTwitterStore: The store, with a connection to each file.
+        """
+        paths = shard_paths(db_name)
+        if not paths:
+            raise FileNotFoundError(f"{db_name} has no shards, create them with python shards.py {db_name} --split N")
+        conn = connect(db_name, stats=stats, immutable=read_only)
+        shards = [connect_shard(path, stats=stats, immutable=read_only) for path in paths]
+        return cls(conn, shards, read_only=read_only)
+
+    def close(self):
+        """
+        Close the connections to the main database and to every shard.
+        """
+        self._executor.shutdown()
+        for shard in self.shards:
+            shard.close()
+        super().close()
+
+    def interrupt(self):
+        """
+        Interrupt the statements running on the connections to the main database and to every shard.
+        """
+        super().interrupt()
+        for shard in self.shards:
+            shard.interrupt()
+
+    def _scatter(self, function):
+        """
+        Call a function with the connection of every shard, in parallel.
+
+        Returns:
+            list: The results, by shard number.
+        """
+        return list(self._executor.map(function, self.shards))
+
+    def _shard_number(self, usr):
+        return shard_of(usr, len(self.shards))
+
+    def _writer_conn(self, usr):
+        return self.shards[self._shard_number(usr)]
+
+    # Users
+
+    def user_counts(self, usr):
+        """
+        Returns:
+            tuple: (tweet_count, following_count, follower_count) of the user; the tweet count is kept
+            in the user's shard, the others in the main database.
+        """
+        def load():
+            row = self._writer_conn(usr).execute("SELECT tweet_count FROM user_stats WHERE usr = ?", (usr,)).fetchone()
+            return (row[0] if row else 0,) + tuple(user_counts(self.conn, usr))[1:]
+
+        return self.cache.get_or_load(("user_counts", usr), load)
+
+    # Follows
+
+    def follow(self, flwer, flwee):
+        """
+        Make flwer follow flwee, starting today. There are no timelines to backfill.
+
+        Returns:
+            bool: True if the follow was added, False if flwer already followed flwee.
+        """
+        self._check_writable()
+        if self.is_following(flwer, flwee):
+            return False
+        with self.conn:
+            self.conn.execute("INSERT INTO follows(flwer, flwee, start_date) VALUES (?, ?, DATE('now'))", (flwer, flwee))
+        self.cache.invalidate(("user_counts", flwer), ("user_counts", flwee))
+        if self.graph is not None:
+            self.graph.add_follow(flwer, flwee)
+        return True
+
+    # Lists
+
+    def _shard_streams(self, number, members, cursor, batch_size):
+        """
+        Returns:
+            list: The streams of a shard for some users, below a cursor; see lists.member_stream. The shard
+            holds the tweets of the users whose shard it is, and the retweets of every user of the tweets it holds.
+        """
+        shard = self.shards[number]
+        streams = [member_stream(shard, (FIRST_MEMBER_TWEETS_QUERY, NEXT_MEMBER_TWEETS_QUERY), member, cursor,
+                                 batch_size) for member in members if self._shard_number(member) == number]
+        streams.extend(member_stream(shard, (FIRST_MEMBER_RETWEETS_QUERY, NEXT_MEMBER_RETWEETS_QUERY), member, cursor,
+                                     batch_size) for member in members)
+        return streams
+
+    def _list_timeline(self, lname, cursor, batch_size):
+        """
+        Lazily merge the tweets and retweets of a list's members from the shards; see lists.iter_list_timeline.
+        """
+        members = [row[0] for row in self.conn.execute("SELECT member FROM includes WHERE lname = ?", (lname,))]
+        streams = chain.from_iterable(self._shard_streams(number, members, cursor, batch_size)
+                                      for number in range(len(self.shards)))
+        return heapq.merge(*streams, key=feed_cursor, reverse=True)
+
+    def list_page(self, lname, page_size=LIST_PAGE_SIZE, cursor=None):
+        """
+        Returns:
+            list: Up to page_size rows of (tid, writer, date, text, replyto, kind), newest first, like feed rows.
+        """
+        return list(islice(self._list_timeline(lname, cursor, page_size), page_size))
+
+    def list_pages(self, lname, page_size=LIST_PAGE_SIZE):
+        """
+        Lazily iterate over the pages of a list timeline, from a single merge.
+        """
+        rows = self._list_timeline(lname, None, page_size)
+        while True:
+            page = list(islice(rows, page_size))
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+
+    # Tweets
+
+    def feed_page(self, usr, page_size=FEED_PAGE_SIZE, cursor=None):
+        """
+        Fetch one page of a user's home feed, the same rows as feed.get_feed_page.
+
+        Every shard, in parallel, merges one stream per followee read from an index in feed order, as list
+        timelines do, and returns its own first page below the cursor; the pages are merged, and the newest
+        page_size rows of the merge are the newest of all the shards.
+
+        Returns:
+            list: Up to page_size rows of (tid, writer, date, text, replyto, kind), newest first.
+        """
+        followees = [row[0] for row in self.conn.execute("SELECT flwee FROM follows WHERE flwer = ?", (usr,))]
+
+        def shard_page(number):
+            streams = self._shard_streams(number, followees, cursor, page_size)
+            return list(islice(heapq.merge(*streams, key=feed_cursor, reverse=True), page_size))
+
+        pages = self._executor.map(shard_page, range(len(self.shards)))
+        return list(islice(heapq.merge(*pages, key=feed_cursor, reverse=True), page_size))
+
+    def feed_pages(self, usr, page_size=FEED_PAGE_SIZE):
+        """
+        Lazily iterate over the pages of a user's home feed, one scatter-gather per page.
+        """
+        cursor = None
+        while True:
+            page = self.feed_page(usr, page_size, cursor)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            cursor = feed_cursor(page[-1])
+
+    def _find_tweets(self, keywords, limit):
+        """
+        Run a tweet search on every shard in parallel and keep the limit best matches.
+
+        Each shard ranks its own matches with bm25 over its own index. Tweets are spread over the shards by
+        writer, so the term statistics of every shard are close to those of the whole, and the scores are
+        merged as they are.
+
+        Returns:
+            list: Up to limit rows of (tid, writer, text, tdate, replyto), best match first.
+        """
+        rows = list(chain.from_iterable(self._scatter(lambda shard: find_tweets(shard, keywords, limit, scored=True))))
+        # the order of find_tweets, score then newest: sorts are stable, so the last key sorted on comes first
+        rows.sort(key=itemgetter(0), reverse=True)
+        rows.sort(key=itemgetter(3), reverse=True)
+        rows.sort(key=itemgetter(5))
+        return [row[:5] for row in rows[:limit]]
+
+    def trending_hashtags(self, k=TRENDING_K, hourly=False, window=None):
+        """
+        Find the hashtags trending over the last days, or hours, over the rollups of every shard.
+
+        Returns:
+            list: Up to k tuples of (term, score, mentions in the window), highest score first.
+        """
+        return merged_trending_hashtags(self.shards, k, hourly, window)
+
+    def tweet_counts(self, tid):
+        """
+        Returns:
+            tuple: (reply_count, retweet_count) of the tweet, summed over the shards.
+        """
+        def load():
+            rows = self._scatter(lambda shard: shard.execute(
+                "SELECT reply_count, retweet_count FROM tweet_stats WHERE tid = ?", (tid,)).fetchone())
+            rows = [row for row in rows if row is not None]
+            return (sum(row[0] for row in rows), sum(row[1] for row in rows))
+
+        return self.cache.get_or_load(("tweet_counts", tid), load)
+
+    def tweet_header(self, tid):
+        """
+        Fetch a tweet with its writer's name.
+
+        Returns:
+            tuple: (tid, writer, writer_name, tdate, text, replyto) or None if there is no such tweet.
+        """
+        return self.cache.get_or_load(("tweet", tid), lambda: next(iter(self._query_headers([tid])), None))
+
+    def _query_headers(self, tids):
+        """
+        Look many tweets up in every shard in parallel, and their writers' names in the main database.
+
+        Returns:
+            list: Rows of (tid, writer, writer_name, tdate, text, replyto) for the tweets that exist.
+        """
+        ids = json.dumps(tids)
+        rows = list(chain.from_iterable(self._scatter(lambda shard: shard.execute(
+            "SELECT tid, writer, tdate, text, replyto FROM tweets WHERE tid IN (SELECT value FROM json_each(?))",
+            (ids,)).fetchall())))
+        # the names of all the writers in one query
+        names = dict(self.conn.execute("SELECT usr, name FROM users WHERE usr IN (SELECT value FROM json_each(?))",
+                                       (json.dumps(list({row[1] for row in rows})),)))
+        return [(tid, writer, names.get(writer), tdate, text, replyto) for tid, writer, tdate, text, replyto in rows]
+
+    def _query_counts(self, tids):
+        """
+        Read the counters of many tweets from every shard in parallel, and sum them.
+
+        Returns:
+            dict: (reply_count, retweet_count) by tweet ID, for the tweets that have counters.
+        """
+        counts = {}
+        for found in self._scatter(lambda shard: query_tweet_counts(shard, tids)):
+            for tid, (reply_count, retweet_count) in found.items():
+                replies, retweets = counts.get(tid, (0, 0))
+                counts[tid] = (replies + reply_count, retweets + retweet_count)
+        return counts
+
+    def _query_hashtags(self, tids):
+        """
+        Read the hashtags of many tweets from every shard in parallel.
+
+        Returns:
+            dict: The list of terms by tweet ID, for the tweets that mention any.
+        """
+        hashtags = {}
+        for found in self._scatter(lambda shard: query_hashtags(shard, tids)):
+            hashtags.update(found)
+        return hashtags
+
+    def thread_ancestors(self, tid, max_depth=THREAD_MAX_DEPTH):
+        """
+        Fetch the tweets a tweet replies to, up to the start of its thread, one lookup per hop.
+
+        Returns:
+            list: Rows of (tid, writer, tdate, text, replyto, depth), the first tweet of the thread first,
+            as threads.thread_ancestors.
+        """
+        ancestors = []
+        header = self.tweet_header(tid)
+        while header is not None and header[5] is not None and len(ancestors) < max_depth:
+            header = self.tweet_header(header[5])
+            if header is not None:
+                ancestors.append(header)
+        return [(tid, writer, tdate, text, replyto, -depth)
+                for depth, (tid, writer, name, tdate, text, replyto) in reversed(list(enumerate(ancestors, 1)))]
+
+    def _replies(self, tid, start):
+        """
+        Lazily merge the replies to a tweet from every shard, from a tid on, in tid order.
+
+        Every shard returns up to REPLY_BATCH_SIZE replies per round; the merge is complete up to the
+        smallest last tid of the shards that filled their batch, and the next round starts after it.
+        """
+        while True:
+            batches = self._scatter(lambda shard: shard.execute(_SHARD_REPLIES_QUERY,
+                                                                (tid, start, REPLY_BATCH_SIZE)).fetchall())
+            full = [batch[-1][0] for batch in batches if len(batch) == REPLY_BATCH_SIZE]
+            end = min(full) if full else None
+            for row in heapq.merge(*batches):
+                if end is not None and row[0] > end:
+                    break
+                yield row
+            if end is None:
+                return
+            start = end + 1
+
+    def _walk_replies(self, tid, path, depth, after, max_depth):
+        """
+        Yield the replies below a tweet in thread order, with their depth and path, after a cursor.
+
+        As in threads.thread_replies, below the tweets on the path of the cursor only the replies from the
+        next tid of that path on are read.
+        """
+        if depth >= max_depth:
+            return
+        start = int(after[len(path) + 1:len(path) + 21]) if after.startswith(path + "/") else 0
+        for row in self._replies(tid, start):
+            reply_path = f"{path}/{row[0]:020d}"
+            if reply_path > after:
+                yield row + (depth + 1, reply_path)
+            yield from self._walk_replies(row[0], reply_path, depth + 1, after, max_depth)
+
+    def thread_replies(self, tid, page_size=THREAD_PAGE_SIZE, cursor=None, max_depth=THREAD_MAX_DEPTH):
+        """
+        Fetch one page of the replies below a tweet, in thread order, walking the replies of every shard.
+
+        Returns:
+            list: Up to page_size rows of (tid, writer, tdate, text, replyto, depth, path), as
+            threads.thread_replies; the path of the last row is the cursor of the next page.
+        """
+        if self.tweet_header(tid) is None:
+            return []
+        return list(islice(self._walk_replies(tid, f"{tid:020d}", 0, cursor or "", max_depth), page_size))
+
+    def compose_tweet(self, usr, text, replyto=None):
+        """
+        Post a tweet, or a reply when replyto is given, with its hashtags, to the shard of the writer.
+
+        Returns:
+            int: The tweet ID of the new tweet.
+        """
+        self._check_writable()
+        # the checks of the foreign keys of tweets, which cannot span files
+        if self._user(usr) is None or (replyto is not None and self.tweet_header(replyto) is None):
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        shard = self._shard_number(usr)
+        conn = self.shards[shard]
+        with conn:
+            tid = next_sharded_tweet_id(conn, shard, len(self.shards))
+            conn.execute("INSERT INTO tweets(tid, writer, tdate, text, replyto) VALUES (?, ?, DATE('now'), ?, ?)",
+                         (tid, usr, text, replyto))
+            for term in extract_hashtags(text):
+                conn.execute("INSERT OR IGNORE INTO hashtags (term) VALUES (?)", (term,))
+                conn.execute("INSERT OR IGNORE INTO mentions (tid, term) VALUES (?, ?)", (tid, term))
+        self.cache.invalidate(("tweet", tid), ("user_counts", usr), ("tweet_counts", replyto))
+        self.search_cache.bump()
+        return tid
+
+    def has_retweeted(self, usr, tid):
+        """
+        Returns:
+            bool: Whether the user has already retweeted the tweet.
+        """
+        header = self.tweet_header(tid)
+        if header is None:
+            return False
+        return self._writer_conn(header[1]).execute(
+            "SELECT 1 FROM retweets WHERE usr = ? AND tid = ?", (usr, tid)).fetchone() is not None
+
+    def retweet(self, usr, tid):
+        """
+        Retweet a tweet today, in the shard of the tweet.
+
+        Returns:
+            bool: True if the retweet was added, False if the user had already retweeted it.
+        """
+        self._check_writable()
+        header = self.tweet_header(tid)
+        if header is None or self._user(usr) is None:
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        if self.has_retweeted(usr, tid):
+            return False
+        conn = self._writer_conn(header[1])
+        with conn:
+            conn.execute("INSERT INTO retweets (usr, tid, rdate) VALUES (?, ?, DATE('now', 'localtime'))", (usr, tid))
+        self.cache.invalidate(("tweet_counts", tid))
+        return True
+
+
+def main(argv):
+    """
+    Split a database into shards, or show how its tweets are spread over them.
+
+    Usage: python shards.py DATABASE [--split N]
+    """
+    if len(argv) == 4 and argv[2] == "--split":
+        started = time.perf_counter()
+        counts = split_shards(argv[1], int(argv[3]))
+        for shard, count in enumerate(counts):
+            print(f"{shard_path(argv[1], shard)}: {count} tweets")
+        print(f"Split into {len(counts)} shards in {time.perf_counter() - started:.1f}s. "
+              f"Run python main.py --sharded to use them.")
+        return 0
+    if len(argv) != 2:
+        print("Usage: python shards.py DATABASE [--split N]")
+        return 2
+    paths = shard_paths(argv[1])
+    if not paths:
+        print(f"{argv[1]} has no shards.")
+        return 1
+    for path in paths:
+        conn = connect_shard(path, read_only=True)
+        try:
+            tweets, retweets = conn.execute(
+                "SELECT (SELECT COUNT(*) FROM tweets), (SELECT COUNT(*) FROM retweets)").fetchone()
+        finally:
+            conn.close()
+        print(f"{path}: {tweets} tweets, {retweets} retweets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
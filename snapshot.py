@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import sys
+import time
+
+from archive import cold_path, is_cold_attached
+from shards import shard_path, shard_paths
+from store import connect
+
+
+def create_snapshot(db_name, snapshot_name):
+    """
+    Copy a database to a consistent, self-contained snapshot with the SQLite backup API.
+
+    The copy is made in a single step, within one read transaction, so it holds the database as it was when
+    the backup started; in WAL mode the writer keeps going meanwhile. The source is upgraded to the latest
+    schema first, since snapshots are opened immutable and cannot be upgraded later. The snapshot is switched
+    out of WAL mode, so that it is a single file, and moved into place only once complete: processes that
+    have the previous snapshot open keep reading it until they reopen the file.
+
+    The cold database of archived tweets, if there is one, is copied next to the snapshot (see
+    archive.cold_path) within the same read transaction, so that a thread being archived is in exactly
+    one of the copies. The shards of a sharded database are copied the same way, each next to the
+    snapshot where shard_paths() finds it, after the database. Cold and shard files of an earlier
+    snapshot that the database no longer has are removed.
+
+    Args:
+        db_name (str): Path of the live SQLite database file.
+        snapshot_name (str): Path of the snapshot file, replaced if it exists.
+
+    Returns:
+        int: Number of pages copied, cold database and shards included.
+    """
+    source = connect(db_name)
+    try:
+        copies = {"main": snapshot_name}
+        if is_cold_attached(source):
+            copies["cold"] = cold_path(snapshot_name)
+        elif os.path.exists(cold_path(snapshot_name)):
+            os.remove(cold_path(snapshot_name))
+        # reading a table of each file starts the read transaction of both before either is copied
+        source.execute("BEGIN")
+        for name in copies:
+            source.execute(f"SELECT COUNT(*) FROM {name}.sqlite_master").fetchone()
+        pages = sum(_backup(source, target_name, name) for name, target_name in copies.items())
+        source.rollback()
+    finally:
+        source.close()
+
+    paths = shard_paths(db_name)
+    for shard, path in enumerate(paths):
+        # a shard is copied as it is; its schema is that of shards.py, which connect() would not know
+        shard_conn = sqlite3.connect(path)
+        try:
+            pages += _backup(shard_conn, shard_path(snapshot_name, shard))
+        finally:
+            shard_conn.close()
+    for path in shard_paths(snapshot_name)[len(paths):]:
+        os.remove(path)
+    return pages
+
+
+def _backup(source, target_name, name="main"):
+    """
+    Back up a database of a connection to a single-file copy, moved into place once complete.
+
+    Returns:
+        int: Number of pages copied.
+    """
+    partial_name = target_name + ".tmp"
+    if os.path.exists(partial_name):
+        os.remove(partial_name)
+    target = sqlite3.connect(partial_name)
+    try:
+        source.backup(target, name=name)
+        target.execute("PRAGMA journal_mode = DELETE").fetchall()
+        pages = target.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        target.close()
+    os.replace(partial_name, target_name)
+    return pages
+
+
+def main(argv):
+    """
+    Snapshot a database, for read-only workloads to run against with python main.py --read-only.
+
+    Usage: python snapshot.py DATABASE SNAPSHOT
+    """
+    if len(argv) != 3:
+        print("Usage: python snapshot.py DATABASE SNAPSHOT")
+        return 2
+    started = time.perf_counter()
+    pages = create_snapshot(argv[1], argv[2])
+    print(f"Snapshot of {argv[1]} written to {argv[2]}: {pages} pages in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
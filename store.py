@@ -0,0 +1,742 @@
+import heapq
+import json
+from itertools import islice
+from operator import itemgetter
+
+from archive import attach_cold, backfill_cold_follow, cold_cutoff, connect_cold, restore_thread
+from cache import LRUCache
+from counters import tweet_counts, user_counts
+from dbconfig import open_connection
+from feed import FEED_PAGE_SIZE, backfill_follow, feed_cursor, get_feed_page, iter_feed_pages, push_retweet, push_tweet
+from graph import SUGGESTION_K, FollowGraph
+from hashtags import extract_hashtags
+from hydrate import hydrated_rows, query_hashtags, query_tweet_counts
+from ids import next_tweet_id, next_user_id
+from lists import (LIST_PAGE_SIZE, add_list_member, create_list, get_list_page, iter_list_pages, list_members,
+                   remove_list_member, user_lists)
+from migrations import migrate
+from querystats import InstrumentedConnection
+from search import SEARCH_LIMIT, USER_SEARCH_LIMIT, SearchCache, find_tweets, find_users, normalize_keywords
+from threads import THREAD_MAX_DEPTH, THREAD_PAGE_SIZE, thread_ancestors, thread_replies
+from trending import TRENDING_K, iso_day, trending_hashtags
+
+# Size of the per-connection prepared statement cache. It holds every fixed statement of the store
+# plus the search statements, whose text varies with the number of keywords of each kind.
+STATEMENT_CACHE_SIZE = 256
+
+# A tweet with its writer's name, by tweet ID, and for a JSON array of tweet IDs
+_TWEET_HEADER_QUERY = """
+    SELECT t.tid, t.writer, u.name, t.tdate, t.text, t.replyto
+    FROM tweets t
+    LEFT JOIN users u ON t.writer = u.usr
+    WHERE t.tid = ?
+"""
+# the IDs are passed as one JSON array, so the statement text is the same whatever their number
+_TWEET_HEADERS_QUERY = """
+    SELECT t.tid, t.writer, u.name, t.tdate, t.text, t.replyto
+    FROM tweets t
+    LEFT JOIN users u ON t.writer = u.usr
+    WHERE t.tid IN (SELECT value FROM json_each(?))
+"""
+
+
+def _connection_options(stats):
+    """
+    Returns:
+        dict: The sqlite3.connect arguments of the store's connections, instrumented if stats is given.
+    """
+    options = {"cached_statements": STATEMENT_CACHE_SIZE}
+    if stats is not None:
+        options["factory"] = InstrumentedConnection
+    return options
+
+
+def connect(db_name, read_only=False, profile=None, stats=None, immutable=False):
+    """
+    Open a connection to the database for a TwitterStore, with the connection profile of dbconfig applied.
+
+    A read-write connection also upgrades the schema. A read-only connection leaves the schema as it is,
+    so the database must already have been upgraded by a read-write connection. The cold database of
+    archived tweets, if there is one, is attached as the schema "cold"; see archive.py.
+
+    Args:
+        db_name (str): Path of the SQLite database file.
+        read_only (bool, optional): Open the file with mode=ro so no write is possible. Default is False.
+        profile (dict, optional): Pragma names and values. Defaults to dbconfig.CONNECTION_PROFILE, or to
+            dbconfig.SNAPSHOT_PROFILE when immutable.
+        stats (QueryStats, optional): Record the latency and rows of every statement of the connection
+            in it; see querystats. Default is no instrumentation.
+        immutable (bool, optional): Open a file that nothing writes to, such as a snapshot made with
+            snapshot.py, read-only and without locking; implies read_only. Default is False.
+
+    Returns:
+        sqlite3.Connection: A connection object to the SQLite database.
+    """
+    conn = open_connection(db_name, read_only or immutable, profile, immutable, **_connection_options(stats))
+    if stats is not None:
+        conn.stats = stats
+    if not (read_only or immutable):
+        migrate(conn)
+    attach_cold(conn, db_name, read_only or immutable, immutable)
+    return conn
+
+
+def connect_cold_tier(db_name, stats=None, immutable=False):
+    """
+    Open the read-only connection a TwitterStore reads archived tweets with; see archive.connect_cold.
+
+    Args:
+        db_name (str): Path of the main SQLite database file.
+        stats (QueryStats, optional): Record the statements of the connection in it. Default is none.
+        immutable (bool, optional): Open the files immutable, for snapshots. Default is False.
+
+    Returns:
+        sqlite3.Connection: A connection object to the cold database, or None if the database has none.
+    """
+    return connect_cold(db_name, stats, immutable, **_connection_options(stats))
+
+
+def _iter_pages(get_page, page_size):
+    """
+    Lazily yield pages of rows, from get_page(cursor) with the feed_cursor of the last row of the previous page.
+    """
+    cursor = None
+    while True:
+        page = get_page(cursor)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        cursor = feed_cursor(page[-1])
+
+
+class ReadOnlyError(Exception):
+    """
+    A write was attempted on a store opened read-only. Nothing was written.
+    """
+
+
+class TwitterStore:
+    """
+    Every read and write of the application as plain methods that return rows.
+
+    None of the methods prompt or print, so the same operations can back the interactive menu,
+    batch jobs, benchmarks or a service.
+
+    User rows, user counters, tweet headers and tweet counters are read through a cache. The writes of
+    the store invalidate the entries they change; writes made by other processes, or directly with SQL,
+    show up once the entries expire.
+
+    Tweet searches are cached by normalized keywords in a SearchCache, which compose_tweet invalidates.
+
+    Who-to-follow, mutual follows and follower overlap are answered from an in-memory FollowGraph,
+    which follow() keeps up to date.
+
+    Once old threads have been archived (see archive.py), feeds, list timelines, a user's tweets and the
+    most recent tweets are read from the main database first, and from the cold database only when a
+    page reaches back past the archive cutoff; the two are then merged in order. Text searches fill up
+    with archived matches when the main database has too few, and tweet lookups and threads fall back
+    on the cold database for archived tweets. Replying to or retweeting an archived tweet moves its
+    thread back to the main database first.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database, as returned by connect().
+        cache (LRUCache, optional): The cache, which stores on the same database may share.
+            Defaults to a new LRUCache with the default budget and TTL.
+        graph (FollowGraph, optional): The follow graph, which stores on the same database may share.
+            Defaults to loading one from the database the first time it is needed.
+        read_only (bool, optional): Refuse every write with ReadOnlyError, as for a connection opened
+            read-only. Default is False.
+        search_cache (SearchCache, optional): The tweet search cache, which stores on the same database
+            may share. Defaults to a new SearchCache with the default budget and TTL.
+        cold (sqlite3.Connection, optional): A connection to the cold database, as returned by
+            connect_cold_tier(), for a database with archived tweets. Default is None.
+    """
+
+    def __init__(self, conn, cache=None, graph=None, read_only=False, search_cache=None, cold=None):
+        self.conn = conn
+        self.cache = cache if cache is not None else LRUCache()
+        self.graph = graph
+        self.read_only = read_only
+        self.search_cache = search_cache if search_cache is not None else SearchCache()
+        self.cold = cold
+
+    def close(self):
+        """
+        Close the underlying connections.
+        """
+        self.conn.close()
+        if self.cold is not None:
+            self.cold.close()
+
+    def interrupt(self):
+        """
+        Interrupt the statements running on the underlying connections; it may be called from any thread.
+        An interrupted statement fails with sqlite3.OperationalError and its transaction is rolled back.
+        """
+        self.conn.interrupt()
+        if self.cold is not None:
+            self.cold.interrupt()
+
+    def _with_cold(self, rows, limit, key, cold_rows):
+        """
+        Complete rows read from the main database, newest first, with those of the cold database.
+
+        Every archived row is dated before the archive cutoff, so the cold database is only read when
+        the rows fall short of limit or reach back past the cutoff, comparing the day of the last row.
+
+        Args:
+            rows (list): Up to limit rows from the main database, in descending order of key.
+            limit (int): The number of rows wanted; -1 for all of them.
+            key (callable): The sort key of a row, a tuple whose first item is its date.
+            cold_rows (callable): Returns the same query's rows from the cold database.
+
+        Returns:
+            list: Up to limit rows from both databases, in descending order of key.
+        """
+        if (self.cold is None
+                or rows and 0 <= limit <= len(rows) and iso_day(key(rows[-1])[0]) >= cold_cutoff(self.cold)):
+            return rows
+        merged = heapq.merge(rows, cold_rows(), key=key, reverse=True)
+        return list(merged if limit < 0 else islice(merged, limit))
+
+    def _tier_conn(self, tid):
+        """
+        Returns:
+            sqlite3.Connection: The connection to the database holding a tweet, the main one if it is in neither.
+        """
+        if self.cold is None or self.conn.execute("SELECT 1 FROM tweets WHERE tid = ?", (tid,)).fetchone():
+            return self.conn
+        if self.cold.execute("SELECT 1 FROM tweets WHERE tid = ?", (tid,)).fetchone():
+            return self.cold
+        return self.conn
+
+    def _restore(self, tid):
+        """
+        Move the thread of a tweet back from the cold database before a reply or retweet refers to it.
+        Called outside any transaction, since the move commits in two steps; see archive.restore_thread.
+        """
+        if self.cold is not None:
+            restore_thread(self.conn, tid)
+
+    def _check_writable(self):
+        """
+        Raise ReadOnlyError if the store is read-only, before a write touches the database.
+        """
+        if self.read_only:
+            raise ReadOnlyError("the database is open read-only")
+
+    # Users
+
+    def get_credentials(self, usr):
+        """
+        Look up the stored password of a user.
+
+        Args:
+            usr (int): The user ID.
+
+        Returns:
+            tuple: (usr, pwd) or None if there is no such user.
+        """
+        return self.conn.execute("SELECT usr, pwd FROM users WHERE usr = ?", (usr,)).fetchone()
+
+    def signup(self, name, pwd, email, city, timezone):
+        """
+        Create a new user.
+
+        Returns:
+            int: The user ID of the new user.
+        """
+        self._check_writable()
+        with self.conn:
+            # allocate a new unique user id, atomically with the insert below
+            usr = next_user_id(self.conn)
+            self.conn.execute(
+                "INSERT INTO users (usr, pwd, name, email, city, timezone) VALUES (:usr, :pwd, :name, :email, :city, :timezone)",
+                {"usr": usr, "pwd": pwd, "name": name, "email": email, "city": city, "timezone": timezone})
+        # lookups of the ID before it existed are cached as missing
+        self.cache.invalidate(("user", usr), ("user_counts", usr))
+        return usr
+
+    def _user(self, usr):
+        """
+        Returns:
+            tuple: (usr, name, city), or None if there is no such user.
+        """
+        return self.cache.get_or_load(("user", usr), lambda: self.conn.execute(
+            "SELECT usr, name, city FROM users WHERE usr = ?", (usr,)).fetchone())
+
+    def user_name(self, usr):
+        """
+        Returns:
+            str: The name of the user, or None if there is no such user.
+        """
+        row = self._user(usr)
+        return row[1] if row else None
+
+    def profile(self, usr):
+        """
+        Fetch a user together with their counters.
+
+        Returns:
+            tuple: (usr, name, city, tweet_count, following_count, follower_count) or None if there is no such user.
+        """
+        row = self._user(usr)
+        if row is None:
+            return None
+        return row + self.user_counts(usr)
+
+    def user_counts(self, usr):
+        """
+        Returns:
+            tuple: (tweet_count, following_count, follower_count) of the user.
+        """
+        return self.cache.get_or_load(("user_counts", usr), lambda: tuple(user_counts(self.conn, usr)))
+
+    def search_users(self, keyword, limit=USER_SEARCH_LIMIT, offset=0):
+        """
+        Find users whose name or city contains a keyword; see search.find_users.
+
+        Name matches come before city matches, then shorter names (or cities) first, then by user ID.
+
+        Returns:
+            list: Up to limit rows of (usr, name, city).
+        """
+        return find_users(self.conn, keyword, limit, offset)
+
+    def user_tweets(self, usr, limit=-1, originals_only=False):
+        """
+        Fetch the tweets written by a user, most recent first.
+
+        Args:
+            usr (int): The user ID.
+            limit (int, optional): Maximum number of tweets; -1 for all of them.
+            originals_only (bool, optional): Leave out replies. Default is False.
+
+        Returns:
+            list: Rows of (text, tdate).
+        """
+        replies = "AND replyto IS NULL" if originals_only else ""
+        query = f"SELECT text, tdate FROM tweets WHERE writer = ? {replies} ORDER BY tdate DESC LIMIT ?"
+        rows = self._writer_conn(usr).execute(query, (usr, limit)).fetchall()
+        return self._with_cold(rows, limit, lambda row: (row[1],), lambda: self.cold.execute(query, (usr, limit)))
+
+    def _writer_conn(self, usr):
+        """
+        Returns:
+            sqlite3.Connection: The connection to the database holding the tweets of a user.
+        """
+        return self.conn
+
+    # Follows
+
+    def is_following(self, flwer, flwee):
+        """
+        Returns:
+            bool: Whether flwer follows flwee.
+        """
+        return self.conn.execute("SELECT 1 FROM follows WHERE flwer = ? AND flwee = ?", (flwer, flwee)).fetchone() is not None
+
+    def follow(self, flwer, flwee):
+        """
+        Make flwer follow flwee, starting today.
+
+        Returns:
+            bool: True if the follow was added, False if flwer already followed flwee.
+        """
+        self._check_writable()
+        if self.is_following(flwer, flwee):
+            return False
+        with self.conn:
+            self.conn.execute("INSERT INTO follows(flwer, flwee, start_date) VALUES (?, ?, DATE('now'))", (flwer, flwee))
+            # their existing tweets now belong in the follower's timeline
+            backfill_follow(self.conn, flwer, flwee)
+            if self.cold is not None:
+                backfill_cold_follow(self.conn, flwer, flwee)
+        self.cache.invalidate(("user_counts", flwer), ("user_counts", flwee))
+        if self.graph is not None:
+            self.graph.add_follow(flwer, flwee)
+        return True
+
+    def followers(self, usr):
+        """
+        Returns:
+            list: Rows of (flwer, name) for every follower of the user.
+        """
+        return self.conn.execute(
+            "SELECT flwer, name FROM follows JOIN users ON follows.flwer = users.usr WHERE flwee = ?", (usr,)).fetchall()
+
+    def follow_graph(self):
+        """
+        Returns:
+            FollowGraph: The follow graph, loaded from the database on first use.
+        """
+        if self.graph is None:
+            self.graph = FollowGraph.load(self.conn)
+        return self.graph
+
+    def who_to_follow(self, usr, k=SUGGESTION_K):
+        """
+        Suggest accounts followed by the accounts the user follows; see graph.FollowGraph.who_to_follow.
+
+        Returns:
+            list: Up to k rows of (usr, name, city, common), where common is the number of the user's
+            followees that follow the suggestion, best suggestion first.
+        """
+        rows = []
+        for suggestion, common in self.follow_graph().who_to_follow(usr, k):
+            user = self._user(suggestion)
+            if user is not None:
+                rows.append(user + (common,))
+        return rows
+
+    def mutual_follows(self, usr):
+        """
+        Returns:
+            list: Rows of (usr, name, city) for every user that the user follows and that follows them back.
+        """
+        users = (self._user(other) for other in self.follow_graph().mutual_follows(usr))
+        return [user for user in users if user is not None]
+
+    def follower_overlap(self, usr, other):
+        """
+        Compare the followers of two users; see graph.FollowGraph.follower_overlap.
+
+        Returns:
+            tuple: (common, jaccard): the number of users following both, and the share of their
+            followers they have in common.
+        """
+        return self.follow_graph().follower_overlap(usr, other)
+
+    # Lists
+
+    def create_list(self, owner, lname):
+        """
+        Create an empty list; see lists.create_list.
+
+        Returns:
+            bool: True if the list was created, False if the name is taken.
+        """
+        self._check_writable()
+        return create_list(self.conn, owner, lname)
+
+    def add_list_member(self, owner, lname, member):
+        """
+        Returns:
+            bool: True if the user was added, False if they were already a member or the owner has no such list.
+        """
+        self._check_writable()
+        return add_list_member(self.conn, owner, lname, member)
+
+    def remove_list_member(self, owner, lname, member):
+        """
+        Returns:
+            bool: True if the user was removed, False if they were not a member or the owner has no such list.
+        """
+        self._check_writable()
+        return remove_list_member(self.conn, owner, lname, member)
+
+    def user_lists(self, owner):
+        """
+        Returns:
+            list: Rows of (lname, member_count) for every list of the owner, by name.
+        """
+        return user_lists(self.conn, owner)
+
+    def list_members(self, lname):
+        """
+        Returns:
+            list: Rows of (usr, name, city) for every member of the list.
+        """
+        return list_members(self.conn, lname)
+
+    def list_page(self, lname, page_size=LIST_PAGE_SIZE, cursor=None):
+        """
+        Fetch one page of the tweets and retweets of a list's members; see lists.get_list_page.
+
+        Returns:
+            list: Rows of (tid, writer, date, text, replyto, kind), newest first, like feed rows.
+        """
+        return self._with_cold(get_list_page(self.conn, lname, page_size, cursor), page_size, feed_cursor,
+                               lambda: get_list_page(self.cold, lname, page_size, cursor))
+
+    def list_pages(self, lname, page_size=LIST_PAGE_SIZE):
+        """
+        Lazily iterate over the pages of a list timeline; see lists.iter_list_pages.
+        """
+        if self.cold is None:
+            return iter_list_pages(self.conn, lname, page_size)
+        return _iter_pages(lambda cursor: self.list_page(lname, page_size, cursor), page_size)
+
+    # Tweets
+
+    def feed_page(self, usr, page_size=FEED_PAGE_SIZE, cursor=None):
+        """
+        Fetch one page of a user's home feed; see feed.get_feed_page.
+
+        Returns:
+            list: Rows of (tid, writer, date, text, replyto, kind), newest first.
+        """
+        return self._with_cold(get_feed_page(self.conn, usr, page_size, cursor), page_size, feed_cursor,
+                               lambda: get_feed_page(self.cold, usr, page_size, cursor))
+
+    def feed_pages(self, usr, page_size=FEED_PAGE_SIZE):
+        """
+        Lazily iterate over the pages of a user's home feed; see feed.iter_feed_pages.
+        """
+        if self.cold is None:
+            return iter_feed_pages(self.conn, usr, page_size)
+        return _iter_pages(lambda cursor: self.feed_page(usr, page_size, cursor), page_size)
+
+    def search_tweets(self, keywords, limit=SEARCH_LIMIT):
+        """
+        Find the best matching tweets for a set of keywords; see search.find_tweets.
+
+        The tweet IDs found are cached by normalized keywords; a repeated search only reads the tweets,
+        from the tweet cache where they are in it.
+
+        Returns:
+            list: Rows of (tid, writer, text, tdate, replyto), best match first.
+        """
+        key = self.search_cache.key(keywords, limit)
+        tids = self.search_cache.get(key)
+        if tids is None:
+            text_terms, hashtag_terms = normalize_keywords(keywords)
+            rows = self._find_tweets(list(text_terms) + ["#" + term for term in hashtag_terms], limit)
+            self.search_cache.put(key, [row[0] for row in rows])
+            return rows
+        headers = self.tweet_headers(tids)
+        return [(tid, writer, text, tdate, replyto)
+                for tid, writer, writer_name, tdate, text, replyto in (headers[tid] for tid in tids if tid in headers)]
+
+    def _find_tweets(self, keywords, limit):
+        """
+        Run a tweet search on the database; see search.find_tweets.
+
+        Returns:
+            list: Up to limit rows of (tid, writer, text, tdate, replyto), best match first.
+        """
+        rows = find_tweets(self.conn, keywords, limit)
+        if self.cold is None:
+            return rows
+        if not keywords:
+            return self._with_cold(rows, limit, itemgetter(3, 0), lambda: find_tweets(self.cold, keywords, limit))
+        # matches are ranked within each database, and those of the main database come first
+        if len(rows) < limit:
+            rows += find_tweets(self.cold, keywords, limit - len(rows))
+        return rows
+
+    def trending_hashtags(self, k=TRENDING_K, hourly=False, window=None):
+        """
+        Find the hashtags trending over the last days, or hours; see trending.trending_hashtags.
+
+        Returns:
+            list: Up to k tuples of (term, score, mentions in the window), highest score first.
+        """
+        return trending_hashtags(self.conn, k, hourly, window)
+
+    def tweet_counts(self, tid):
+        """
+        Returns:
+            tuple: (reply_count, retweet_count) of the tweet.
+        """
+        return self.cache.get_or_load(("tweet_counts", tid), lambda: tuple(tweet_counts(self.conn, tid)))
+
+    def tweet_counts_many(self, tids):
+        """
+        Fetch the counters of many tweets: those in the cache from it, the others in one query.
+
+        Returns:
+            dict: (reply_count, retweet_count) by tweet ID, for every tweet ID given.
+        """
+        counts = {}
+        missing = []
+        for tid in tids:
+            row = self.cache.get(("tweet_counts", tid))
+            if row is None:
+                missing.append(tid)
+            else:
+                counts[tid] = row
+        if missing:
+            found = self._query_counts(missing)
+            for tid in missing:
+                counts[tid] = found.get(tid, (0, 0))
+                self.cache.put(("tweet_counts", tid), counts[tid])
+        return counts
+
+    def _query_counts(self, tids):
+        """
+        Read the counters of many tweets from the database, bypassing the cache; see hydrate.query_tweet_counts.
+
+        Returns:
+            dict: (reply_count, retweet_count) by tweet ID, for the tweets that have counters.
+        """
+        return query_tweet_counts(self.conn, tids)
+
+    def _query_hashtags(self, tids):
+        """
+        Read the hashtags of many tweets from the database; see hydrate.query_hashtags.
+
+        Returns:
+            dict: The list of terms by tweet ID, for the tweets that mention any.
+        """
+        hashtags = query_hashtags(self.conn, tids)
+        if self.cold is not None:
+            hashtags.update(query_hashtags(self.cold, tids))
+        return hashtags
+
+    def hydrate_tweets(self, tids):
+        """
+        Fetch everything a page of tweets shows, for every tweet of the page at once.
+
+        Writer names, counters, hashtags and the tweets replied to are each read in one set-based query
+        for the whole page, or from the cache, rather than a few queries per tweet: a page costs at most
+        four queries whatever its size.
+
+        Args:
+            tids (list): The tweet IDs of the page.
+
+        Returns:
+            dict: (tid, writer, writer_name, tdate, text, replyto, reply_count, retweet_count, hashtags, parent)
+            by tweet ID, in the order of tids, for the tweets that exist; see hydrate.hydrated_rows.
+        """
+        tids = list(dict.fromkeys(tids))
+        headers = self.tweet_headers(tids)
+        parents = self.tweet_headers(list(dict.fromkeys(row[5] for row in headers.values() if row[5] is not None)))
+        found = [tid for tid in tids if tid in headers]
+        counts = self.tweet_counts_many(found)
+        hashtags = self._query_hashtags(found) if found else {}
+        return hydrated_rows(tids, headers, counts, hashtags, parents)
+
+    def tweet_header(self, tid):
+        """
+        Fetch a tweet with its writer's name.
+
+        Returns:
+            tuple: (tid, writer, writer_name, tdate, text, replyto) or None if there is no such tweet.
+        """
+        def load():
+            row = self.conn.execute(_TWEET_HEADER_QUERY, (tid,)).fetchone()
+            if row is None and self.cold is not None:
+                row = self.cold.execute(_TWEET_HEADER_QUERY, (tid,)).fetchone()
+            return row
+
+        return self.cache.get_or_load(("tweet", tid), load)
+
+    def tweet_headers(self, tids):
+        """
+        Fetch many tweets with their writers' names: those in the cache from it, the others in one query.
+
+        Returns:
+            dict: (tid, writer, writer_name, tdate, text, replyto) by tweet ID, for the tweets that exist.
+        """
+        headers = {}
+        missing = []
+        for tid in tids:
+            row = self.cache.get(("tweet", tid))
+            if row is None:
+                missing.append(tid)
+            else:
+                headers[tid] = row
+        if missing:
+            for row in self._query_headers(missing):
+                self.cache.put(("tweet", row[0]), row)
+                headers[row[0]] = row
+        return headers
+
+    def _query_headers(self, tids):
+        """
+        Read many tweets with their writers' names from the database, bypassing the cache.
+
+        Returns:
+            iterable: Rows of (tid, writer, writer_name, tdate, text, replyto) for the tweets that exist.
+        """
+        rows = self.conn.execute(_TWEET_HEADERS_QUERY, (json.dumps(tids),)).fetchall()
+        if self.cold is not None and len(rows) < len(tids):
+            found = {row[0] for row in rows}
+            rows += self.cold.execute(_TWEET_HEADERS_QUERY, (json.dumps([tid for tid in tids if tid not in found]),))
+        return rows
+
+    def tweet_detail(self, tid):
+        """
+        Fetch a tweet with its writer's name and its counters.
+
+        Returns:
+            tuple: (tid, writer, writer_name, tdate, text, replyto, reply_count, retweet_count)
+            or None if there is no such tweet.
+        """
+        row = self.tweet_header(tid)
+        if row is None:
+            return None
+        return row + self.tweet_counts(tid)
+
+    def thread_ancestors(self, tid, max_depth=THREAD_MAX_DEPTH):
+        """
+        Fetch the tweets a tweet replies to, up to the start of its thread; see threads.thread_ancestors.
+
+        Returns:
+            list: Rows of (tid, writer, tdate, text, replyto, depth), the first tweet of the thread first.
+        """
+        return thread_ancestors(self._tier_conn(tid), tid, max_depth)
+
+    def thread_replies(self, tid, page_size=THREAD_PAGE_SIZE, cursor=None, max_depth=THREAD_MAX_DEPTH):
+        """
+        Fetch one page of the replies below a tweet, in thread order; see threads.thread_replies.
+
+        Returns:
+            list: Rows of (tid, writer, tdate, text, replyto, depth, path); the last path is the next cursor.
+        """
+        return thread_replies(self._tier_conn(tid), tid, page_size, cursor, max_depth)
+
+    def compose_tweet(self, usr, text, replyto=None):
+        """
+        Post a tweet, or a reply when replyto is given, with its hashtags.
+
+        Returns:
+            int: The tweet ID of the new tweet.
+        """
+        self._check_writable()
+        if replyto is not None:
+            self._restore(replyto)
+        with self.conn:
+            # allocate a new time-ordered tid, atomically with the insert below so concurrent writers never share one
+            tid = next_tweet_id(self.conn)
+            self.conn.execute("INSERT INTO tweets(tid, writer, tdate, text, replyto) VALUES (?, ?, DATE('now'), ?, ?)",
+                              (tid, usr, text, replyto))
+            # insert each term unless it is already in the hashtags table, and always add it to the mentions table
+            for term in extract_hashtags(text):
+                self.conn.execute("INSERT OR IGNORE INTO hashtags (term) VALUES (?)", (term,))
+                self.conn.execute("INSERT OR IGNORE INTO mentions (tid, term) VALUES (?, ?)", (tid, term))
+            # add the tweet to the timelines of the writer's followers
+            push_tweet(self.conn, tid)
+        self.cache.invalidate(("tweet", tid), ("user_counts", usr), ("tweet_counts", replyto))
+        self.search_cache.bump()
+        return tid
+
+    def has_retweeted(self, usr, tid):
+        """
+        Returns:
+            bool: Whether the user has already retweeted the tweet.
+        """
+        query = "SELECT 1 FROM retweets WHERE usr = ? AND tid = ?"
+        return (self.conn.execute(query, (usr, tid)).fetchone() is not None
+                or self.cold is not None and self.cold.execute(query, (usr, tid)).fetchone() is not None)
+
+    def retweet(self, usr, tid):
+        """
+        Retweet a tweet today.
+
+        Returns:
+            bool: True if the retweet was added, False if the user had already retweeted it.
+        """
+        self._check_writable()
+        if self.has_retweeted(usr, tid):
+            return False
+        self._restore(tid)
+        with self.conn:
+            self.conn.execute("INSERT INTO retweets (usr, tid, rdate) VALUES (?, ?, DATE('now', 'localtime'))", (usr, tid))
+            # add the retweet to the timelines of the user's followers
+            push_retweet(self.conn, usr, tid)
+        self.cache.invalidate(("tweet_counts", tid))
+        return True
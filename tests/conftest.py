@@ -0,0 +1,31 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    A copy of SQLdata.db, upgraded to the latest schema when first connected to. Cold and shard files are
+    created next to it.
+    """
+    path = str(tmp_path / "SQLdata.db")
+    shutil.copyfile(os.path.join(ROOT, "SQLdata.db"), path)
+    return path
+
+
+@pytest.fixture
+def store(db):
+    """
+    A TwitterStore on the copy of SQLdata.db.
+    """
+    from store import TwitterStore, connect
+
+    store = TwitterStore(connect(db))
+    yield store
+    store.close()
@@ -0,0 +1,30 @@
+# Words searched for by the equivalence checks, matching tweets of SQLdata.db in every tier
+SEARCH_WORDS = ["tweet", "reply", "followee", "#dba", "tweet9"]
+
+
+def every_read(store, tids):
+    """
+    Read everything the menu shows for SQLdata.db: feeds and list timelines page by page, profiles,
+    searches, and the details and threads of the given tweets.
+
+    Search results are compared as sets, since each file ranks its own matches.
+
+    Returns:
+        dict: The rows of each read, by read.
+    """
+    users = [usr for usr, in store.conn.execute("SELECT usr FROM users ORDER BY usr")]
+    lnames = [lname for lname, in store.conn.execute("SELECT lname FROM lists ORDER BY lname")]
+    reads = {}
+    for usr in users:
+        reads["feed", usr] = [row for page in store.feed_pages(usr, 2) for row in page]
+        reads["user_tweets", usr] = store.user_tweets(usr)
+        reads["user_counts", usr] = store.user_counts(usr)
+    for lname in lnames:
+        reads["list", lname] = [row for page in store.list_pages(lname, 2) for row in page]
+    for word in SEARCH_WORDS:
+        reads["search", word] = sorted(store.search_tweets([word]))
+    for tid in tids:
+        reads["detail", tid] = store.tweet_detail(tid)
+        reads["ancestors", tid] = store.thread_ancestors(tid)
+        reads["replies", tid] = store.thread_replies(tid, 100)
+    return reads
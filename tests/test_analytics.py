@@ -0,0 +1,25 @@
+from analytics import PARTITION_QUERIES, run_analytics
+from archive import archive_tweets
+from store import connect
+
+# Before the replies and retweets of most threads of SQLdata.db, and after some of its oldest tweets,
+# which are dated DD-MON-YYYY
+CUTOFF = "2022-08-15"
+
+
+def _totals(db, **kwargs):
+    totals = run_analytics(db, **kwargs)
+    return {name: totals[name] for name in PARTITION_QUERIES}
+
+
+def test_partitions_do_not_change_totals(db):
+    connect(db).close()
+    assert _totals(db, workers=1, partitions=1) == _totals(db, workers=1, partitions=7)
+
+
+def test_totals_unchanged_by_archive(db):
+    connect(db).close()
+    before = _totals(db, workers=1)
+    assert archive_tweets(db, CUTOFF) > 0
+    assert _totals(db, workers=1) == before
+    assert _totals(db, workers=2, partitions=5) == before
@@ -0,0 +1,174 @@
+import shutil
+
+import archive
+from archive import archive_tweets, merge_tiers
+from counters import verify_counters
+from ingest import ingest_tweets
+from reads import every_read
+from store import TwitterStore, connect, connect_cold_tier
+from trending import REBUILD_STATEMENTS as TRENDING_REBUILD_STATEMENTS
+
+# As in test_analytics: most threads stay, and some tweets dated DD-MON-YYYY are archived
+CUTOFF = "2022-08-15"
+
+
+def _open(db):
+    return TwitterStore(connect(db), cold=connect_cold_tier(db))
+
+
+def _rollups(conn):
+    return [conn.execute(f"SELECT * FROM main.{table} WHERE count != 0 ORDER BY 1, 2").fetchall()
+            for table in ("hashtag_daily", "hashtag_hourly")]
+
+
+def _drift(db):
+    # the counters and rollups count archived rows too, so they are checked against both tiers, as
+    # counters.py does
+    conn = connect(db)
+    try:
+        merge_tiers(conn)
+        drift = verify_counters(conn)
+        kept = _rollups(conn)
+        for statement in TRENDING_REBUILD_STATEMENTS:
+            conn.execute(statement)
+        if _rollups(conn) != kept:
+            drift.append(("hashtag rollups", None))
+        conn.rollback()
+        return drift
+    finally:
+        conn.close()
+
+
+def _archived(store):
+    return {tid for tid, in store.cold.execute("SELECT tid FROM tweets")}
+
+
+def test_reads_unchanged_by_archive(db, tmp_path):
+    reference_db = str(tmp_path / "reference.db")
+    shutil.copyfile(db, reference_db)
+    reference = _open(reference_db)
+    tids = [tid for tid, in reference.conn.execute("SELECT tid FROM tweets")]
+    expected = every_read(reference, tids)
+    reference.close()
+
+    assert archive_tweets(db, CUTOFF) > 0
+    store = _open(db)
+    try:
+        assert _archived(store)
+        assert every_read(store, tids) == expected
+    finally:
+        store.close()
+
+
+def test_archive_moves_whole_inactive_threads(db):
+    archive_tweets(db, CUTOFF)
+    store = _open(db)
+    try:
+        conn = store.conn
+        assert not conn.execute("""
+            SELECT 1 FROM cold.tweets t
+            WHERE t.replyto IN (SELECT tid FROM main.tweets)
+               OR t.tid IN (SELECT replyto FROM main.tweets)
+               OR t.tid IN (SELECT tid FROM main.retweets)
+               OR t.tid IN (SELECT tid FROM main.mentions)
+        """).fetchall()
+        assert _drift(db) == []
+    finally:
+        store.close()
+
+
+def test_reply_and_retweet_restore_the_thread(db, tmp_path):
+    reference_db = str(tmp_path / "reference.db")
+    shutil.copyfile(db, reference_db)
+    archive_tweets(db, CUTOFF)
+    store = _open(db)
+    reference = _open(reference_db)
+    try:
+        archived = sorted(_archived(store))
+        replied, retweeted = archived[0], archived[-1]
+        reads = []
+        for s in (store, reference):
+            reply = s.compose_tweet(1, "a reply to an archived tweet", replyto=replied)
+            s.retweet(1, retweeted)
+            tids = [tid for tid, in reference.conn.execute("SELECT tid FROM tweets WHERE tid != ?", (reply,))]
+            # the replies were given IDs at different times
+            reads.append(repr(every_read(s, tids + [reply])).replace(str(reply), "reply"))
+        assert replied not in _archived(store) and retweeted not in _archived(store)
+        assert _drift(db) == []
+        assert reads[0] == reads[1]
+    finally:
+        store.close()
+        reference.close()
+
+
+def test_ingest_restores_the_threads_replied_to(db, tmp_path):
+    reference_db = str(tmp_path / "reference.db")
+    shutil.copyfile(db, reference_db)
+    archive_tweets(db, CUTOFF)
+    store = _open(db)
+    reference = _open(reference_db)
+    try:
+        replied = sorted(_archived(store))[0]
+        tweets = [{"writer": 1, "text": "ingested reply #archived", "replyto": replied},
+                  {"writer": 2, "text": "ingested tweet #archived"}]
+        reads = []
+        for s in (store, reference):
+            before = s.conn.execute("SELECT MAX(tid) FROM main.tweets").fetchone()[0]
+            ingest_tweets(s.conn, tweets)
+            new = [tid for tid, in s.conn.execute("SELECT tid FROM main.tweets WHERE tid > ? ORDER BY tid", (before,))]
+            s.cache.clear()
+            s.search_cache.bump()
+            tids = [tid for tid, in reference.conn.execute("SELECT tid FROM tweets WHERE tid <= ?", (before,))]
+            read = repr(every_read(s, tids + new))
+            for i, tid in enumerate(new):
+                read = read.replace(str(tid), f"new{i}")
+            reads.append(read)
+        assert replied not in _archived(store)
+        assert _drift(db) == []
+        assert reads[0] == reads[1]
+    finally:
+        store.close()
+        reference.close()
+
+
+def test_archive_interrupted_after_the_copy(db, monkeypatch):
+    # the batches reach the cold database, and the process stops before deleting them from the main one
+    monkeypatch.setattr(archive, "_ARCHIVE_DELETE_STATEMENTS", [])
+    archive_tweets(db, CUTOFF)
+    store = _open(db)
+    try:
+        copied = _archived(store)
+        assert copied and copied <= {tid for tid, in store.conn.execute("SELECT tid FROM main.tweets")}
+    finally:
+        store.close()
+
+    monkeypatch.undo()
+    archive_tweets(db, CUTOFF)
+    store = _open(db)
+    try:
+        assert _archived(store) == copied
+        assert not store.conn.execute("SELECT 1 FROM main.tweets WHERE tid IN (SELECT tid FROM cold.tweets)").fetchall()
+    finally:
+        store.close()
+    assert _drift(db) == []
+
+
+def test_restore_interrupted_after_the_copy(db, monkeypatch):
+    archive_tweets(db, CUTOFF)
+    store = _open(db)
+    try:
+        archived = _archived(store)
+        tid = sorted(archived)[0]
+        # the thread reaches the main database, and the process stops before deleting it from the cold one
+        monkeypatch.setattr(archive, "_RESTORE_DELETE_STATEMENTS", [])
+        archive.restore_thread(store.conn, tid)
+        assert _archived(store) == archived
+        assert store.conn.execute("SELECT 1 FROM main.tweets WHERE tid = ?", (tid,)).fetchone()
+
+        monkeypatch.undo()
+        restored = archive.restore_thread(store.conn, tid)
+        assert restored > 0 and len(_archived(store)) == len(archived) - restored
+        assert not store.conn.execute("SELECT 1 FROM main.tweets WHERE tid IN (SELECT tid FROM cold.tweets)").fetchall()
+    finally:
+        store.close()
+    assert _drift(db) == []
@@ -0,0 +1,56 @@
+from cache import ENTRY_OVERHEAD, LRUCache, estimate_size
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _entry_size(key, value):
+    return estimate_size(key) + estimate_size(value) + ENTRY_OVERHEAD
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_bytes=3 * _entry_size("a", 1))
+    for key in "abc":
+        cache.put(key, 1)
+    assert cache.get("a") == 1
+    cache.put("d", 1)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == [1, 1, 1]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_value_larger_than_the_budget_is_not_stored():
+    cache = LRUCache(max_bytes=_entry_size("a", 1))
+    cache.put("a", 1)
+    cache.put("big", tuple(range(100)))
+    assert cache.get("big") is None
+    assert cache.get("a") == 1
+
+
+def test_entries_expire_after_the_ttl():
+    clock = Clock()
+    cache = LRUCache(ttl=10, clock=clock)
+    cache.put("a", 1)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    loads = []
+    assert cache.get_or_load("a", lambda: loads.append(1) or 2) == 2
+    assert cache.get_or_load("a", lambda: loads.append(1) or 3) == 2
+    assert loads == [1]
+
+
+def test_writes_invalidate_cached_profiles(store):
+    before = store.profile(15)
+    assert store.profile(15) == before
+    store.compose_tweet(15, "cached")
+    assert store.cache.stats()["invalidations"] >= 1
+    assert store.profile(15) != before
@@ -0,0 +1,23 @@
+from counters import rebuild_counters, verify_counters
+
+
+def test_counters_match_after_migration(store):
+    assert verify_counters(store.conn) == []
+
+
+def test_triggers_keep_counters_in_step(store):
+    tid = store.compose_tweet(1, "counted #counters")
+    store.compose_tweet(2, "a reply", replyto=tid)
+    store.retweet(3, tid)
+    store.follow(4, 1)
+    assert store.tweet_counts(tid)[:2] == (1, 1)
+    assert verify_counters(store.conn) == []
+
+
+def test_drift_is_reported_and_rebuilt(store):
+    conn = store.conn
+    with conn:
+        conn.execute("UPDATE user_stats SET tweet_count = tweet_count + 1 WHERE usr = 1")
+    assert verify_counters(conn) == [("user_stats", 1)]
+    rebuild_counters(conn)
+    assert verify_counters(conn) == []
@@ -0,0 +1,76 @@
+from feed import backfill_follow, feed_cursor, get_feed_page
+
+USERS = range(1, 33)
+
+
+def _all_pages(store, usr, page_size):
+    return [row for page in store.feed_pages(usr, page_size) for row in page]
+
+
+def test_pages_continue_where_the_previous_one_ended(store):
+    for usr in USERS:
+        whole = store.feed_page(usr, 1000)
+        for page_size in (1, 2, 3):
+            assert _all_pages(store, usr, page_size) == whole
+
+
+def test_pages_are_in_descending_keyset_order(store):
+    for usr in USERS:
+        keys = [feed_cursor(row) for row in store.feed_page(usr, 1000)]
+        assert keys == sorted(keys, reverse=True)
+        assert len(set(keys)) == len(keys)
+
+
+def test_page_after_cursor(store):
+    rows = store.feed_page(15, 1000)
+    assert len(rows) > 2
+    assert store.feed_page(15, 2, feed_cursor(rows[1])) == rows[2:4]
+
+
+def test_follow_adds_followee_tweets_to_feed(store):
+    flwee = store.conn.execute(
+        "SELECT writer FROM tweets WHERE writer NOT IN (SELECT flwee FROM follows WHERE flwer = 1) AND writer != 1"
+    ).fetchone()[0]
+    store.follow(1, flwee)
+    tids = {row[0] for row in store.feed_page(1, 1000) if row[1] == flwee}
+    assert tids >= {tid for tid, in store.conn.execute("SELECT tid FROM tweets WHERE writer = ?", (flwee,))}
+
+
+def test_backfill_skips_accounts_above_fanout_limit(store):
+    conn = store.conn
+    flwee, followers = conn.execute(
+        "SELECT usr, follower_count FROM user_stats WHERE follower_count > 0 ORDER BY follower_count DESC").fetchone()
+    flwer = conn.execute("SELECT usr FROM users WHERE usr NOT IN (SELECT flwer FROM follows WHERE flwee = ?) "
+                         "AND usr != ?", (flwee, flwee)).fetchone()[0]
+    count = "SELECT COUNT(*) FROM timeline WHERE owner = ?"
+    before = conn.execute(count, (flwer,)).fetchone()[0]
+    with conn:
+        backfill_follow(conn, flwer, flwee, fanout_limit=followers - 1)
+    assert conn.execute(count, (flwer,)).fetchone()[0] == before
+    with conn:
+        backfill_follow(conn, flwer, flwee, fanout_limit=followers)
+    assert conn.execute(count, (flwer,)).fetchone()[0] > before
+
+
+def test_pulled_feed_matches_timeline(store):
+    # every followee is pulled as well as in the timeline, as right after an account crosses the limit
+    for usr in USERS:
+        whole = get_feed_page(store.conn, usr, 1000)
+        assert get_feed_page(store.conn, usr, 1000, fanout_limit=-1) == whole
+        pages, cursor = [], None
+        while True:
+            page = get_feed_page(store.conn, usr, 2, cursor, fanout_limit=-1)
+            pages += page
+            if len(page) < 2:
+                break
+            cursor = feed_cursor(page[-1])
+        assert pages == whole
+
+
+def test_pulled_feed_without_timeline(store):
+    with store.conn:
+        store.conn.execute("DELETE FROM timeline")
+    for usr in USERS:
+        assert get_feed_page(store.conn, usr, 1000) == []
+    rows = get_feed_page(store.conn, 15, 1000, fanout_limit=0)
+    assert rows and [feed_cursor(row) for row in rows] == sorted(map(feed_cursor, rows), reverse=True)
@@ -0,0 +1,65 @@
+from graph import FollowGraph
+
+USERS = range(0, 34)
+
+# Friends of friends of :usr with the number of its followees following them, as a self-join of follows
+SUGGESTIONS_QUERY = """
+    SELECT f2.flwee, COUNT(*) AS common
+    FROM follows f1
+    JOIN follows f2 ON f2.flwer = f1.flwee
+    WHERE f1.flwer = :usr AND f2.flwee != :usr
+      AND f2.flwee NOT IN (SELECT flwee FROM follows WHERE flwer = :usr)
+    GROUP BY f2.flwee
+    ORDER BY common DESC, (SELECT COUNT(*) FROM follows WHERE flwee = f2.flwee) DESC, f2.flwee
+"""
+
+
+def _column(conn, sql, params):
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+def _check(conn, graph):
+    assert len(graph) == conn.execute("SELECT COUNT(*) FROM follows").fetchone()[0]
+    for usr in USERS:
+        assert graph.following(usr) == _column(conn, "SELECT flwee FROM follows WHERE flwer = ? ORDER BY 1", (usr,))
+        assert graph.followers(usr) == _column(conn, "SELECT flwer FROM follows WHERE flwee = ? ORDER BY 1", (usr,))
+        assert graph.mutual_follows(usr) == _column(
+            conn, "SELECT a.flwee FROM follows a JOIN follows b ON b.flwer = a.flwee AND b.flwee = a.flwer "
+                  "WHERE a.flwer = ? ORDER BY 1", (usr,))
+        assert graph.who_to_follow(usr, 100) == conn.execute(SUGGESTIONS_QUERY, {"usr": usr}).fetchall()
+
+
+def test_graph_matches_follows(store):
+    _check(store.conn, FollowGraph.load(store.conn))
+
+
+def test_added_follows_before_and_after_compaction(store):
+    conn = store.conn
+    for threshold in (1000, 1):
+        graph = FollowGraph.load(conn, threshold)
+        pairs = [(1, 2), (2, 1), (3, 1), (1, 3), (2, 3)]
+        for flwer, flwee in pairs:
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO follows (flwer, flwee, start_date) VALUES (?, ?, DATE('now'))",
+                             (flwer, flwee))
+            graph.add_follow(flwer, flwee)
+        graph.add_follow(1, 2)
+        _check(conn, graph)
+
+
+def test_follower_overlap(store):
+    graph = FollowGraph.load(store.conn)
+    for usr in USERS:
+        for other in USERS:
+            followers, others = set(graph.followers(usr)), set(graph.followers(other))
+            union = followers | others
+            common, jaccard = graph.follower_overlap(usr, other)
+            assert common == len(followers & others)
+            assert jaccard == (common / len(union) if union else 0.0)
+
+
+def test_store_suggestions_carry_names(store):
+    rows = store.who_to_follow(15)
+    assert rows
+    assert [(row[0], row[-1]) for row in rows] == store.follow_graph().who_to_follow(15)
+    assert all(row[1] is not None for row in rows)
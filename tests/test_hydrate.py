@@ -0,0 +1,46 @@
+from archive import archive_tweets
+from bench import hydrate_per_row
+from querystats import QueryStats
+from store import TwitterStore, connect, connect_cold_tier
+
+
+def _pages(store):
+    tids = [tid for tid, in store.conn.execute("SELECT tid FROM tweets ORDER BY tid DESC")]
+    # a missing tweet and a repeated one, as a page may hold
+    tids[3:3] = [99999999, tids[0]]
+    return [tids[i:i + size] for size in (1, 5, 50) for i in range(0, len(tids), size)]
+
+
+def _check(store):
+    for page in _pages(store):
+        store.cache.clear()
+        batched = store.hydrate_tweets(page)
+        assert list(batched.items()) == list(hydrate_per_row(store, page).items())
+        # and again from the cache
+        assert list(store.hydrate_tweets(page).items()) == list(batched.items())
+
+
+def test_batched_hydration_matches_per_row(store):
+    store.compose_tweet(15, "a reply #hydrated #twice", replyto=max(store.conn.execute("SELECT tid FROM tweets"))[0])
+    _check(store)
+
+
+def test_batched_hydration_with_archived_tweets(db):
+    archive_tweets(db, "2022-08-15")
+    store = TwitterStore(connect(db), cold=connect_cold_tier(db))
+    try:
+        _check(store)
+    finally:
+        store.close()
+
+
+def test_a_page_costs_at_most_four_queries(db):
+    stats = QueryStats()
+    store = TwitterStore(connect(db, stats=stats))
+    try:
+        tids = [tid for tid, in store.conn.execute("SELECT tid FROM tweets")]
+        stats.reset()
+        store.hydrate_tweets(tids)
+        assert sum(entry["calls"] for entry in stats.snapshot()["statements"]) <= 4
+    finally:
+        store.close()
@@ -0,0 +1,20 @@
+import time
+
+from ids import FIRST_TWEET_ID, id_timestamp_prefix, tweet_id_time
+
+
+def test_new_tweet_ids_grow_with_time(store):
+    old_max = store.conn.execute("SELECT MAX(tid) FROM tweets").fetchone()[0]
+    started = time.time()
+    tids = [store.compose_tweet(1, f"tweet {i}") for i in range(5)]
+    assert tids == sorted(tids) and len(set(tids)) == len(tids)
+    assert tids[0] > old_max
+    assert started - 1 <= tweet_id_time(tids[-1]).timestamp() <= time.time() + 1
+
+
+def test_legacy_ids_have_no_time():
+    assert tweet_id_time(10304) is None
+    assert tweet_id_time(1 << 40) is None
+    assert tweet_id_time(FIRST_TWEET_ID - 1) is None
+    assert tweet_id_time(FIRST_TWEET_ID) is not None
+    assert id_timestamp_prefix() > FIRST_TWEET_ID
@@ -0,0 +1,53 @@
+import shutil
+
+from ingest import ingest_tweets
+from store import TwitterStore, connect
+
+TWEETS = [
+    {"writer": 1, "text": "ingest one #oilers"},
+    {"writer": 15, "text": "ingest two #oilers #edmonton", "replyto": 10304},
+    {"writer": 3, "text": "ingest three"},
+    {"writer": 1, "text": "ingest four #newterm", "replyto": 10304},
+]
+
+# Tables whose rows name a tweet, with the columns that do
+TABLES = {
+    "tweets": "tid, writer, tdate, text, replyto",
+    "mentions": "tid, term",
+    "hashtags": "term",
+    "timeline": "owner, date, tid, usr, kind",
+    "user_stats": "*",
+    "tweet_stats": "*",
+}
+
+
+def _dump(store, tids):
+    """
+    Returns:
+        dict: The rows of TABLES and the feeds of every user, with the new tweet IDs replaced by their position.
+    """
+    names = {tid: f"new{i}" for i, tid in enumerate(tids)}
+
+    def named(rows):
+        return sorted((tuple(names.get(value, value) for value in row) for row in rows), key=repr)
+
+    dump = {table: named(store.conn.execute(f"SELECT {columns} FROM {table}")) for table, columns in TABLES.items()}
+    dump["feeds"] = [named(store.feed_page(usr, 1000)) for usr in range(1, 33)]
+    dump["search"] = named(store.search_tweets("ingest oilers"))
+    return dump
+
+
+def test_ingest_matches_compose_tweet(store, db, tmp_path):
+    other = str(tmp_path / "other.db")
+    shutil.copyfile(db, other)
+    composed = [store.compose_tweet(tweet["writer"], tweet["text"], tweet.get("replyto")) for tweet in TWEETS]
+
+    ingested_store = TwitterStore(connect(other))
+    try:
+        before = ingested_store.conn.execute("SELECT MAX(tid) FROM tweets").fetchone()[0]
+        assert ingest_tweets(ingested_store.conn, TWEETS, batch_size=3)[0] == len(TWEETS)
+        ingested = [tid for tid, in ingested_store.conn.execute(
+            "SELECT tid FROM tweets WHERE tid > ? ORDER BY tid", (before,))]
+        assert _dump(ingested_store, ingested) == _dump(store, composed)
+    finally:
+        ingested_store.close()
@@ -0,0 +1,51 @@
+import pytest
+
+from feed import feed_cursor
+
+# Every tweet and retweet of the members of :lname, as the list timeline shows them
+TIMELINE_QUERY = """
+    SELECT t.tid, t.writer, t.tdate, t.text, t.replyto, 0
+    FROM includes i JOIN tweets t ON t.writer = i.member WHERE i.lname = :lname
+    UNION ALL
+    SELECT r.tid, r.usr, r.rdate, t.text, t.replyto, 1
+    FROM includes i JOIN retweets r ON r.usr = i.member JOIN tweets t ON t.tid = r.tid WHERE i.lname = :lname
+"""
+
+
+def _timeline(store, lname):
+    return sorted(store.conn.execute(TIMELINE_QUERY, {"lname": lname}), key=feed_cursor, reverse=True)
+
+
+def test_only_the_owner_changes_a_list(store):
+    assert store.create_list(1, "mylist")
+    assert not store.create_list(2, "mylist")
+    assert store.add_list_member(1, "mylist", 15)
+    assert not store.add_list_member(1, "mylist", 15)
+    assert not store.add_list_member(2, "mylist", 3)
+    assert store.add_list_member(1, "mylist", 3)
+    lists = store.user_lists(1)
+    assert ("mylist", 2) in lists and lists == sorted(lists)
+    assert [row[0] for row in store.list_members("mylist")] == [3, 15]
+    assert not store.remove_list_member(2, "mylist", 3)
+    assert store.remove_list_member(1, "mylist", 3)
+    assert [row[0] for row in store.list_members("mylist")] == [15]
+    with pytest.raises(ValueError):
+        store.create_list(1, "x" * 13)
+
+
+def test_list_timeline_pages(store):
+    store.create_list(1, "mylist")
+    for member in (1, 2, 15):
+        store.add_list_member(1, "mylist", member)
+    store.retweet(2, 10304)
+    expected = _timeline(store, "mylist")
+    assert len(expected) > 3
+    assert store.list_page("mylist", 1000) == expected
+    for page_size in (1, 2, 3):
+        assert [row for page in store.list_pages("mylist", page_size) for row in page] == expected
+        assert store.list_page("mylist", page_size, feed_cursor(expected[1])) == expected[2:2 + page_size]
+
+
+def test_existing_lists(store):
+    for lname, in store.conn.execute("SELECT lname FROM lists"):
+        assert store.list_page(lname, 1000) == _timeline(store, lname)
@@ -0,0 +1,18 @@
+from dbconfig import open_connection
+from migrations import MIGRATIONS, check_query_plans, migrate, schema_version
+
+
+def test_migrations_upgrade_once(db):
+    conn = open_connection(db)
+    try:
+        assert schema_version(conn) < MIGRATIONS[-1][0]
+        assert migrate(conn) == MIGRATIONS[-1][0]
+        schema = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+        assert migrate(conn) == MIGRATIONS[-1][0]
+        assert conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == schema
+    finally:
+        conn.close()
+
+
+def test_hot_queries_use_indexes(store):
+    assert check_query_plans(store.conn) == {}
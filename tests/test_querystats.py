@@ -0,0 +1,43 @@
+import json
+
+from querystats import QueryStats, normalize_sql
+from store import TwitterStore, connect
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT * FROM tweets\n   WHERE tid = 10304 AND text = 'it''s'") == \
+        "SELECT * FROM tweets WHERE tid = ? AND text = ?"
+    assert normalize_sql("SELECT * FROM users WHERE usr IN (?, ?,?)") == "SELECT * FROM users WHERE usr IN (?, ...)"
+
+
+def test_calls_of_a_statement_are_counted_together(db):
+    stats = QueryStats()
+    store = TwitterStore(connect(db, stats=stats))
+    try:
+        stats.reset()
+        for usr in (1, 2, 3):
+            store.conn.execute(f"SELECT name FROM users WHERE usr = {usr}").fetchall()
+        store.conn.execute("SELECT usr FROM users").fetchall()
+    finally:
+        store.close()
+    entries = {entry["sql"]: entry for entry in stats.snapshot()["statements"]}
+    assert entries["SELECT name FROM users WHERE usr = ?"]["calls"] == 3
+    assert entries["SELECT name FROM users WHERE usr = ?"]["rows"] == 3
+    assert entries["SELECT usr FROM users"]["rows"] == 32
+    assert stats.snapshot()["slow"] == []
+
+
+def test_slow_queries_are_logged_with_their_plan(db, tmp_path):
+    log = tmp_path / "slow.jsonl"
+    stats = QueryStats(slow_ms=0, slow_log=str(log))
+    store = TwitterStore(connect(db, stats=stats))
+    try:
+        stats.reset()
+        store.conn.execute("SELECT text FROM tweets WHERE tid = ?", (10304,)).fetchall()
+    finally:
+        store.close()
+    (record,) = stats.snapshot()["slow"]
+    assert record["sql"] == "SELECT text FROM tweets WHERE tid = ?"
+    assert record["params"] == "(10304,)" and record["rows"] == 1
+    assert any("tweets" in detail for detail in record["plan"])
+    assert json.loads(log.read_text().splitlines()[-1]) == record
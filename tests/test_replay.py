@@ -0,0 +1,73 @@
+import json
+import sqlite3
+
+import pytest
+
+from replay import SessionRecorder, load_sessions, main, replay_sessions
+from store import TwitterStore, connect
+
+
+def _record(db, path):
+    recorder = SessionRecorder(TwitterStore(connect(db)), path)
+    try:
+        recorder.get_credentials(1)
+        pages = recorder.feed_pages(1, page_size=2)
+        next(pages)
+        next(pages)
+        recorder.search_tweets(["the"])
+        recorder.compose_tweet(1, "recorded #replayed")
+        with pytest.raises(sqlite3.IntegrityError):
+            recorder.follow(1, 99999999)  # the user does not exist
+        recorder.end_session()
+        recorder.signup("Replayed", "secret", "r@example.com", "Rome", 1)
+        recorder.end_session()
+    finally:
+        recorder.close()
+
+
+def test_recorded_sessions_load_in_order(db, tmp_path):
+    path = str(tmp_path / "sessions.jsonl")
+    _record(db, path)
+    first, second = load_sessions([path])
+    assert [event["op"] for event in first] == ["get_credentials", "feed_page", "feed_page", "search_tweets",
+                                                "compose_tweet", "follow"]
+    assert [event["t"] for event in first] == sorted(event["t"] for event in first)
+    assert first[0]["session"] != second[0]["session"]
+    # passwords are not recorded
+    assert second[0]["op"] == "signup" and second[0]["args"][1] == ""
+    assert "secret" not in open(path, encoding="utf-8").read()
+
+
+def test_replay_counts_calls_and_errors(db, tmp_path):
+    path = str(tmp_path / "sessions.jsonl")
+    _record(db, path)
+    sessions = load_sessions([path])
+    store = TwitterStore(connect(db))
+    try:
+        tweets = store.conn.execute("SELECT count(*) FROM tweets").fetchone()[0]
+    finally:
+        store.close()
+
+    report = replay_sessions(db, sessions, count=4, concurrency=2, speedup=0)
+    assert report["sessions"] == 4
+    assert report["calls"] == 2 * sum(len(session) for session in sessions)
+    assert report["actions"]["feed_page"]["calls"] == 4
+    assert report["actions"]["follow"]["errors"] == 2
+    assert report["errors"] == 2
+    store = TwitterStore(connect(db))
+    try:
+        assert store.conn.execute("SELECT count(*) FROM tweets").fetchone()[0] == tweets + 2
+    finally:
+        store.close()
+
+
+def test_main_replays_a_copy(db, tmp_path):
+    path = str(tmp_path / "sessions.jsonl")
+    _record(db, path)
+    before = open(db, "rb").read()
+    copy = str(tmp_path / "copy.db")
+    output = str(tmp_path / "results.json")
+    assert main(["replay.py", db, path, "--copy", copy, "--speedup", "0", "--output", output]) == 0
+    assert json.load(open(output, encoding="utf-8"))["database"] == copy
+    assert open(db, "rb").read() == before
+    assert main(["replay.py", db, path, "--copy", db]) == 2
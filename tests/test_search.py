@@ -0,0 +1,78 @@
+from search import _USER_SCAN_QUERY
+
+
+def _tids(rows):
+    return [row[0] for row in rows]
+
+
+def test_new_tweets_are_indexed(store):
+    tid = store.compose_tweet(1, "a zebra in the feed")
+    assert _tids(store.search_tweets(["zebra"])) == [tid]
+    # the trigram index matches inside words too
+    assert _tids(store.search_tweets(["ebr"])) == [tid]
+
+
+def test_any_keyword_matches_and_both_rank_first(store):
+    zebra = store.compose_tweet(1, "zebra alone")
+    both = store.compose_tweet(1, "zebra and okapi")
+    assert _tids(store.search_tweets(["zebra", "okapi"])) == [both, zebra]
+
+
+def test_best_match_first(store):
+    weak = store.compose_tweet(1, "one zebra among many other words in a rather long tweet")
+    strong = store.compose_tweet(2, "zebra zebra zebra")
+    assert _tids(store.search_tweets(["zebra"])) == [strong, weak]
+
+
+def test_hashtag_search(store):
+    tid = store.compose_tweet(1, "new tag #pytesttag")
+    store.compose_tweet(1, "pytesttag without the hash")
+    assert _tids(store.search_tweets(["#pytesttag"])) == [tid]
+
+
+def test_limit(store):
+    for i in range(5):
+        store.compose_tweet(1, f"zebra number {i}")
+    assert len(store.search_tweets(["zebra"], limit=3)) == 3
+
+
+def _scan(store, keyword):
+    params = {"pattern": f"%{keyword}%", "limit": -1, "offset": 0}
+    return store.conn.execute(_USER_SCAN_QUERY, params).fetchall()
+
+
+def test_repeated_search_is_cached(store):
+    first = store.search_tweets(["Oilers", "#Jobs"])
+    hits = store.search_cache.stats()["hits"]
+    assert store.search_tweets(["#jobs", "oilers", "oilers"]) == first
+    assert store.search_cache.stats()["hits"] == hits + 1
+
+
+def test_new_tweet_invalidates_cached_results(store):
+    before = _tids(store.search_tweets(["zebra"]))
+    generation = store.search_cache.generation
+    tid = store.compose_tweet(1, "a zebra in the feed")
+    assert store.search_cache.generation > generation
+    assert _tids(store.search_tweets(["zebra"])) == before + [tid]
+
+
+def test_names_first_then_shorter_then_by_id(store):
+    longer = store.signup("Quokka Longname", "pwd", "a@example.com", "Nowhere", -7)
+    city = store.signup("Someone", "pwd", "b@example.com", "Quokkaville", -7)
+    short = store.signup("Quokka", "pwd", "c@example.com", "Nowhere", -7)
+    same_length = store.signup("QUOKKA", "pwd", "d@example.com", "Nowhere", -7)
+    assert [row[0] for row in store.search_users("quokka", -1)] == [short, same_length, longer, city]
+    assert [row[0] for row in store.search_users("quokka", 2, 1)] == [same_length, longer]
+
+
+def test_index_ranks_like_the_scan(store):
+    names = [name for name, in store.conn.execute("SELECT name FROM users UNION SELECT city FROM users")]
+    keywords = {name[i:i + 3] for name in names if name for i in range(0, len(name) - 2, 2)}
+    assert keywords
+    for keyword in sorted(keywords):
+        assert store.search_users(keyword, -1) == _scan(store, keyword), keyword
+
+
+def test_short_keywords_and_wildcards_scan(store):
+    for keyword in ("ed", "e", "%", "a_b"):
+        assert store.search_users(keyword, -1) == _scan(store, keyword)
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+
+from server import StorePool, TwitterServer
+
+# A statement that runs for minutes unless it is interrupted
+SLOW_QUERY = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 1000000000) SELECT COUNT(*) FROM c"
+
+
+class SlowServer(TwitterServer):
+    async def dispatch(self, method, target, body):
+        if target == "/slow":
+            return 200, await self.pool.read(lambda store: store.conn.execute(SLOW_QUERY).fetchone())
+        return await super().dispatch(method, target, body)
+
+
+def _run(db, requests, **options):
+    """
+    Returns:
+        list: The (status, response) of each (method, target, body) request, run one after the other.
+    """
+    async def run():
+        pool = StorePool(db, readers=2)
+        try:
+            app = SlowServer(pool, **options)
+            return [await app.respond(method, target, json.dumps(body).encode() if body is not None else b"")
+                    for method, target, body in requests]
+        finally:
+            pool.close()
+    return asyncio.run(run())
+
+
+def test_routes(db):
+    feed, tweet, detail, profile, lists, search = _run(db, [
+        ("GET", "/feed?usr=15&page_size=2", None),
+        ("POST", "/tweets", {"usr": 15, "text": "server #route", "replyto": 10304}),
+        ("GET", "/tweets/10304", None),
+        ("GET", "/users/15", None),
+        ("GET", "/lists?owner=101", None),
+        ("GET", "/tweets/search?q=route", None),
+    ])
+    assert feed[0] == 200 and len(feed[1]["tweets"]) == 2 and feed[1]["next"]
+    assert tweet[0] == 201
+    assert detail[0] == 200 and detail[1]["tid"] == 10304
+    assert profile[0] == 200
+    assert lists[0] == 200
+    assert search[0] == 200 and [row["tid"] for row in search[1]["tweets"]] == [tweet[1]["tid"]]
+    (next_page,) = _run(db, [("GET", f"/feed?usr=15&page_size=2&cursor={feed[1]['next']}", None)])
+    assert next_page[0] == 200 and next_page[1]["tweets"] != feed[1]["tweets"]
+
+
+def test_client_errors(db):
+    statuses = [status for status, response in _run(db, [
+        ("GET", "/feed", None),
+        ("GET", "/feed?usr=x", None),
+        ("GET", "/feed?usr=1&cursor=xx", None),
+        ("GET", '/feed?usr=1&cursor=["a",1]', None),
+        ("GET", "/tweets/99999999", None),
+        ("GET", "/nowhere", None),
+        ("POST", "/tweets", {"usr": 1}),
+        ("POST", "/tweets", {"usr": 99999999, "text": "x"}),
+        ("POST", "/follows", {"flwer": 1, "flwee": 99999999}),
+        ("PUT", "/tweets", None),
+    ])]
+    assert statuses == [400, 400, 400, 400, 404, 404, 400, 404, 404, 405]
+
+
+def test_slow_request_times_out_and_is_interrupted(db):
+    started = time.perf_counter()
+    slow, after = _run(db, [("GET", "/slow", None), ("GET", "/users/1", None)], timeout=0.2)
+    assert slow[0] == 504
+    assert after[0] == 200
+    assert time.perf_counter() - started < 5
+
+
+def test_busy_server_refuses_requests(db):
+    async def run():
+        pool = StorePool(db, readers=1)
+        try:
+            app = SlowServer(pool, timeout=0.5, max_pending=1)
+            return await asyncio.gather(app.respond("GET", "/slow", b""), app.respond("GET", "/users/1", b""))
+        finally:
+            pool.close()
+
+    slow, refused = asyncio.run(run())
+    assert slow[0] == 504
+    assert refused[0] == 503
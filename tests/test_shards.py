@@ -0,0 +1,89 @@
+import shutil
+
+import pytest
+
+import main
+from analytics import PARTITION_QUERIES, run_analytics
+from ids import next_sharded_tweet_id
+from ingest import ingest_sharded_tweets, ingest_tweets
+from reads import every_read
+from shards import ShardedTwitterStore, shard_of, split_shards
+from store import TwitterStore, connect
+
+SHARDS = 3
+
+
+@pytest.fixture
+def sharded(db, tmp_path):
+    """
+    The copy of SQLdata.db split into SHARDS shards, and an unsplit copy of it, as stores.
+    """
+    reference_db = str(tmp_path / "reference.db")
+    shutil.copyfile(db, reference_db)
+    split_shards(db, SHARDS)
+    store = ShardedTwitterStore.open(db)
+    reference = TwitterStore(connect(reference_db))
+    yield store, reference
+    store.close()
+    reference.close()
+
+
+def test_reads_gathered_from_shards(sharded):
+    store, reference = sharded
+    tids = [tid for tid, in reference.conn.execute("SELECT tid FROM tweets")]
+    assert every_read(store, tids) == every_read(reference, tids)
+
+
+def test_tweets_are_in_their_writers_shard(sharded):
+    store, reference = sharded
+    tid = store.compose_tweet(7, "written to one shard")
+    for shard, conn in enumerate(store.shards):
+        writers = {writer for writer, in conn.execute("SELECT DISTINCT writer FROM tweets")}
+        assert all(shard_of(writer, SHARDS) == shard for writer in writers)
+    assert tid % SHARDS == shard_of(7, SHARDS)
+
+
+def test_writes_gathered_from_shards(sharded):
+    store, reference = sharded
+    reads = []
+    for s in (store, reference):
+        tid = s.compose_tweet(7, "sharded #shardtag", replyto=10304)
+        s.retweet(15, tid)
+        s.follow(7, 15)
+        tids = [tid for tid, in reference.conn.execute("SELECT tid FROM tweets WHERE text != 'sharded #shardtag'")]
+        # the tweets were given IDs at different times
+        reads.append(repr(every_read(s, tids + [tid])).replace(str(tid), "tid"))
+    assert reads[0] == reads[1]
+
+
+def test_ingest_goes_to_shards(sharded):
+    store, reference = sharded
+    tweets = [{"writer": writer, "text": f"imported #ingested {writer}", "replyto": None, "tdate": "2024-01-01"}
+              for writer in (1, 2, 3, 5, 8, 13)]
+    assert ingest_sharded_tweets(store, tweets)[0] == len(tweets)
+    ingest_tweets(reference.conn, tweets)
+    assert sorted(row[1:] for row in store.search_tweets(["#ingested"])) == \
+        sorted(row[1:] for row in reference.search_tweets(["#ingested"]))
+    assert [store.user_counts(usr) for usr in range(1, 33)] == [reference.user_counts(usr) for usr in range(1, 33)]
+
+
+def test_analytics_totals_unchanged_by_split(db, tmp_path, sharded):
+    totals = run_analytics(db, workers=1)
+    expected = run_analytics(str(tmp_path / "reference.db"), workers=1)
+    assert {name: totals[name] for name in PARTITION_QUERIES} == {name: expected[name] for name in PARTITION_QUERIES}
+
+
+def test_sharded_ids_are_congruent_to_their_shard(store):
+    conn = store.conn
+    for shard in range(SHARDS):
+        with conn:
+            tids = [next_sharded_tweet_id(conn, shard, SHARDS) for _ in range(3)]
+        assert all(tid % SHARDS == shard for tid in tids)
+        assert tids == sorted(tids) and len(set(tids)) == len(tids)
+
+
+def test_menu_reports_missing_tweets(sharded, capsys):
+    store, reference = sharded
+    main.retweet(store, 1, 99999999)
+    main.compose_tweet(store, 1, "a reply to nothing", 99999999)
+    assert capsys.readouterr().out.count("does not exist") == 2
@@ -0,0 +1,84 @@
+import sqlite3
+import threading
+
+import pytest
+
+from archive import archive_tweets, merge_tiers
+from counters import verify_counters
+from snapshot import create_snapshot
+from store import ReadOnlyError, TwitterStore, connect, connect_cold_tier
+
+TABLES = ("users", "follows", "tweets", "retweets", "mentions", "lists", "includes", "timeline", "user_stats")
+
+
+def _rows(conn, schema="main"):
+    return {table: conn.execute(f"SELECT * FROM {schema}.{table} ORDER BY 1, 2").fetchall() for table in TABLES}
+
+
+def _open_snapshot(path):
+    return TwitterStore(connect(path, read_only=True, immutable=True), read_only=True,
+                        cold=connect_cold_tier(path, immutable=True))
+
+
+def test_snapshot_refuses_writes(store, db, tmp_path):
+    snapshot = str(tmp_path / "snapshot.db")
+    create_snapshot(db, snapshot)
+    reader = _open_snapshot(snapshot)
+    try:
+        before = _rows(reader.conn)
+        assert before == _rows(store.conn)
+        for write, args in ((reader.signup, ("x", "pwd", "x@example.com", "Rome", 1)),
+                            (reader.compose_tweet, (1, "refused")), (reader.retweet, (1, 10304)),
+                            (reader.follow, (1, 20)), (reader.create_list, (1, "refused"))):
+            with pytest.raises(ReadOnlyError):
+                write(*args)
+        assert _rows(reader.conn) == before
+        assert reader.feed_page(15, 1000) == store.feed_page(15, 1000)
+    finally:
+        reader.close()
+
+
+def test_snapshot_during_writes_is_consistent(store, db, tmp_path):
+    snapshot = str(tmp_path / "snapshot.db")
+    stop = threading.Event()
+
+    def write():
+        writer = TwitterStore(connect(db))
+        try:
+            while not stop.is_set():
+                writer.compose_tweet(15, "during the snapshot #snap", 10304)
+        finally:
+            writer.close()
+
+    before = store.conn.execute("SELECT COUNT(*) FROM tweets").fetchone()[0]
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        for _ in range(3):
+            create_snapshot(db, snapshot)
+            conn = sqlite3.connect(snapshot)
+            try:
+                assert verify_counters(conn) == []
+            finally:
+                conn.close()
+    finally:
+        stop.set()
+        thread.join()
+    assert store.conn.execute("SELECT COUNT(*) FROM tweets").fetchone()[0] > before
+
+
+def test_snapshot_copies_the_cold_tier(store, db, tmp_path):
+    assert archive_tweets(db, "2100-01-01") > 0
+    snapshot = str(tmp_path / "snapshot.db")
+    create_snapshot(db, snapshot)
+    source = connect(db)
+    copy = connect(snapshot)
+    try:
+        for table in ("tweets", "retweets", "mentions"):
+            query = f"SELECT * FROM cold.{table} ORDER BY 1, 2"
+            assert copy.execute(query).fetchall() == source.execute(query).fetchall()
+        merge_tiers(copy)
+        assert verify_counters(copy) == []
+    finally:
+        source.close()
+        copy.close()
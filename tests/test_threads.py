@@ -0,0 +1,62 @@
+from threads import thread_ancestors, thread_replies
+
+ROOT = 10304
+
+
+def _thread(store):
+    """
+    Add replies below ROOT, two levels deeper than the existing ones.
+
+    Returns:
+        dict: The tids of the new tweets by name.
+    """
+    tids = {}
+    tids["a"] = store.compose_tweet(1, "reply a", ROOT)
+    tids["b"] = store.compose_tweet(2, "reply b", ROOT)
+    tids["a1"] = store.compose_tweet(3, "reply a1", tids["a"])
+    tids["b1"] = store.compose_tweet(1, "reply b1", tids["b"])
+    tids["a1x"] = store.compose_tweet(2, "reply a1x", tids["a1"])
+    return tids
+
+
+def _walk(conn, tid, depth, max_depth):
+    """
+    Yields:
+        tuple: (tid, depth) of the replies below a tweet in thread order, found one query per tweet.
+    """
+    if depth >= max_depth:
+        return
+    for reply, in conn.execute("SELECT tid FROM tweets WHERE replyto = ? ORDER BY tid", (tid,)):
+        yield reply, depth + 1
+        yield from _walk(conn, reply, depth + 1, max_depth)
+
+
+def test_replies_are_in_thread_order(store):
+    _thread(store)
+    for max_depth in (1, 2, 50):
+        rows = thread_replies(store.conn, ROOT, 1000, max_depth=max_depth)
+        assert [(row[0], row[5]) for row in rows] == list(_walk(store.conn, ROOT, 0, max_depth))
+
+
+def test_pages_continue_from_the_cursor(store):
+    _thread(store)
+    whole = thread_replies(store.conn, ROOT, 1000)
+    for page_size in (1, 2, 3):
+        rows, cursor = [], None
+        while True:
+            page = thread_replies(store.conn, ROOT, page_size, cursor)
+            rows += page
+            if len(page) < page_size:
+                break
+            cursor = page[-1][6]
+        assert rows == whole
+
+
+def test_ancestors_up_to_the_start_of_the_thread(store):
+    tids = _thread(store)
+    rows = thread_ancestors(store.conn, tids["a1x"])
+    assert [row[0] for row in rows][-3:] == [ROOT, tids["a"], tids["a1"]]
+    assert [row[5] for row in rows] == list(range(-len(rows), 0))
+    assert rows[0][4] is None
+    assert [row[0] for row in thread_ancestors(store.conn, tids["a1x"], 2)] == [tids["a"], tids["a1"]]
+    assert thread_ancestors(store.conn, rows[0][0]) == []
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+
+from trending import REBUILD_STATEMENTS, iso_day, trending_hashtags
+
+
+def _rollups(conn):
+    return [conn.execute(f"SELECT * FROM {table} WHERE count > 0 ORDER BY 1, 2").fetchall()
+            for table in ("hashtag_daily", "hashtag_hourly")]
+
+
+def test_new_mentions_trend_now(store):
+    for i in range(3):
+        store.compose_tweet(1, f"#rising {i}")
+    store.compose_tweet(2, "#steady")
+    for hourly in (False, True):
+        assert [(term, count) for term, score, count in trending_hashtags(store.conn, 2, hourly)] == \
+            [("rising", 3), ("steady", 1)]
+
+
+def test_older_mentions_decay(store):
+    store.compose_tweet(1, "#fresh")
+    for i in range(3):
+        store.compose_tweet(2, f"#stale {i}")
+    tomorrow = datetime.now(timezone.utc) + timedelta(days=1)
+    # a day later, three mentions of yesterday score 1.5 with a half-life of one day
+    assert trending_hashtags(store.conn, now=tomorrow) == [("stale", 1.5, 3), ("fresh", 0.5, 1)]
+    assert trending_hashtags(store.conn, now=tomorrow + timedelta(days=7)) == []
+
+
+def test_triggers_match_a_rebuild(store):
+    conn = store.conn
+    store.compose_tweet(1, "#one #two")
+    store.compose_tweet(3, "#two", 10304)
+    with conn:
+        conn.execute("DELETE FROM mentions WHERE term = 'one'")
+    kept = _rollups(conn)
+    with conn:
+        for statement in REBUILD_STATEMENTS:
+            conn.execute(statement)
+    assert _rollups(conn) == kept
+
+
+def test_legacy_dates_are_counted_by_day(store):
+    day = store.conn.execute("SELECT tdate FROM tweets WHERE tid = 10304").fetchone()[0]
+    assert iso_day(day) != day
+    assert iso_day("2024-03-05") == "2024-03-05"
+    days = {row[0] for row in store.conn.execute("SELECT day FROM hashtag_daily")}
+    assert days and all(len(day) == 10 and day[4] == "-" for day in days)
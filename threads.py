@@ -0,0 +1,88 @@
+THREAD_PAGE_SIZE = 20
+# Replies deeper than this below the tweet, or ancestors further up, are not returned
+THREAD_MAX_DEPTH = 50
+
+# Ancestors of a tweet, walking replyto up one hop per step, nearest first.
+_ANCESTORS_QUERY = """
+    WITH RECURSIVE chain (tid, depth) AS (
+        SELECT replyto, 1 FROM tweets WHERE tid = :tid
+        UNION ALL
+        SELECT t.replyto, chain.depth + 1
+        FROM chain
+        JOIN tweets t ON t.tid = chain.tid
+        WHERE chain.depth < :max_depth
+        )
+    SELECT t.tid, t.writer, t.tdate, t.text, t.replyto, -chain.depth
+    FROM chain
+    JOIN tweets t ON t.tid = chain.tid
+    ORDER BY chain.depth DESC
+"""
+
+# Replies below a tweet in thread order: each reply is followed by its own replies before its next
+# sibling, and siblings are in tid order, which is the order they were written in.
+#
+# path is the chain of tids from the tweet down to the reply, each zero-padded to 20 digits and
+# separated by '/', so that sorting by path gives the thread order. ORDER BY in the recursive part
+# makes SQLite expand the smallest path first, so rows come out in thread order and LIMIT stops the
+# walk as soon as the page is full. Below the tweets on the path of :after, only the replies from
+# the next tid of that path on are read, with a range of the (replyto, tid) index, so a page costs
+# its own rows plus the depth of the cursor, not the replies of the earlier pages.
+_REPLIES_QUERY = """
+    WITH RECURSIVE thread (tid, writer, tdate, text, replyto, depth, path) AS (
+        SELECT tid, writer, tdate, text, replyto, 0, printf('%020d', tid) FROM tweets WHERE tid = :tid
+        UNION ALL
+        SELECT t.tid, t.writer, t.tdate, t.text, t.replyto, thread.depth + 1,
+               thread.path || '/' || printf('%020d', t.tid)
+        FROM thread
+        JOIN tweets t ON t.replyto = thread.tid
+        WHERE thread.depth < :max_depth
+          AND t.tid >= CASE
+              WHEN thread.path = substr(:after, 1, length(thread.path))
+              THEN CAST(substr(:after, length(thread.path) + 2, 20) AS INTEGER)
+              ELSE 0
+          END
+        ORDER BY 7
+        LIMIT :limit + :max_depth + 1
+        )
+    SELECT tid, writer, tdate, text, replyto, depth, path
+    FROM thread
+    WHERE depth > 0 AND path > :after
+    ORDER BY path
+    LIMIT :limit
+"""
+
+
+def thread_ancestors(conn, tid, max_depth=THREAD_MAX_DEPTH):
+    """
+    Fetch the tweets a tweet replies to, up to the start of its thread, in one query.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        tid (int): The tweet ID.
+        max_depth (int, optional): Maximum number of ancestors. Default is THREAD_MAX_DEPTH.
+
+    Returns:
+        list: Rows of (tid, writer, tdate, text, replyto, depth), the first tweet of the thread first,
+        with depth -1 for the tweet replied to, -2 for the one before it, and so on.
+    """
+    return conn.execute(_ANCESTORS_QUERY, {"tid": tid, "max_depth": max_depth}).fetchall()
+
+
+def thread_replies(conn, tid, page_size=THREAD_PAGE_SIZE, cursor=None, max_depth=THREAD_MAX_DEPTH):
+    """
+    Fetch one page of the replies below a tweet, in thread order, in one query.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        tid (int): The tweet ID.
+        page_size (int, optional): Maximum number of rows to return. Default is THREAD_PAGE_SIZE.
+        cursor (str, optional): The path of the last row already seen, or None for the first page.
+        max_depth (int, optional): Replies deeper than this below the tweet are left out.
+            Default is THREAD_MAX_DEPTH.
+
+    Returns:
+        list: Up to page_size rows of (tid, writer, tdate, text, replyto, depth, path), with depth 1 for
+        direct replies. The path of the last row is the cursor of the next page.
+    """
+    return conn.execute(_REPLIES_QUERY, {"tid": tid, "limit": page_size, "after": cursor or "",
+                                         "max_depth": max_depth}).fetchall()
@@ -0,0 +1,165 @@
+import heapq
+from datetime import datetime, timedelta, timezone
+
+from ids import ID_EPOCH_MS, SEQUENCE_BITS
+
+TRENDING_K = 10
+# Trends are scored over a sliding window of days (or hours), each mention counting
+# 0.5 ** (age / half-life), so a tag mentioned today beats one mentioned as often last week.
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_DAYS = 1.0
+TRENDING_WINDOW_HOURS = 24
+TRENDING_HALF_LIFE_HOURS = 3.0
+
+
+def day_of(column):
+    """
+    Returns:
+        str: An SQL expression for the day of a date column as YYYY-MM-DD. Tweets and retweets are dated
+        with DATE('now'), but older rows use DD-MON-YYYY.
+    """
+    return f"""CASE
+    WHEN {column} GLOB '[0-9][0-9]-[A-Za-z][A-Za-z][A-Za-z]-[0-9][0-9][0-9][0-9]'
+    THEN substr({column}, 8, 4) || '-'
+         || printf('%02d', (instr('JANFEBMARAPRMAYJUNJULAUGSEPOCTNOVDEC', upper(substr({column}, 4, 3))) + 2) / 3)
+         || '-' || substr({column}, 1, 2)
+    ELSE DATE({column})
+END"""
+
+
+def iso_day(value):
+    """
+    Returns:
+        str: The day of a date as YYYY-MM-DD, as day_of() computes it in SQL; other values as they are.
+    """
+    try:
+        return datetime.strptime(value, "%d-%b-%Y").date().isoformat()
+    except (TypeError, ValueError):
+        return value
+
+
+# The day of a tweet as YYYY-MM-DD
+TWEET_DAY = day_of("t.tdate")
+
+# The hour of a tweet as YYYY-MM-DD HH:00, from the time in its ID. Only tweets whose ID time falls on
+# their date have one: older IDs carry no time, and imported tweets are dated before they were written.
+TWEET_HOUR = f"strftime('%Y-%m-%d %H:00', ((t.tid >> {SEQUENCE_BITS}) + {ID_EPOCH_MS}) / 1000.0, 'unixepoch')"
+TWEET_HAS_HOUR = f"t.tid >= {1 << SEQUENCE_BITS} AND substr({TWEET_HOUR}, 1, 10) = {TWEET_DAY}"
+
+# Mention counts per term and day, and per term and hour, kept up to date by triggers on mentions.
+SCHEMA_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS hashtag_daily (
+           day    date,
+           term   char(10),
+           count  int NOT NULL DEFAULT 0,
+           primary key (day, term)
+       ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS hashtag_hourly (
+           hour   char(16),
+           term   char(10),
+           count  int NOT NULL DEFAULT 0,
+           primary key (hour, term)
+       ) WITHOUT ROWID""",
+    f"""CREATE TRIGGER IF NOT EXISTS mentions_trending_insert AFTER INSERT ON mentions BEGIN
+           INSERT INTO hashtag_daily (day, term, count)
+               SELECT {TWEET_DAY}, new.term, 1 FROM tweets t WHERE t.tid = new.tid AND {TWEET_DAY} IS NOT NULL
+               ON CONFLICT (day, term) DO UPDATE SET count = count + 1;
+           INSERT INTO hashtag_hourly (hour, term, count)
+               SELECT {TWEET_HOUR}, new.term, 1 FROM tweets t WHERE t.tid = new.tid AND {TWEET_HAS_HOUR}
+               ON CONFLICT (hour, term) DO UPDATE SET count = count + 1;
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS mentions_trending_delete AFTER DELETE ON mentions BEGIN
+           UPDATE hashtag_daily SET count = count - 1
+               WHERE term = old.term AND day = (SELECT {TWEET_DAY} FROM tweets t WHERE t.tid = old.tid);
+           UPDATE hashtag_hourly SET count = count - 1
+               WHERE term = old.term AND hour = (SELECT {TWEET_HOUR} FROM tweets t WHERE t.tid = old.tid AND {TWEET_HAS_HOUR});
+       END""",
+]
+
+REBUILD_STATEMENTS = [
+    "DELETE FROM hashtag_daily",
+    f"""INSERT INTO hashtag_daily (day, term, count)
+        SELECT {TWEET_DAY} AS day, m.term, COUNT(*) FROM mentions m JOIN tweets t ON t.tid = m.tid
+        WHERE day IS NOT NULL GROUP BY day, m.term""",
+    "DELETE FROM hashtag_hourly",
+    f"""INSERT INTO hashtag_hourly (hour, term, count)
+        SELECT {TWEET_HOUR} AS hour, m.term, COUNT(*) FROM mentions m JOIN tweets t ON t.tid = m.tid
+        WHERE {TWEET_HAS_HOUR} GROUP BY hour, m.term""",
+]
+
+
+def trending_hashtags(conn, k=TRENDING_K, hourly=False, window=None, half_life=None, now=None):
+    """
+    Find the hashtags mentioned the most over a recent window, with decay.
+
+    Only the rollup rows of the window are read: one per term and day (or hour) that has mentions,
+    however many tweets there are. The k best are picked with a heap.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        k (int, optional): Number of hashtags to return. Default is TRENDING_K.
+        hourly (bool, optional): Use hours rather than days as buckets. Default is False.
+        window (int, optional): Number of buckets, the current one included. Defaults to
+            TRENDING_WINDOW_DAYS, or TRENDING_WINDOW_HOURS when hourly.
+        half_life (float, optional): Age in buckets at which a mention counts half. Defaults to
+            TRENDING_HALF_LIFE_DAYS, or TRENDING_HALF_LIFE_HOURS when hourly.
+        now (datetime, optional): End of the window, in UTC like DATE('now'). Defaults to the current time.
+
+    Returns:
+        list: Up to k tuples of (term, score, mentions in the window), highest score first.
+    """
+    return merged_trending_hashtags([conn], k, hourly, window, half_life, now)
+
+
+def merged_trending_hashtags(conns, k=TRENDING_K, hourly=False, window=None, half_life=None, now=None):
+    """
+    Find the trending hashtags of tweets spread over several databases, such as shards; see trending_hashtags.
+
+    Scores and mention counts are sums over the rollup rows, so the rows of every database are added up
+    before the k best are picked.
+
+    Args:
+        conns (list): Connection objects to the SQLite databases.
+        k, hourly, window, half_life, now: As for trending_hashtags.
+
+    Returns:
+        list: Up to k tuples of (term, score, mentions in the window), highest score first.
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    if hourly:
+        table, column, step, bucket_format = "hashtag_hourly", "hour", timedelta(hours=1), "%Y-%m-%d %H:00"
+        window = TRENDING_WINDOW_HOURS if window is None else window
+        half_life = TRENDING_HALF_LIFE_HOURS if half_life is None else half_life
+    else:
+        table, column, step, bucket_format = "hashtag_daily", "day", timedelta(days=1), "%Y-%m-%d"
+        window = TRENDING_WINDOW_DAYS if window is None else window
+        half_life = TRENDING_HALF_LIFE_DAYS if half_life is None else half_life
+
+    # the decay weight of each bucket of the window, newest (age 0) first
+    weights = {(now - age * step).strftime(bucket_format): 0.5 ** (age / half_life) for age in range(window)}
+    first = (now - (window - 1) * step).strftime(bucket_format)
+    last = now.strftime(bucket_format)
+
+    scores = {}
+    mentions = {}
+    for conn in conns:
+        for bucket, term, count in conn.execute(
+                f"SELECT {column}, term, count FROM {table} WHERE {column} BETWEEN ? AND ? AND count > 0",
+                (first, last)):
+            scores[term] = scores.get(term, 0.0) + count * weights.get(bucket, 0.0)
+            mentions[term] = mentions.get(term, 0) + count
+    best = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+    return [(term, round(score, 4), mentions[term]) for term, score in best]
+
+
+def rebuild_trending(conn):
+    """
+    Recompute the rollups from mentions and tweets.
+
+    Args:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+    """
+    with conn:
+        for statement in REBUILD_STATEMENTS:
+            conn.execute(statement)